@@ -2,10 +2,14 @@
 import os
 import logging
 from flask import Flask, g
+from flask.json.provider import DefaultJSONProvider
 from flask_login import LoginManager
 from .config import Config # Importa a configuração local
 from . import db      # Importa o módulo database local
-from .models import User    # Importa o modelo User
+from . import compression
+from .models import User, load_cached_user    # Importa o modelo User
+from .cache import TTLCache
+from .db.rows import Row
 
 # --- Configuração de Logging (similar ao app.py original) ---
 log_formatter = logging.Formatter("%(asctime)s - %(levelname)s - [%(name)s:%(lineno)d] - %(message)s")
@@ -26,11 +30,12 @@ login_manager.login_message_category = "info"
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Carrega o utilizador pelo ID (igual ao original)."""
+    """Carrega o utilizador pelo ID, usando o cache de identidade antes do banco."""
     # É importante que User.get_by_id funcione sem depender do app context diretamente aqui
     # O acesso ao banco via `database.execute_query` usará `g` que é gerenciado pelo Flask
     try:
-        return User.get_by_id(int(user_id))
+        # Cache de identidade (processo/sessão): as chamadas /api/* não consultam USUARIOS a cada requisição
+        return load_cached_user(int(user_id))
     except ValueError:
         logger.warning(f"ID de utilizador inválido fornecido para user_loader: {user_id}")
         return None
@@ -38,9 +43,19 @@ def load_user(user_id):
         logger.error(f"Erro no user_loader para ID {user_id}: {e}", exc_info=True)
         return None
 
-def create_app(config_class=Config):
+class AppJSONProvider(DefaultJSONProvider):
+    """Provider JSON da aplicação: serializa as linhas compactas do banco (Row) como objetos."""
+    @staticmethod
+    def default(o):
+        if isinstance(o, Row):
+            return o.as_dict()
+        return DefaultJSONProvider.default(o)
+
+def create_app(config_class=Config, init_db_pool: bool = True):
     """
     Função App Factory: Cria e configura a instância da aplicação Flask.
+    Com init_db_pool=False o pool de conexões não é aberto aqui (servidor com
+    pre-fork, ver gunicorn.conf.py): cada worker cria o seu após o fork.
     """
     logger.info("Criando instância da aplicação Flask...")
     # Define as pastas de templates e estáticos para procurar na raiz do projeto
@@ -49,11 +64,16 @@ def create_app(config_class=Config):
                 static_folder='../static')      # Aponta para a pasta static na raiz
 
     app.config.from_object(config_class)
+    app.json = AppJSONProvider(app)  # jsonify aceita listas de Row (ex.: /api/tv-data)
     logger.info(f"Configuração carregada: SECRET_KEY={'*' * 8 if app.config.get('SECRET_KEY') else 'None'}, DB_HOST={app.config.get('DB_CONFIG', {}).get('host')}")
 
     # --- Inicializar Extensões ---
     login_manager.init_app(app)
-    db.init_app(app)  # Inicializa o banco de dados (pool de conexões)
+    app.extensions['user_cache'] = TTLCache(maxsize=app.config.get('USER_CACHE_MAXSIZE', 1024),
+                                            ttl=app.config.get('USER_CACHE_TTL', 300))
+    db.init_app(app, with_pool=init_db_pool)  # Inicializa o banco de dados (pool de conexões)
+    compression.init_app(app)  # gzip/br nas respostas e estáticos pré-comprimidos
+    db.timeouts.init_app(app)  # statement_timeout por classe de query e cancelamento na desconexão
 
     # --- Registrar Context Processors e Teardown ---
     @app.teardown_appcontext
@@ -79,5 +99,9 @@ def create_app(config_class=Config):
         logger.error(f"Erro ao registrar Blueprints: {e}", exc_info=True)
 
 
+    # --- Comandos CLI (flask --app wsgi <comando>) ---
+    from .cli import register_commands
+    register_commands(app)
+
     logger.info("Instância da aplicação Flask criada e configurada.")
     return app
\ No newline at end of file
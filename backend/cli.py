@@ -0,0 +1,171 @@
+# backend/cli.py
+"""
+Comandos de linha de comando da aplicação (`flask --app wsgi <comando>`).
+"""
+import json
+import logging
+import subprocess
+import sys
+import click
+
+logger = logging.getLogger(__name__)
+
+# Módulos pesados que NÃO devem ser carregados no boot (importados sob demanda)
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'duckdb')
+
+# Script executado num processo Python novo, para medir o boot sem cache de imports
+_STARTUP_PROBE = """
+import json, logging, resource, sys, time
+logging.disable(logging.CRITICAL)
+inicio = time.perf_counter()
+from backend import create_app
+create_app(init_db_pool=False)
+elapsed = time.perf_counter() - inicio
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    'seconds': elapsed,
+    'rss_mb': rss_kb / 1024,
+    'heavy_modules': [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+def measure_startup() -> dict:
+    """Mede, num subprocesso limpo, o tempo de create_app() e o RSS máximo do processo."""
+    result = subprocess.run(
+        [sys.executable, '-c', _STARTUP_PROBE % (HEAVY_MODULES,)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def register_commands(app):
+    """Registra os comandos CLI na aplicação."""
+
+    @app.cli.command('check-startup')
+    @click.option('--runs', default=3, show_default=True, help='Quantidade de medições (usa a menor).')
+    def check_startup(runs):
+        """Verifica o orçamento de boot: tempo de create_app() e memória (RSS) do worker."""
+        max_seconds = app.config.get('STARTUP_TIME_BUDGET_SECONDS', 1.0)
+        max_rss_mb = app.config.get('STARTUP_RSS_BUDGET_MB', 64)
+
+        medicoes = [measure_startup() for _ in range(max(1, runs))]
+        seconds = min(m['seconds'] for m in medicoes)
+        rss_mb = min(m['rss_mb'] for m in medicoes)
+        heavy = medicoes[0]['heavy_modules']
+
+        click.echo(f"create_app(): {seconds:.3f} s (orçamento {max_seconds} s)")
+        click.echo(f"RSS máximo:   {rss_mb:.1f} MB (orçamento {max_rss_mb} MB)")
+        click.echo(f"Módulos pesados carregados no boot: {', '.join(heavy) or 'nenhum'}")
+
+        falhas = []
+        if seconds > max_seconds:
+            falhas.append(f"tempo de boot {seconds:.3f} s acima de {max_seconds} s")
+        if rss_mb > max_rss_mb:
+            falhas.append(f"RSS {rss_mb:.1f} MB acima de {max_rss_mb} MB")
+        if heavy:
+            falhas.append(f"módulos pesados importados no boot: {', '.join(heavy)}")
+        if falhas:
+            click.echo("FALHOU: " + "; ".join(falhas), err=True)
+            sys.exit(1)
+        click.echo("OK: boot dentro do orçamento.")
+
+    @app.cli.command('precompress-static')
+    @click.option('--force', is_flag=True, help='Regera mesmo as cópias já atualizadas.')
+    def precompress_static_command(force):
+        """Gera as cópias .gz/.br dos arquivos estáticos (servidas conforme o Accept-Encoding)."""
+        from .compression import available_encodings, precompress_static
+        stats = precompress_static(app.static_folder, app.config.get('COMPRESS_MIN_SIZE', 1024), force=force)
+        click.echo(f"Codificações: {', '.join(available_encodings())}")
+        click.echo(f"Gerados: {stats['gerados']}, já atualizados: {stats['atualizados']}, "
+                   f"ignorados (pequenos): {stats['ignorados']}")
+
+    @app.cli.command('build-map-geometry')
+    def build_map_geometry():
+        """Gera (ou regera) a geometria simplificada do mapa em todos os níveis de detalhe."""
+        import os
+        from . import geo
+        source_path = os.path.join(app.static_folder, geo.SOURCE_FILE)
+        gerados = geo.build_geometry_cache(source_path, geo.geometry_cache_dir(app))
+        original = os.path.getsize(source_path)
+        for nome, tamanho in sorted(gerados.items()):
+            click.echo(f"{nome}: {tamanho / 1024:.1f} KB ({original / tamanho:.0f}x menor que o original)")
+
+    @app.cli.command('notify-triggers')
+    @click.option('--apply', 'aplicar', is_flag=True, help='Executa o SQL no banco (senão só imprime).')
+    def notify_triggers(aplicar):
+        """SQL dos triggers que enviam NOTIFY quando CLIENTES, RCB_CLIENTES ou DEVOLUTIVAS mudam."""
+        from .db.notify import trigger_sql
+        sql = trigger_sql(app.config.get('DB_NOTIFY_CHANNEL', 'fastbi_changes'))
+        if not aplicar:
+            click.echo(sql)
+            return
+        import psycopg2
+        conn = psycopg2.connect(**app.config['DB_CONFIG'])
+        try:
+            with conn, conn.cursor() as cursor:
+                cursor.execute(sql)
+        finally:
+            conn.close()
+        click.echo("Triggers de notificação criados.")
+
+    @app.cli.command('search-indexes')
+    @click.option('--apply', 'aplicar', is_flag=True, help='Executa o SQL no banco (senão só imprime).')
+    def search_indexes(aplicar):
+        """SQL dos índices de trigramas (pg_trgm) usados pela busca dos relatórios."""
+        from .db.reports_engine import search_index_sql
+        sql = search_index_sql()
+        if not aplicar:
+            click.echo(sql)
+            return
+        import psycopg2
+        conn = psycopg2.connect(**app.config['DB_CONFIG'])
+        try:
+            # CREATE INDEX CONCURRENTLY não roda dentro de transação
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                for comando in sql.split(';\n'):
+                    if comando.strip():
+                        click.echo(comando.strip().splitlines()[0])
+                        cursor.execute(comando)
+        finally:
+            conn.close()
+        click.echo("Índices da busca criados.")
+
+    @app.cli.group('analytics-replica')
+    def analytics_replica():
+        """Réplica analítica local (DuckDB) usada pelas agregações do dashboard e da TV."""
+
+    @analytics_replica.command('build')
+    def analytics_replica_build():
+        """Recarga completa a partir do PostgreSQL (troca o arquivo ao final)."""
+        from .db.analytics_replica import replica_path
+        from .db.replica_sync import rebuild
+        contagens = rebuild(app)
+        for relacao, linhas in contagens.items():
+            click.echo(f"{relacao}: {linhas} linhas")
+        click.echo(f"Réplica gravada em {replica_path(app)}")
+
+    @analytics_replica.command('sync')
+    @click.option('--loop', is_flag=True, help='Sincroniza continuamente (ANALYTICS_REPLICA_SYNC_INTERVAL).')
+    @click.option('--reconcile', is_flag=True, help='Força a conciliação de chaves (apagados/faltantes).')
+    def analytics_replica_sync(loop, reconcile):
+        """Aplica na réplica só as linhas alteradas desde a última sincronização."""
+        from .db import replica_sync
+        if loop:
+            replica_sync.run_loop(app)
+            return
+        metricas = replica_sync.sync_replica(app, reconcile=True if reconcile else None)
+        if metricas is None:
+            click.echo("Outra sincronização está em andamento.")
+            return
+        for relacao, dados in metricas.items():
+            click.echo(f"{relacao}: {dados}")
+        click.echo("Sem alterações." if not metricas else "Sincronizada.")
+
+    @analytics_replica.command('status')
+    def analytics_replica_status():
+        """Defasagem e métricas da última sincronização."""
+        import json
+        from .db.replica_sync import sync_status
+        click.echo(json.dumps(sync_status(app), indent=2, default=str, ensure_ascii=False))
@@ -0,0 +1,92 @@
+# backend/column_presets.py
+"""
+Conjuntos de colunas salvos por utilizador para /relatorios e /export.
+
+Cada utilizador tem um arquivo JSON em instance/column_presets/<id>.json, no formato
+{relatório: {nome do conjunto: [chaves das colunas]}}. A gravação é atômica (arquivo
+temporário + os.replace), então leituras concorrentes de outros workers nunca veem
+um arquivo pela metade.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+MAX_PRESETS_PER_REPORT = 20
+MAX_NAME_LENGTH = 60
+
+_lock = threading.Lock()
+_SAFE_ID_RE = re.compile(r'[^A-Za-z0-9_-]+')
+
+
+def _path(user_id) -> str:
+    base = current_app.config.get('COLUMN_PRESETS_DIR') or os.path.join(current_app.instance_path, 'column_presets')
+    return os.path.join(base, f"{_SAFE_ID_RE.sub('_', str(user_id))}.json")
+
+
+def _load(user_id) -> Dict[str, Dict[str, List[str]]]:
+    try:
+        with open(_path(user_id), encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.error(f"Erro ao ler os conjuntos de colunas do utilizador {user_id}: {e}", exc_info=True)
+        return {}
+
+
+def _write(user_id, data: Dict[str, Dict[str, List[str]]]) -> None:
+    path = _path(user_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def normalize_name(name: str) -> str:
+    """Nome como é gravado: espaços colapsados e no máximo MAX_NAME_LENGTH caracteres."""
+    return " ".join(name.split())[:MAX_NAME_LENGTH]
+
+
+def get_presets(user_id, report: str) -> Dict[str, List[str]]:
+    """Conjuntos do utilizador para o relatório ({nome: [chaves]})."""
+    presets = _load(user_id).get(report)
+    return presets if isinstance(presets, dict) else {}
+
+
+def save_preset(user_id, report: str, name: str, columns: List[str]) -> Optional[str]:
+    """
+    Salva (ou substitui) um conjunto. Retorna o nome gravado (normalize_name) ou None
+    se o limite por relatório foi atingido.
+    """
+    name = normalize_name(name)
+    with _lock:
+        data = _load(user_id)
+        presets = data.setdefault(report, {})
+        if name not in presets and len(presets) >= MAX_PRESETS_PER_REPORT:
+            return None
+        presets[name] = list(columns)
+        _write(user_id, data)
+    logger.info(f"Conjunto de colunas '{name}' salvo para o relatório '{report}' (utilizador {user_id}).")
+    return name
+
+
+def delete_preset(user_id, report: str, name: str) -> bool:
+    """Remove um conjunto. Retorna False se ele não existia."""
+    name = normalize_name(name)
+    with _lock:
+        data = _load(user_id)
+        if name not in data.get(report, {}):
+            return False
+        del data[report][name]
+        if not data[report]:
+            del data[report]
+        _write(user_id, data)
+    return True
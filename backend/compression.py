@@ -0,0 +1,224 @@
+# backend/compression.py
+"""
+Compressão das respostas HTTP (gzip e, se o pacote `brotli` estiver instalado, br).
+
+* Respostas dinâmicas (JSON/HTML/texto) acima de COMPRESS_MIN_SIZE bytes são
+  comprimidas no after_request conforme o Accept-Encoding do navegador.
+* Arquivos estáticos são servidos a partir de cópias pré-comprimidas
+  (`arquivo.ext.br` / `arquivo.ext.gz`) geradas no boot ou por
+  `flask --app wsgi precompress-static`; o arquivo original continua sendo a
+  versão sem compressão.
+
+Toda resposta que pode variar pela codificação leva `Vary: Accept-Encoding`. O
+ETag de uma resposta comprimida recebe o sufixo da codificação ("<etag>-gzip"),
+pois cada representação precisa de um validador forte próprio (ver http_cache).
+"""
+import gzip
+import logging
+import mimetypes
+import os
+from typing import Optional
+from flask import current_app, request, send_from_directory
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+logger = logging.getLogger(__name__)
+
+# Sufixo das cópias pré-comprimidas, por codificação (ordem = preferência do servidor)
+STATIC_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# Tipos de conteúdo que valem a pena comprimir (imagens já vêm comprimidas)
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/geo+json', 'application/javascript',
+    'text/html', 'text/css', 'text/javascript', 'text/plain', 'text/csv',
+    'image/svg+xml',
+}
+PRECOMPRESS_EXTENSIONS = ('.js', '.css', '.json', '.geojson', '.svg', '.html', '.txt', '.csv')
+
+mimetypes.add_type('application/geo+json', '.geojson')
+
+
+def _brotli():
+    """Módulo brotli, se instalado (dependência opcional)."""
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def available_encodings() -> list:
+    """Codificações suportadas neste processo, por ordem de preferência."""
+    return ['br', 'gzip'] if _brotli() is not None else ['gzip']
+
+
+def negotiate_encoding(candidates: Optional[list] = None) -> Optional[str]:
+    """Melhor codificação aceita pelo pedido atual entre `candidates` (None = sem compressão)."""
+    candidates = available_encodings() if candidates is None else candidates
+    if not candidates:
+        return None
+    return request.accept_encodings.best_match(candidates)
+
+
+def compress_bytes(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if encoding == 'br':
+        return _brotli().compress(data, quality=4 if level is None else level)
+    # mtime=0: mesma entrada gera sempre os mesmos bytes (cópias estáticas reprodutíveis)
+    return gzip.compress(data, compresslevel=6 if level is None else level, mtime=0)
+
+
+def etag_with_encoding(response, encoding: str) -> None:
+    """Acrescenta o sufixo da codificação ao ETag forte da resposta (se houver)."""
+    etag, weak = response.get_etag()
+    if etag and not etag.endswith(f"-{encoding}"):
+        response.set_etag(f"{etag}-{encoding}", weak=weak)
+
+
+def _is_compressible(response) -> bool:
+    mimetype = response.mimetype or ''
+    return mimetype in COMPRESSIBLE_MIMETYPES or mimetype.startswith('text/') or mimetype.endswith('+json')
+
+
+# --- Respostas dinâmicas ---
+def compress_response(response):
+    """after_request: comprime a resposta se o navegador aceitar e o tamanho justificar."""
+    config = current_app.config
+    if not config.get('COMPRESS_ENABLED', True):
+        return response
+    if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers:
+        return response
+    if not _is_compressible(response):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+
+    if response.status_code == 304:
+        # O 304 do http_cache precisa devolver o mesmo ETag que o navegador guardou
+        if encoding:
+            etag_with_encoding(response, encoding)
+        return response
+    if response.status_code != 200 or not encoding:
+        return response
+
+    data = response.get_data()
+    if len(data) < config.get('COMPRESS_MIN_SIZE', 1024):
+        return response
+
+    level = config.get('COMPRESS_BR_QUALITY', 4) if encoding == 'br' else config.get('COMPRESS_LEVEL', 6)
+    try:
+        response.set_data(compress_bytes(data, encoding, level))
+    except Exception as e:
+        logger.error(f"Erro ao comprimir resposta ({encoding}) de {request.path}: {e}", exc_info=True)
+        return response
+    response.headers['Content-Encoding'] = encoding
+    etag_with_encoding(response, encoding)
+    return response
+
+
+# --- Arquivos estáticos pré-comprimidos ---
+def _fresh_sibling(path: str, suffix: str) -> bool:
+    """A cópia comprimida existe e não é mais antiga que o original."""
+    try:
+        return os.path.getmtime(path + suffix) >= os.path.getmtime(path)
+    except OSError:
+        return False
+
+
+def send_precompressed(directory: str, filename: str, max_age=None):
+    """
+    Envia `directory/filename` usando a cópia `.br`/`.gz` atualizada que o navegador
+    aceitar; sem cópia (ou sem suporte), envia o original. Sempre com Vary.
+    """
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+
+    candidates = [enc for enc, suffix in STATIC_SUFFIXES.items() if _fresh_sibling(path, suffix)]
+    encoding = negotiate_encoding(candidates) if current_app.config.get('COMPRESS_ENABLED', True) else None
+    if encoding:
+        response = send_from_directory(
+            directory, filename + STATIC_SUFFIXES[encoding],
+            mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+            max_age=max_age,
+        )
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(directory, filename, max_age=max_age)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def static_view(filename):
+    """Substitui a view 'static' do Flask: usa `arquivo.br`/`arquivo.gz` quando existirem."""
+    app = current_app
+    if not filename.endswith(PRECOMPRESS_EXTENSIONS):
+        return app.send_static_file(filename)
+    return send_precompressed(app.static_folder, filename, max_age=app.get_send_file_max_age(filename))
+
+
+def _static_encodings() -> dict:
+    """Codificações das cópias em disco e o nível máximo de cada uma."""
+    encodings = {'gzip': 9}
+    if _brotli() is not None:
+        encodings['br'] = 11
+    return encodings
+
+
+def precompress_file(path: str, force: bool = False) -> int:
+    """
+    Grava `path.gz` (nível 9) e, se possível, `path.br` (qualidade 11). Cópias já
+    atualizadas são mantidas (a menos que force=True). Retorna quantas foram geradas.
+    """
+    gerados = 0
+    data = None
+    for encoding, level in _static_encodings().items():
+        suffix = STATIC_SUFFIXES[encoding]
+        if not force and _fresh_sibling(path, suffix):
+            continue
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        tmp_path = f"{path}{suffix}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(compress_bytes(data, encoding, level))
+        os.replace(tmp_path, path + suffix)
+        gerados += 1
+    return gerados
+
+
+def precompress_static(static_folder: str, min_size: int = 1024, force: bool = False) -> dict:
+    """
+    Pré-comprime (precompress_file) cada arquivo estático compressível com pelo menos
+    `min_size` bytes. Retorna contadores {'gerados', 'atualizados', 'ignorados'}.
+    """
+    por_arquivo = len(_static_encodings())
+    stats = {'gerados': 0, 'atualizados': 0, 'ignorados': 0}
+
+    for root, _dirs, files in os.walk(static_folder):
+        for nome in files:
+            if not nome.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+            path = os.path.join(root, nome)
+            if os.path.getsize(path) < min_size:
+                stats['ignorados'] += 1
+                continue
+            gerados = precompress_file(path, force=force)
+            stats['gerados'] += gerados
+            stats['atualizados'] += por_arquivo - gerados
+            if gerados:
+                logger.info(f"Pré-comprimido: {os.path.relpath(path, static_folder)}")
+    return stats
+
+
+def init_app(app) -> None:
+    """Liga a compressão dinâmica, a view de estáticos e (opcionalmente) a pré-compressão no boot."""
+    app.after_request(compress_response)
+    if app.static_folder and 'static' in app.view_functions:
+        app.view_functions['static'] = static_view
+        if app.config.get('PRECOMPRESS_STATIC_ON_STARTUP', False):
+            try:
+                precompress_static(app.static_folder, app.config.get('COMPRESS_MIN_SIZE', 1024))
+            except OSError as e:
+                # Ex.: pasta estática somente leitura; segue servindo os originais
+                logger.warning(f"Não foi possível pré-comprimir os arquivos estáticos: {e}")
@@ -15,4 +15,82 @@ class Config:
         "connect_timeout": 10
     }
     # Adicione outras configurações se necessário (ex: itens por página)
-    ITEMS_PER_PAGE = 50
\ No newline at end of file
+    ITEMS_PER_PAGE = 50
+    # Conjuntos de colunas salvos por utilizador (backend/column_presets.py); padrão: instance/column_presets
+    COLUMN_PRESETS_DIR = os.getenv('COLUMN_PRESETS_DIR', '')
+    # Threads para queries paralelas dentro de uma requisição (db.parallel)
+    DB_PARALLEL_WORKERS = int(os.getenv('DB_PARALLEL_WORKERS', '4'))
+    # Conexões do pool POR PROCESSO: uma por thread de requisição (GUNICORN_THREADS) e por
+    # thread de db.parallel, mais folga para os produtores das exportações e a sonda de
+    # versões (padrão 4 + 4 + 3 = 11). O total no PostgreSQL é GUNICORN_WORKERS x
+    # DB_POOL_MAXCONN (+1 do listener de NOTIFY) e deve ficar abaixo do max_connections
+    # do servidor (100 por padrão); a réplica tem o seu próprio DB_REPLICA_POOL_MAXCONN.
+    DB_POOL_MAXCONN = int(os.getenv('DB_POOL_MAXCONN') or
+                          int(os.getenv('GUNICORN_THREADS', '4')) + DB_PARALLEL_WORKERS + 3)
+    # Produtores simultâneos de db.parallel.prefetch (abas das exportações) por processo:
+    # a folga do pool, menos uma conexão para a sonda (padrão 11 - 4 - 4 - 1 = 2)
+    DB_PREFETCH_PRODUCERS = int(os.getenv('DB_PREFETCH_PRODUCERS') or
+                                max(1, DB_POOL_MAXCONN - int(os.getenv('GUNICORN_THREADS', '4')) - DB_PARALLEL_WORKERS - 1))
+    # Espera máxima (segundos) por uma conexão livre quando o pool está todo em uso
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+    # Orçamento de tempo por classe de query (db.timeouts), em ms; 0 = sem limite.
+    # 'export' fica abaixo do GUNICORN_TIMEOUT (120 s) para o worker não ser morto no meio
+    DB_STATEMENT_TIMEOUTS = {
+        'interactive': int(os.getenv('DB_TIMEOUT_INTERACTIVE_MS', '15000')),
+        'report': int(os.getenv('DB_TIMEOUT_REPORT_MS', '60000')),
+        'export': int(os.getenv('DB_TIMEOUT_EXPORT_MS', '110000')),
+        'analytics': int(os.getenv('DB_TIMEOUT_ANALYTICS_MS', '60000')),
+    }
+    # Cancela (connection.cancel()) as queries de quem fechou a conexão
+    DB_CANCEL_ON_DISCONNECT = os.getenv('DB_CANCEL_ON_DISCONNECT', 'True').lower() in ['true', '1', 't']
+    DB_DISCONNECT_POLL_INTERVAL = float(os.getenv('DB_DISCONNECT_POLL_INTERVAL', '0.5'))  # segundos
+    # Prepared statements no servidor (db.prepared): kill-switch, execuções antes do PREPARE
+    # e limite de statements por conexão (LRU com DEALLOCATE)
+    DB_PREPARED_STATEMENTS = os.getenv('DB_PREPARED_STATEMENTS', 'True').lower() in ['true', '1', 't']
+    DB_PREPARE_THRESHOLD = int(os.getenv('DB_PREPARE_THRESHOLD', '3'))
+    DB_PREPARED_CACHE_SIZE = int(os.getenv('DB_PREPARED_CACHE_SIZE', '64'))
+    # Réplica de leitura (opcional): DSN libpq, ex. "host=replica dbname=... user=... password=..."
+    DB_REPLICA_DSN = os.getenv('DB_REPLICA_DSN') or None
+    DB_REPLICA_POOL_MAXCONN = int(os.getenv('DB_REPLICA_POOL_MAXCONN') or DB_POOL_MAXCONN)
+    DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', '30'))                  # segundos; acima disso, primário
+    DB_REPLICA_LAG_CHECK_INTERVAL = int(os.getenv('DB_REPLICA_LAG_CHECK_INTERVAL', '10'))  # segundos entre medições
+    # Orçamento de boot verificado por `flask check-startup`
+    STARTUP_TIME_BUDGET_SECONDS = float(os.getenv('STARTUP_TIME_BUDGET_SECONDS', '1.0'))
+    STARTUP_RSS_BUDGET_MB = float(os.getenv('STARTUP_RSS_BUDGET_MB', '64'))
+    # Cache de identidade do utilizador autenticado (evita consultar USUARIOS a cada requisição)
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '300'))          # segundos
+    USER_CACHE_MAXSIZE = int(os.getenv('USER_CACHE_MAXSIZE', '1024'))
+    USER_SESSION_CACHE = os.getenv('USER_SESSION_CACHE', 'True').lower() in ['true', '1', 't']
+    # Cache HTTP condicional das rotas /api (ETag derivado da versão dos dados)
+    API_CONDITIONAL_CACHE = os.getenv('API_CONDITIONAL_CACHE', 'True').lower() in ['true', '1', 't']
+    API_CACHE_MAX_AGE = int(os.getenv('API_CACHE_MAX_AGE', '60'))   # segundos
+    DATA_VERSION_TTL = int(os.getenv('DATA_VERSION_TTL', '10'))     # segundos entre sondas de versão (db.data_version)
+    DATA_CACHE_MAX_AGE = int(os.getenv('DATA_CACHE_MAX_AGE', '3600'))  # idade máxima dos caches versionados
+    # Invalidação por LISTEN/NOTIFY (db.notify); a sonda vira só garantia enquanto o listener estiver ativo
+    DB_NOTIFY_LISTENER = os.getenv('DB_NOTIFY_LISTENER', 'False').lower() in ['true', '1', 't']
+    DB_NOTIFY_CHANNEL = os.getenv('DB_NOTIFY_CHANNEL', 'fastbi_changes')
+    DATA_VERSION_TTL_WITH_NOTIFY = int(os.getenv('DATA_VERSION_TTL_WITH_NOTIFY', '300'))  # segundos
+    # Réplica analítica local (db.analytics_replica; requer o pacote opcional `duckdb`)
+    ANALYTICS_REPLICA = os.getenv('ANALYTICS_REPLICA', 'False').lower() in ['true', '1', 't']
+    ANALYTICS_REPLICA_PATH = os.getenv('ANALYTICS_REPLICA_PATH')   # padrão: instance/analytics.duckdb
+    ANALYTICS_REPLICA_MAX_AGE = int(os.getenv('ANALYTICS_REPLICA_MAX_AGE', '900'))  # segundos; mais velha = PostgreSQL
+    # Sincronização incremental (db.replica_sync, `flask analytics-replica sync --loop`)
+    ANALYTICS_REPLICA_SYNC_INTERVAL = int(os.getenv('ANALYTICS_REPLICA_SYNC_INTERVAL', '60'))          # segundos
+    ANALYTICS_REPLICA_SYNC_OVERLAP = int(os.getenv('ANALYTICS_REPLICA_SYNC_OVERLAP', '300'))           # folga da marca d'água
+    ANALYTICS_REPLICA_VIEW_REFRESH = int(os.getenv('ANALYTICS_REPLICA_VIEW_REFRESH', '300'))           # recarga mínima das views
+    ANALYTICS_REPLICA_RECONCILE_INTERVAL = int(os.getenv('ANALYTICS_REPLICA_RECONCILE_INTERVAL', '3600'))  # conciliação de chaves
+    # Compressão das respostas (gzip; br se o pacote opcional `brotli` estiver instalado)
+    COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', 'True').lower() in ['true', '1', 't']
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))   # bytes
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', '6'))            # gzip, respostas dinâmicas
+    COMPRESS_BR_QUALITY = int(os.getenv('COMPRESS_BR_QUALITY', '4'))  # brotli, respostas dinâmicas
+    # Gera static/**/*.gz|.br no boot; desligado por padrão (pesa no orçamento de boot):
+    # gere as cópias no build/deploy com `flask precompress-static`
+    PRECOMPRESS_STATIC_ON_STARTUP = os.getenv('PRECOMPRESS_STATIC_ON_STARTUP', 'False').lower() in ['true', '1', 't']
+    # Geometria simplificada do mapa (backend/geo.py); vazio = instance/geo_cache
+    GEO_CACHE_DIR = os.getenv('GEO_CACHE_DIR', '')
+    GEO_CACHE_MAX_AGE = int(os.getenv('GEO_CACHE_MAX_AGE', '3600'))   # segundos
+    # Cache em disco das exportações (backend/export_cache.py); vazio = instance/export_cache
+    EXPORT_CACHE = os.getenv('EXPORT_CACHE', 'True').lower() in ['true', '1', 't']
+    EXPORT_CACHE_DIR = os.getenv('EXPORT_CACHE_DIR', '')
+    EXPORT_CACHE_MAX_BYTES = int(os.getenv('EXPORT_CACHE_MAX_MB', '512')) * 1024 * 1024
@@ -2,16 +2,22 @@
 import logging
 
 # Importações do connection.py
-from .connection import init_app, get_db, close_db, close_pool, db_pool
+from .connection import (
+    init_app, init_pool, get_pool, get_db, close_db, close_pool, db_pool,
+    ROUTE_PRIMARY, ROUTE_REPLICA, replica_lag, primary_reads
+)
 
 # Importações do executor.py
-from .executor import execute_query, execute_query_one
+from .executor import (
+    execute_query, execute_query_one, execute_query_columns, execute_query_frame, execute_query_stream
+)
+from .rows import Row
+from . import timeouts
+from .timeouts import QueryTimeoutError, QueryCancelledError, query_class
 
 # Importações do reports_base.py
 from .reports_base import (
-    get_base_nova_ids,
-    get_base_enviada_ids,
-    get_client_details_by_ids,
+    rateio_base_query,
     build_query,
     count_query,
     _get_query_fields,
@@ -23,10 +29,7 @@ from .reports_base import (
 from .reports_specific import (
     get_clientes_por_licenciado_data,
     count_clientes_por_licenciado,
-    get_rateio_rzk_base_nova_ids,
-    get_rateio_rzk_base_enviada_ids,
     _get_rateio_rzk_fields,
-    get_rateio_rzk_client_details_by_ids,
     get_rateio_rzk_data,
     count_rateio_rzk,
     _get_recebiveis_clientes_fields,
@@ -40,6 +43,10 @@ from .reports_boletos import (
     count_boletos_por_cliente
 )
 
+# Registro declarativo dos relatórios e motor genérico (páginas, contagens, exportação)
+from . import reports_registry, reports_engine
+from .reports_registry import REPORTS, ReportSpec, get_report
+
 # Importações do dashboard.py
 from .dashboard import (
     get_total_consumo_medio_by_month,
@@ -55,6 +62,7 @@ from .dashboard import (
     get_overdue_payments_by_fornecedora,
     get_green_score_by_fornecedora,
     get_overdue_clients_by_state_for_map,
+    get_state_map_summary,
     get_total_consumo_medio_consolidado,
     count_clientes_ativos_consolidado,
     count_clientes_registrados_consolidado,
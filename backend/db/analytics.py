@@ -0,0 +1,123 @@
+# backend/db/analytics.py
+"""
+Cálculos vetorizados sobre o DataFrame do relatório 'Boletos por Cliente'.
+
+Substitui os loops linha a linha (to_dict('records') + sets + float() por linha)
+usados pelo Green Score e pelos KPIs de Atraso na Injeção. Todas as métricas de
+todas as fornecedoras são calculadas numa única passagem (drop_duplicates + groupby).
+"""
+import logging
+from typing import Dict, List, Tuple
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Faixas de atraso usadas pelos KPIs (mesmos nomes usados em summarize_injection_by_fornecedora)
+OVERDUE_BUCKETS = ('all', 'up_to_30', 'over_30')
+
+_EMPTY_KPI = {'count': 0, 'average_delay_days': 0, 'pending_kwh': 0}
+
+
+def _to_float(series: pd.Series) -> pd.Series:
+    """Converte uma coluna para float64 (Decimal/None via astype, que é bem mais rápido que to_numeric)."""
+    try:
+        return series.astype('float64')
+    except (TypeError, ValueError):
+        # Colunas com '' ou textos: valores não numéricos viram NaN
+        return pd.to_numeric(series, errors='coerce')
+
+
+def _prepare_injection_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normaliza as colunas usadas nos cálculos e remove clientes duplicados.
+    Mantém a primeira ocorrência de cada 'codigo' (mesmo critério do loop com set).
+    """
+    base = df[df['codigo'].notna()].drop_duplicates(subset='codigo', keep='first')
+    return pd.DataFrame({
+        'fornecedora': base['fornecedora'].fillna('').astype(str).str.strip().str.upper(),
+        'ufconsumo': base['ufconsumo'].fillna('').astype(str).str.strip().str.upper(),
+        'atraso': base['atraso_na_injecao'].eq('SIM'),
+        # '' / None / 'N/A' viram NaN e depois 0, como no tratamento por linha
+        'dias': _to_float(base['dias_em_atraso']).fillna(0.0),
+        'consumo': _to_float(base['consumomedio']).fillna(0.0),
+    })
+
+
+def summarize_injection_by_fornecedora(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calcula, numa única passagem, todas as métricas de injeção por fornecedora.
+
+    Colunas retornadas (índice = fornecedora normalizada, na ordem da primeira aparição):
+        clientes, pontos_deterioracao, score,
+        count_<faixa>, dias_sum_<faixa>, dias_n_<faixa>, pending_kwh_<faixa>
+    para cada faixa em OVERDUE_BUCKETS.
+    """
+    if df is None or df.empty:
+        return pd.DataFrame()
+
+    base = _prepare_injection_frame(df)
+    atraso, dias, consumo = base['atraso'], base['dias'], base['consumo']
+
+    # Máscaras das faixas: crítico (> 30 dias, peso 2) e não crítico (0 < dias <= 30, peso 1)
+    critico = atraso & (dias > 30)
+    nao_critico = atraso & (dias > 0) & (dias <= 30)
+    dias_validos = atraso & (dias > 0)
+
+    metricas = pd.DataFrame({
+        'clientes': 1,
+        'pontos_deterioracao': critico.astype('int64') * 2 + nao_critico.astype('int64'),
+        'count_all': atraso.astype('int64'),
+        'dias_sum_all': dias.where(dias_validos, 0.0),
+        'dias_n_all': dias_validos.astype('int64'),
+        'pending_kwh_all': consumo.where(atraso, 0.0),
+        'count_up_to_30': nao_critico.astype('int64'),
+        'dias_sum_up_to_30': dias.where(nao_critico, 0.0),
+        'dias_n_up_to_30': nao_critico.astype('int64'),
+        'pending_kwh_up_to_30': consumo.where(nao_critico, 0.0),
+        'count_over_30': critico.astype('int64'),
+        'dias_sum_over_30': dias.where(critico, 0.0),
+        'dias_n_over_30': critico.astype('int64'),
+        'pending_kwh_over_30': consumo.where(critico, 0.0),
+    }, index=base.index)
+
+    summary = metricas.groupby(base['fornecedora'], sort=False).sum()
+    max_pontos = summary['clientes'] * 2
+    summary['score'] = (100 - (summary['pontos_deterioracao'] / max_pontos) * 100).clip(lower=0.0)
+    return summary
+
+
+def green_scores_from_summary(summary: pd.DataFrame) -> List[Tuple[str, float]]:
+    """Converte o resumo por fornecedora na lista [(fornecedora, score)] ordenada pelo score."""
+    if summary is None or summary.empty:
+        return []
+    scores = summary.loc[summary.index != '', 'score'].sort_values(ascending=False, kind='stable')
+    return [(str(fornecedora), round(float(score), 2)) for fornecedora, score in scores.items()]
+
+
+def overdue_kpi_from_summary(summary: pd.DataFrame, bucket: str = 'all') -> Dict[str, float]:
+    """
+    Soma as métricas de uma faixa de atraso para todas as fornecedoras do resumo.
+    Retorna o mesmo dicionário dos KPIs: {'count', 'average_delay_days', 'pending_kwh'}.
+    """
+    if bucket not in OVERDUE_BUCKETS:
+        raise ValueError(f"Faixa de atraso desconhecida: '{bucket}'.")
+    if summary is None or summary.empty:
+        return dict(_EMPTY_KPI)
+
+    totals = summary[[f'count_{bucket}', f'dias_sum_{bucket}', f'dias_n_{bucket}', f'pending_kwh_{bucket}']].sum()
+    dias_n = int(totals[f'dias_n_{bucket}'])
+    return {
+        'count': int(totals[f'count_{bucket}']),
+        'average_delay_days': int(totals[f'dias_sum_{bucket}'] / dias_n) if dias_n > 0 else 0,
+        'pending_kwh': float(totals[f'pending_kwh_{bucket}']),
+    }
+
+
+def overdue_counts_by_uf(df: pd.DataFrame) -> List[Tuple[str, int]]:
+    """Conta clientes únicos com 'Atraso na Injeção' = 'SIM' por UF, ordenado pela UF."""
+    if df is None or df.empty:
+        return []
+    base = _prepare_injection_frame(df)
+    atrasados = base.loc[base['atraso'] & (base['ufconsumo'] != '')]
+    counts = atrasados.groupby('ufconsumo').size().sort_index()
+    return [(str(uf), int(count)) for uf, count in counts.items()]
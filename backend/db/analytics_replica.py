@@ -0,0 +1,274 @@
+# backend/db/analytics_replica.py
+"""
+Réplica analítica local (DuckDB, opcional) para as agregações do dashboard e da TV.
+
+Com ANALYTICS_REPLICA=True e o pacote `duckdb` instalado, as funções de agregação
+de db.dashboard e db.tv_dashboard consultam um arquivo DuckDB (colunar) em vez do
+PostgreSQL transacional. As páginas de relatório continuam lendo do PostgreSQL.
+
+* O arquivo guarda só as colunas que a aplicação lê (REPLICA_RELATIONS), inclusive
+  as views/materialized views usadas pela TV (copiadas como tabelas).
+* `flask analytics-replica build` recria tudo num arquivo temporário e troca o
+  arquivo com os.replace: quem está lendo nunca vê uma réplica pela metade.
+  No dia a dia, `flask analytics-replica sync` aplica só as alterações (db.replica_sync).
+* Leituras abrem o arquivo em modo read_only (vários processos ao mesmo tempo).
+* Se a réplica estiver desligada, ausente, sem carga/sincronização há mais de
+  ANALYTICS_REPLICA_MAX_AGE segundos ou se a query falhar no DuckDB, a query roda
+  no PostgreSQL (mesmo resultado, só mais lento).
+"""
+import functools
+import logging
+import os
+import re
+import time
+from typing import Optional
+from flask import current_app
+from .connection import ROUTE_REPLICA, get_pool
+from .executor import execute_query, execute_query_one, _build_column
+from .rows import Row, build_index, make_rows
+
+logger = logging.getLogger(__name__)
+
+# Colunas copiadas de cada relação (apenas o que dashboard/TV/resumo do mapa leem;
+# senhas e documentos do cliente ficam de fora)
+REPLICA_RELATIONS = {
+    'CLIENTES': (
+        'idcliente', 'nome', 'numinstalacao', 'numcliente', 'cnpj', '"cpf/cnpj"', 'cidade', 'celular',
+        'ufconsumo', 'concessionaria', 'fornecedora', 'idcomerc', 'consumomedio', 'data_ativo', 'dtcad',
+        'origem', 'status', 'validadosucesso', 'idconsultor', 'dtultalteracao',
+    ),
+    'RCB_CLIENTES': ('idrcb', 'numinstalacao', 'dtvencimento', 'dtpagamento'),
+    'DEVOLUTIVAS': ('idcliente', 'obs', 'corrigida', 'updated_at'),
+    'CONSULTOR': ('idconsultor', 'nome', 'uf'),
+    'CONTROLE_PRO': ('idconsultor', 'dtgraduacao'),
+    # View e materialized view usadas pelo dashboard da TV
+    'V_CUSTOMER': (
+        '"data ativo"', '"data cadastro"', '"data cancelamento"', '"média consumo"', '"validado sucesso"',
+        '"região"', 'fornecedora', 'licenciado', '"id licenciado"',
+    ),
+    'MV_DEVOLUTIVAS': ('idcliente', 'msgdevolutiva'),
+}
+
+# Tipos do PostgreSQL (OID) -> tipo da coluna no DuckDB; o resto vira VARCHAR
+_DUCKDB_TYPES = {
+    16: 'BOOLEAN', 20: 'BIGINT', 21: 'SMALLINT', 23: 'INTEGER', 26: 'BIGINT',
+    700: 'DOUBLE', 701: 'DOUBLE', 1700: 'DOUBLE',
+    1082: 'DATE', 1114: 'TIMESTAMP', 1184: 'TIMESTAMPTZ',
+}
+BATCH_SIZE = 50000
+
+_INTERVAL_PARAM_RE = re.compile(r"INTERVAL\s+'%s\s+(\w+)'", re.IGNORECASE)
+_warned_missing_duckdb = False
+# Queries que o DuckDB não executou, por geração da réplica (vão direto ao PostgreSQL)
+_unsupported = {}
+
+
+def _duckdb():
+    """Módulo duckdb, se instalado (dependência opcional)."""
+    global _warned_missing_duckdb
+    try:
+        import duckdb
+        return duckdb
+    except ImportError:
+        if not _warned_missing_duckdb:
+            logger.warning("ANALYTICS_REPLICA ativo, mas o pacote 'duckdb' não está instalado; usando o PostgreSQL.")
+            _warned_missing_duckdb = True
+        return None
+
+
+def replica_path(app=None) -> str:
+    app = app or current_app
+    return app.config.get('ANALYTICS_REPLICA_PATH') or os.path.join(app.instance_path, 'analytics.duckdb')
+
+
+def sync_state_path(app=None) -> str:
+    """Estado da sincronização incremental (db.replica_sync), ao lado do arquivo da réplica."""
+    return replica_path(app) + '.sync.json'
+
+
+def last_refresh(app=None) -> Optional[float]:
+    """Momento da última carga/sincronização bem-sucedida (epoch); None se não há réplica."""
+    try:
+        momento = os.path.getmtime(replica_path(app))
+    except OSError:
+        return None
+    try:
+        # A sincronização sem alterações só regrava o arquivo de estado
+        return max(momento, os.path.getmtime(sync_state_path(app)))
+    except OSError:
+        return momento
+
+
+# --- Tradução de SQL (PostgreSQL/psycopg2 -> DuckDB) ---
+@functools.lru_cache(maxsize=256)
+def translate_query(query: str) -> str:
+    """
+    Converte os placeholders do psycopg2 para o DuckDB:
+    `INTERVAL '%s day'` -> `(? * INTERVAL '1 day')`, `%s` -> `?` e `%%` -> `%`.
+    """
+    sql = _INTERVAL_PARAM_RE.sub(lambda m: f"(%s * INTERVAL '1 {m.group(1)}')", query)
+    return sql.replace('%s', '?').replace('%%', '%')
+
+
+# --- Leitura ---
+def generation() -> str:
+    """Identificador da réplica em uso (muda a cada rebuild; '' se desligada/indisponível)."""
+    if not current_app.config.get('ANALYTICS_REPLICA', False):
+        return ''
+    try:
+        return str(os.stat(replica_path()).st_mtime_ns)
+    except OSError:
+        return ''
+
+
+def _open_replica():
+    """Conexão read_only com a réplica, ou None se ela não deve/pode ser usada agora."""
+    config = current_app.config
+    if not config.get('ANALYTICS_REPLICA', False):
+        return None
+    duckdb = _duckdb()
+    if duckdb is None:
+        return None
+    path = replica_path()
+    atualizada_em = last_refresh()
+    if atualizada_em is None:
+        return None
+    idade = time.time() - atualizada_em
+    if idade > config.get('ANALYTICS_REPLICA_MAX_AGE', 900):
+        logger.debug(f"Réplica analítica desatualizada ({idade:.0f} s); usando o PostgreSQL.")
+        return None
+    try:
+        duck = duckdb.connect(path, read_only=True)
+        duck.execute("SET schema = 'public'")  # como no PostgreSQL, nomes sem schema -> public
+        return duck
+    except Exception as e:
+        # Ex.: sincronização gravando no arquivo neste momento
+        logger.info(f"Não foi possível abrir a réplica analítica ({e}); usando o PostgreSQL.")
+        return None
+
+
+def _run_on_replica(query, params):
+    """Executa na réplica; retorna (description, linhas) ou None para cair no PostgreSQL."""
+    gen = generation()
+    if query in _unsupported.get(gen, ()):
+        return None
+    duck = _open_replica()
+    if duck is None:
+        return None
+    try:
+        cursor = duck.execute(translate_query(query), list(params or ()))
+        return cursor.description, cursor.fetchall()
+    except Exception as e:
+        logger.warning(f"Query não suportada/falhou na réplica analítica ({e}); usando o PostgreSQL.")
+        # Não tenta de novo até a próxima geração da réplica
+        if gen not in _unsupported:
+            _unsupported.clear()
+        _unsupported.setdefault(gen, set()).add(query)
+        return None
+    finally:
+        duck.close()
+
+
+def execute_analytics_query(query, params=None):
+    """Como execute_query, mas lê da réplica analítica quando disponível."""
+    result = _run_on_replica(query, params)
+    if result is None:
+        return execute_query(query, params, route=ROUTE_REPLICA)
+    description, rows = result
+    return make_rows(description, rows)
+
+
+def execute_analytics_query_one(query, params=None) -> Optional[Row]:
+    """Como execute_query_one, mas lê da réplica analítica quando disponível."""
+    result = _run_on_replica(query, params)
+    if result is None:
+        return execute_query_one(query, params, route=ROUTE_REPLICA)
+    description, rows = result
+    return Row(build_index(description), rows[0]) if rows else None
+
+
+# --- Construção ---
+def select_sql(relation: str) -> str:
+    return f'SELECT {", ".join(REPLICA_RELATIONS[relation])} FROM public."{relation}"'
+
+
+def column_definitions(description) -> str:
+    return ", ".join(f'"{desc.name}" {_DUCKDB_TYPES.get(desc.type_code, "VARCHAR")}' for desc in description)
+
+
+def batch_frame(description, lote):
+    """DataFrame de um lote de tuplas do psycopg2, com dtypes compatíveis com a tabela no DuckDB."""
+    import pandas as pd
+
+    dados = {}
+    for desc, valores in zip(description, zip(*lote)):
+        if desc.type_code in _DUCKDB_TYPES:
+            dados[desc.name] = _build_column(list(valores), desc.type_code)
+        else:
+            dados[desc.name] = [None if v is None else str(v) for v in valores]
+    return pd.DataFrame(dados, columns=[desc.name for desc in description])
+
+
+def copy_rows(pg_conn, duck, target: str, sql: str, params=None, create: bool = False) -> int:
+    """
+    Copia o resultado de `sql` (PostgreSQL) para a tabela `target` do DuckDB em lotes,
+    com cursor do lado do servidor. Com create=True, cria a tabela antes.
+    """
+    with pg_conn.cursor(name="replica_copy") as cursor:
+        cursor.itersize = BATCH_SIZE
+        cursor.execute(sql, params)
+        lote = cursor.fetchmany(BATCH_SIZE)
+        if create:
+            duck.execute(f'CREATE TABLE {target} ({column_definitions(cursor.description)})')
+        total = 0
+        while lote:
+            duck.register('lote', batch_frame(cursor.description, lote))
+            duck.execute(f'INSERT INTO {target} SELECT * FROM lote')
+            duck.unregister('lote')
+            total += len(lote)
+            lote = cursor.fetchmany(BATCH_SIZE)
+    pg_conn.rollback()  # encerra a transação do cursor nomeado
+    return total
+
+
+def build_replica(app=None) -> dict:
+    """
+    Recria a réplica inteira a partir do PostgreSQL (arquivo temporário + os.replace).
+    Retorna {relação: linhas copiadas}. Levanta exceção se algo falhar (o arquivo
+    anterior é mantido).
+    """
+    app = app or current_app._get_current_object()
+    duckdb = _duckdb()
+    if duckdb is None:
+        raise RuntimeError("O pacote 'duckdb' não está instalado.")
+    path = replica_path(app)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    pool = get_pool(app)
+    if pool is None:
+        raise RuntimeError("Pool de conexões com o PostgreSQL indisponível.")
+    pg_conn = pool.getconn()
+    duck = duckdb.connect(tmp_path)
+    contagens = {}
+    try:
+        duck.execute("CREATE SCHEMA IF NOT EXISTS public")
+        for relation in REPLICA_RELATIONS:
+            inicio = time.perf_counter()
+            contagens[relation] = copy_rows(pg_conn, duck, f'public."{relation}"', select_sql(relation), create=True)
+            logger.info(f"Réplica analítica: {relation} copiada ({contagens[relation]} linhas, "
+                        f"{time.perf_counter() - inicio:.1f} s)")
+        duck.execute("CHECKPOINT")
+    except Exception:
+        duck.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        pool.putconn(pg_conn)
+    duck.close()
+    os.replace(tmp_path, path)
+    logger.info(f"Réplica analítica reconstruída em {path}")
+    return contagens
@@ -1,4 +1,9 @@
 # backend/db/connection.py
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
 import psycopg2
 import psycopg2.pool
 import logging
@@ -10,16 +15,96 @@ logger = logging.getLogger(__name__)
 # A variável db_pool agora é um objeto global que será preenchido
 db_pool = None
 
-def init_app(app):
+_pool_lock = threading.Lock()
+
+# Dicas de rota das queries (executor): o primário atende o que precisa do dado mais
+# recente (login, sonda de versões, leitura logo após escrita); a réplica de leitura
+# (DB_REPLICA_DSN), se configurada, atende relatórios, exportações e análises pesadas.
+ROUTE_PRIMARY = 'primary'
+ROUTE_REPLICA = 'replica'
+REPLICA_RETRY_SECONDS = 60
+
+# Força ROUTE_REPLICA para o primário (ver primary_reads)
+_primary_reads = contextvars.ContextVar('fastbi_primary_reads', default=False)
+
+# Atraso de replicação em segundos (0 se a réplica já aplicou tudo o que recebeu)
+_QUERY_REPLICA_LAG = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END AS lag;
+"""
+
+def init_app(app, with_pool: bool = True):
     """
     Função de inicialização que anexa o pool de conexões à aplicação Flask.
+    Com with_pool=False (servidor com pre-fork), o pool é criado depois, em cada
+    worker (init_pool/get_pool), para que os processos não compartilhem sockets.
     """
     if 'db_pool' not in app.extensions:
         app.extensions['db_pool'] = None
     
     app.teardown_appcontext(close_db)
     
-    app.extensions['db_pool'] = create_pool(app)
+    if with_pool:
+        init_pool(app)
+
+def init_pool(app):
+    """Cria o pool de conexões do processo atual (chamado no post_fork do Gunicorn)."""
+    with _pool_lock:
+        app.extensions['db_pool'] = create_pool(app)
+        app.extensions['db_pool_pid'] = os.getpid()
+    return app.extensions['db_pool']
+
+def get_pool(app=None, route: str = ROUTE_PRIMARY):
+    """
+    Retorna o pool do processo atual. Se ainda não foi criado neste processo (ou
+    foi herdado de outro via fork), cria um novo. Uma falha de criação não é
+    repetida a cada chamada: o pool fica None, como no init_app.
+
+    Com route=ROUTE_REPLICA, retorna o pool da réplica de leitura quando ela está
+    configurada, acessível e com atraso até DB_REPLICA_MAX_LAG (e fora de um bloco
+    primary_reads); senão, o do primário.
+    """
+    app = app or current_app
+    if route == ROUTE_REPLICA and not _primary_reads.get():
+        pool = _get_replica_pool(app)
+        if pool is not None:
+            return pool
+    if app.extensions.get('db_pool_pid') != os.getpid():
+        with _pool_lock:
+            if app.extensions.get('db_pool_pid') != os.getpid():
+                app.extensions['db_pool'] = create_pool(app)
+                app.extensions['db_pool_pid'] = os.getpid()
+    return app.extensions.get('db_pool')
+
+class BlockingConnectionPool(psycopg2.pool.ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool em que getconn() espera até `timeout` segundos por uma
+    conexão livre, em vez de levantar PoolError assim que as `maxconn` estão em uso.
+    Com as queries paralelas (db.parallel) e os produtores das exportações, um pico
+    de carga esgotaria o pool na hora, e o executor devolveria resultados vazios.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, *args, timeout: float = 10.0, **kwargs):
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._checkout_timeout = timeout
+        super().__init__(minconn, maxconn, *args, **kwargs)
+
+    def getconn(self, key=None):
+        if not self._slots.acquire(timeout=self._checkout_timeout):
+            raise psycopg2.pool.PoolError(
+                f"Nenhuma conexão livre no pool após {self._checkout_timeout:g} s (maxconn={self.maxconn}).")
+        try:
+            return super().getconn(key)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        super().putconn(conn, key, close)
+        self._slots.release()
 
 def create_pool(app):
     """
@@ -27,9 +112,11 @@ def create_pool(app):
     """
     try:
         logger.info("Inicializando pool de conexões com o banco de dados...")
-        pool = psycopg2.pool.SimpleConnectionPool(
+        # Pool thread-safe: as queries de uma requisição podem rodar em paralelo (db.parallel)
+        pool = BlockingConnectionPool(
             minconn=2,
-            maxconn=15,
+            maxconn=app.config.get('DB_POOL_MAXCONN', 15),
+            timeout=app.config.get('DB_POOL_TIMEOUT', 10),
             **app.config['DB_CONFIG']
         )
         conn = pool.getconn()
@@ -40,10 +127,128 @@ def create_pool(app):
         logger.critical(f"Falha CRÍTICA ao inicializar pool de conexões: {e}", exc_info=True)
         return None
 
+# --- Réplica de leitura (opcional) ---
+class _ReplicaState:
+    """Pool e último atraso medido da réplica, por processo."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.pool = None
+        self.failed_at = None
+        self.lag = None
+        self.checked_at = None
+        self.usable = None
+        self.lock = threading.Lock()
+
+def _replica_state(app) -> _ReplicaState:
+    state = app.extensions.get('db_replica')
+    if state is None or state.pid != os.getpid():
+        with _pool_lock:
+            state = app.extensions.get('db_replica')
+            if state is None or state.pid != os.getpid():
+                state = _ReplicaState()
+                app.extensions['db_replica'] = state
+    return state
+
+def _create_replica_pool(app):
+    try:
+        logger.info("Inicializando pool de conexões com a réplica de leitura...")
+        pool = BlockingConnectionPool(
+            minconn=1,
+            maxconn=app.config.get('DB_REPLICA_POOL_MAXCONN', 15),
+            timeout=app.config.get('DB_POOL_TIMEOUT', 10),
+            dsn=app.config['DB_REPLICA_DSN'],
+        )
+        logger.info("Pool da réplica de leitura inicializado com sucesso.")
+        return pool
+    except (psycopg2.Error, KeyError, Exception) as e:
+        logger.error(f"Réplica de leitura indisponível ({e}); usando o primário.")
+        return None
+
+def _measure_replica_lag(pool):
+    """Atraso de replicação em segundos, ou None se a réplica não responder."""
+    conn = None
+    try:
+        conn = pool.getconn()
+        with conn.cursor() as cursor:
+            cursor.execute(_QUERY_REPLICA_LAG)
+            lag = float(cursor.fetchone()[0])
+        conn.rollback()
+        return lag
+    except psycopg2.Error as e:
+        logger.warning(f"Falha ao medir o atraso da réplica de leitura: {e}")
+        if conn is not None:
+            pool.putconn(conn, close=True)
+            conn = None
+        return None
+    finally:
+        if conn is not None:
+            pool.putconn(conn)
+
+def _get_replica_pool(app):
+    """
+    Pool da réplica, ou None para cair no primário (réplica não configurada, fora do
+    ar ou atrasada). O atraso é medido a cada DB_REPLICA_LAG_CHECK_INTERVAL segundos
+    por um único thread; os demais usam a última medição.
+    """
+    if not app.config.get('DB_REPLICA_DSN'):
+        return None
+    state = _replica_state(app)
+    agora = time.monotonic()
+    if state.pool is None:
+        if state.failed_at is not None and agora - state.failed_at < REPLICA_RETRY_SECONDS:
+            return None
+        with state.lock:
+            if state.pool is None:
+                state.pool = _create_replica_pool(app)
+                if state.pool is None:
+                    state.failed_at = agora
+                    return None
+
+    intervalo = app.config.get('DB_REPLICA_LAG_CHECK_INTERVAL', 10)
+    if (state.checked_at is None or agora - state.checked_at >= intervalo) and state.lock.acquire(blocking=False):
+        try:
+            state.lag = _measure_replica_lag(state.pool)
+            state.checked_at = agora
+            limite = app.config.get('DB_REPLICA_MAX_LAG', 30)
+            usable = state.lag is not None and state.lag <= limite
+            if usable != state.usable:
+                if usable:
+                    logger.info(f"Réplica de leitura em uso (atraso {state.lag:.1f} s).")
+                else:
+                    logger.warning(f"Réplica de leitura atrasada ou fora do ar (atraso {state.lag} s, "
+                                   f"limite {limite} s); usando o primário.")
+            state.usable = usable
+        finally:
+            state.lock.release()
+    return state.pool if state.usable else None
+
+@contextmanager
+def primary_reads(active: bool = True):
+    """
+    Dentro do bloco (com active=True), as queries com ROUTE_REPLICA leem do primário.
+    Usado pelos caches chaveados por versão logo depois de uma mudança, enquanto a
+    réplica ainda pode não ter aplicado os dados da nova versão (data_version.replica_settled).
+    """
+    token = _primary_reads.set(bool(active) or _primary_reads.get())
+    try:
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+def primary_reads_active() -> bool:
+    return _primary_reads.get()
+
+def replica_lag(app=None):
+    """Último atraso medido da réplica (segundos), ou None se não há medição."""
+    app = app or current_app
+    state = app.extensions.get('db_replica')
+    return state.lag if state is not None and state.pid == os.getpid() else None
+
 def get_db():
     """Obtém uma conexão do pool para a requisição Flask atual (g)."""
     if 'db_conn' not in g:
-        pool = current_app.extensions.get('db_pool')
+        pool = get_pool()
         if pool is None:
             raise ConnectionError('Database pool not available.')
         try:
@@ -74,6 +279,12 @@ def close_db(e=None):
 
 def close_pool(app):
     """Fecha todas as conexões no pool (útil no desligamento da app)."""
+    replica = app.extensions.get('db_replica')
+    if replica is not None and replica.pid == os.getpid() and replica.pool is not None:
+        try:
+            replica.pool.closeall()
+        except Exception as e:
+            logger.error(f"Erro ao fechar o pool da réplica de leitura: {e}", exc_info=True)
     pool = app.extensions.get('db_pool')
     if pool:
         try:
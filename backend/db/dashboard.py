@@ -1,16 +1,24 @@
 # backend/db/dashboard.py
 import logging
-from typing import List, Tuple, Optional, Union
+import os
+from typing import List, Tuple, Optional, Union, Dict, Any
 from datetime import datetime
-from .executor import execute_query, execute_query_one
-from collections import defaultdict
+# Agregações leem da réplica analítica (DuckDB) quando ligada; senão, do PostgreSQL
+from .analytics_replica import execute_analytics_query, execute_analytics_query_one
 from . import reports_boletos
-import pandas as pd
+from .data_version import versioned_cache
 from .reports_boletos import final_columns_order as reports_boletos_columns_order
 
 logger = logging.getLogger(__name__)
 
+_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Tabelas de que cada grupo de funções depende (chave dos caches versionados)
+CLIENTES_TABLES = ('CLIENTES',)
+RCB_TABLES = ('CLIENTES', 'RCB_CLIENTES')
+
 # --- FUNÇÕES PARA O DASHBOARD (KPIs, Resumos, Gráficos) ---
+@versioned_cache(*CLIENTES_TABLES)
 def get_total_consumo_medio_by_month(month_str: Optional[str] = None, fornecedora: Optional[str] = None) -> float:
     """Calcula a soma total de 'consumomedio' para clientes ativos no mês (data_ativo), opcionalmente filtrado por fornecedora."""
     base_query = """
@@ -36,12 +44,13 @@ def get_total_consumo_medio_by_month(month_str: Optional[str] = None, fornecedor
 
     final_query = base_query.format(date_filter=date_filter_sql, fornecedora_filter=fornecedora_filter_sql)
     try:
-        result = execute_query_one(final_query, tuple(params))
+        result = execute_analytics_query_one(final_query, tuple(params))
         return float(result.get('total_consumo', 0.0)) if result else 0.0
     except Exception as e:
         logger.error(f"Erro get_total_consumo_medio_by_month ({month_str}, {fornecedora}): {e}", exc_info=True)
         return 0.0
 
+@versioned_cache(*CLIENTES_TABLES)
 def count_clientes_ativos_by_month(month_str: Optional[str] = None, fornecedora: Optional[str] = None) -> int:
     """Conta clientes ativos no mês (data_ativo)."""
     base_query = """
@@ -67,12 +76,13 @@ def count_clientes_ativos_by_month(month_str: Optional[str] = None, fornecedora:
 
     final_query = base_query.format(date_filter=date_filter_sql, fornecedora_filter=fornecedora_filter_sql)
     try:
-        result = execute_query_one(final_query, tuple(params))
+        result = execute_analytics_query_one(final_query, tuple(params))
         return int(result.get('total_clientes', 0)) if result else 0
     except Exception as e:
         logger.error(f"Erro count_clientes_ativos_by_month ({month_str}, {fornecedora}): {e}", exc_info=True)
         return 0
 
+@versioned_cache(*CLIENTES_TABLES)
 def count_clientes_registrados_by_month(month_str: Optional[str] = None, fornecedora: Optional[str] = None) -> int:
     """Conta clientes registrados no mês (dtcad)."""
     base_query = """
@@ -98,12 +108,13 @@ def count_clientes_registrados_by_month(month_str: Optional[str] = None, fornece
 
     final_query = base_query.format(date_filter=date_filter_sql, fornecedora_filter=fornecedora_filter_sql)
     try:
-        result = execute_query_one(final_query, tuple(params))
+        result = execute_analytics_query_one(final_query, tuple(params))
         return int(result.get('total_clientes', 0)) if result else 0
     except Exception as e:
         logger.error(f"Erro count_clientes_registrados_by_month ({month_str}, {fornecedora}): {e}", exc_info=True)
         return 0
 
+@versioned_cache(*CLIENTES_TABLES)
 def get_fornecedora_summary(month_str: Optional[str] = None) -> Union[List[Tuple[str, int, float]], None]:
     """Busca resumo (qtd, consumo) por fornecedora para clientes ativos no mês (data_ativo)."""
     base_query = """
@@ -125,7 +136,7 @@ def get_fornecedora_summary(month_str: Optional[str] = None) -> Union[List[Tuple
         except ValueError: logger.warning(f"Formato de mês inválido para resumo fornecedora: '{month_str}'."); date_filter_sql = "c.data_ativo IS NOT NULL"; params = []
     final_query = base_query.format(date_filter=date_filter_sql)
     try:
-        results = execute_query(final_query, tuple(params))
+        results = execute_analytics_query(final_query, tuple(params))
         if results:
             return [(str(row['fornecedora_tratada']), int(row['qtd_clientes']), float(row['soma_consumo_medio_por_fornecedora']) if row['soma_consumo_medio_por_fornecedora'] is not None else 0.0) for row in results]
         else:
@@ -134,6 +145,7 @@ def get_fornecedora_summary(month_str: Optional[str] = None) -> Union[List[Tuple
         logger.error(f"Erro get_fornecedora_summary ({month_str}): {e}", exc_info=True)
         return None
 
+@versioned_cache(*CLIENTES_TABLES)
 def get_concessionaria_summary(month_str: Optional[str] = None) -> Union[List[Tuple[str, int, float]], None]:
     """Busca resumo (qtd, consumo) por CONCESSIONÁRIA para clientes ativos no mês (data_ativo)."""
     base_query = """
@@ -159,7 +171,7 @@ def get_concessionaria_summary(month_str: Optional[str] = None) -> Union[List[Tu
         except ValueError: logger.warning(f"Formato de mês inválido para resumo concessionaria: '{month_str}'."); date_filter_sql = "c.data_ativo IS NOT NULL"; params = []
     final_query = base_query.format(date_filter=date_filter_sql)
     try:
-        results = execute_query(final_query, tuple(params))
+        results = execute_analytics_query(final_query, tuple(params))
         if results:
             return [(str(row['regiao_concessionaria']), int(row['qtd_clientes']), float(row['soma_consumo_medio']) if row['soma_consumo_medio'] is not None else 0.0) for row in results]
         else:
@@ -168,6 +180,7 @@ def get_concessionaria_summary(month_str: Optional[str] = None) -> Union[List[Tu
         logger.error(f"Erro get_concessionaria_summary ({month_str}): {e}", exc_info=True)
         return None
 
+@versioned_cache(*CLIENTES_TABLES)
 def get_monthly_active_clients_by_year(year: int, fornecedora: Optional[str] = None) -> List[int]:
     """Busca contagem mensal de clientes ativados por ano (data_ativo) para gráfico."""
     query = """
@@ -188,7 +201,7 @@ def get_monthly_active_clients_by_year(year: int, fornecedora: Optional[str] = N
     
     monthly_counts = [0] * 12
     try:
-        results = execute_query(final_query, tuple(params))
+        results = execute_analytics_query(final_query, tuple(params))
         if results:
             for row in results:
                 month_index = row['mes'] - 1
@@ -200,6 +213,7 @@ def get_monthly_active_clients_by_year(year: int, fornecedora: Optional[str] = N
         return [0] * 12
 
 # --- FUNÇÕES PARA GRÁFICOS PIZZA/BARRAS DO DASHBOARD ---
+@versioned_cache(*CLIENTES_TABLES)
 def get_active_clients_count_by_fornecedora_month(month_str: Optional[str] = None) -> Union[List[Tuple[str, int]], None]:
     """
     Busca a contagem de clientes ativos (por data_ativo) agrupados por fornecedora
@@ -237,7 +251,7 @@ def get_active_clients_count_by_fornecedora_month(month_str: Optional[str] = Non
     final_query = base_query.format(date_filter=date_filter_sql)
     logger.debug(f"Executando query para gráfico pizza fornecedora (Mês: {month_str or 'Todos'}): {final_query} com params: {params}")
     try:
-        results = execute_query(final_query, tuple(params))
+        results = execute_analytics_query(final_query, tuple(params))
         if results:
             formatted_results = [(str(row['fornecedora_tratada']), int(row['qtd_clientes'])) for row in results]
             logger.info(f"[PIE CHART] Dados por fornecedora (Mês: {month_str or 'Todos'}) encontrados: {len(formatted_results)} registros.")
@@ -249,6 +263,7 @@ def get_active_clients_count_by_fornecedora_month(month_str: Optional[str] = Non
         logger.error(f"[PIE CHART] Erro ao buscar dados para gráfico pizza fornecedora (Mês: {month_str or 'Todos'}): {e}", exc_info=True)
         return None
 
+@versioned_cache(*CLIENTES_TABLES)
 def get_active_clients_count_by_concessionaria_month(month_str: Optional[str] = None) -> Union[List[Tuple[str, int]], None]:
     """
     Busca a CONTAGEM de clientes ativos agrupados por Região/Concessionária,
@@ -288,7 +303,7 @@ def get_active_clients_count_by_concessionaria_month(month_str: Optional[str] =
     final_query = base_query.format(date_filter=date_filter_sql)
     logger.debug(f"Buscando contagem de clientes por concessionária (Mês: {month_str or 'Todos'})...")
     try:
-        results = execute_query(final_query, tuple(params))
+        results = execute_analytics_query(final_query, tuple(params))
         if results:
             formatted_results = [(str(row['regiao_concessionaria']), int(row['qtd_clientes'])) for row in results]
             logger.debug(f"Contagem por concessionária (Mês: {month_str or 'Todos'}) encontrada: {len(formatted_results)} registros.")
@@ -300,6 +315,7 @@ def get_active_clients_count_by_concessionaria_month(month_str: Optional[str] =
         logger.error(f"Erro ao buscar contagem por concessionária (Mês: {month_str or 'Todos'}): {e}", exc_info=True)
         return None
 
+@versioned_cache(*CLIENTES_TABLES)
 def get_state_map_data() -> List[Tuple[str, int, float]]:
     """
     Busca a CONTAGEM de clientes ativos e a SOMA de 'consumomedio' desses clientes,
@@ -322,7 +338,7 @@ def get_state_map_data() -> List[Tuple[str, int, float]]:
     """
     logger.info("Buscando CONTAGEM e SOMA de consumo médio por estado para o mapa...")
     try:
-        results = execute_query(query)
+        results = execute_analytics_query(query)
         formatted_results = [
             (
                 str(row['estado_uf']),
@@ -337,6 +353,7 @@ def get_state_map_data() -> List[Tuple[str, int, float]]:
         logger.error(f"Erro ao buscar dados agregados por estado para o mapa: {e}", exc_info=True)
         return []
 
+@versioned_cache(*RCB_TABLES)
 def get_fornecedora_summary_no_rcb() -> Union[List[Tuple[str, int, float]], None]:
     """
     Busca resumo (qtd clientes, soma consumo) por fornecedora para clientes
@@ -397,7 +414,7 @@ def get_fornecedora_summary_no_rcb() -> Union[List[Tuple[str, int, float]], None
     # Log message atualizado para refletir ambos critérios
     logger.info("Executando query para card 'Fornecedoras s/ RCB (Clientes > 100d)'...")
     try:
-        results = execute_query(query)
+        results = execute_analytics_query(query)
         if results:
             formatted_results = [
                 (
@@ -416,6 +433,7 @@ def get_fornecedora_summary_no_rcb() -> Union[List[Tuple[str, int, float]], None
         logger.error(f"Erro ao buscar dados para 'Fornecedoras s/ RCB (Clientes > 100d)': {e}", exc_info=True)
         return None
 
+@versioned_cache(*RCB_TABLES)
 def get_overdue_payments_by_fornecedora(days_overdue: int = 30) -> Union[List[Tuple[str, int]], None]:
     """
     Busca a contagem de instalações com pagamentos vencidos há X dias (sem pagamento),
@@ -455,7 +473,7 @@ def get_overdue_payments_by_fornecedora(days_overdue: int = 30) -> Union[List[Tu
     params = (days_overdue,) # Passa o valor como parâmetro
     logger.info(f"Buscando pagamentos vencidos há {days_overdue} dias por fornecedora...")
     try:
-        results = execute_query(query, params)
+        results = execute_analytics_query(query, params)
         if results:
             formatted_results = [(str(row['fornecedora_tratada']), int(row['quantidade_vencido_sem_pgto'])) for row in results]
             logger.info(f"Dados de vencidos ({days_overdue} dias) encontrados: {len(formatted_results)} fornecedoras.")
@@ -468,6 +486,7 @@ def get_overdue_payments_by_fornecedora(days_overdue: int = 30) -> Union[List[Tu
         return None
 
 # --- INÍCIO DA NOVA FUNÇÃO PARA GREEN SCORE ---
+@versioned_cache(*reports_boletos.BOLETOS_TABLES)
 def get_green_score_by_fornecedora(fornecedora_filter: Optional[str] = None) -> Union[List[Tuple[str, float]], None]:
     """
     Calcula o "Green Score" para cada fornecedora baseado na pontualidade de injeção,
@@ -489,91 +508,19 @@ def get_green_score_by_fornecedora(fornecedora_filter: Optional[str] = None) ->
     logger.info(log_msg)
 
     try:
-        # 1. Obter todos os dados do relatório de boletos, sem paginação.
+        # 1. Obter todos os dados do relatório de boletos (DataFrame), sem paginação.
         # Passa o fornecedora_filter diretamente. Se for None, reports_boletos trará todos.
-        all_clients_data = reports_boletos.get_boletos_por_cliente_data(
-            limit=None, 
-            export_mode=True, 
-            fornecedora=fornecedora_filter
-        )
+        df_boletos = reports_boletos.get_boletos_por_cliente_frame(limit=None, fornecedora=fornecedora_filter)
 
-        if not all_clients_data:
+        if df_boletos.empty:
             logger.warning("Nenhum dado retornado do relatório de boletos para calcular o Green Score.")
             return []
 
-        # 3. Processar os dados em Python para calcular o score por fornecedora
-        # Usaremos defaultdicts para acumular os contadores necessários
-        total_unique_clients_by_supplier = defaultdict(int)
-        total_deterioration_points_by_supplier = defaultdict(float) # Float para permitir soma de pontos
-
-        # Para garantir que cada cliente seja contado apenas uma vez por fornecedora
-        seen_clients_by_supplier = defaultdict(set)
-
-        for row in all_clients_data:
-            try:
-                fornecedora_raw = row['fornecedora']
-                atraso_status = row['atraso_na_injecao']
-                dias_atraso_raw = row['dias_em_atraso']
-                codigo_cliente = row['codigo']
-
-                # Limpeza e padronização da fornecedora
-                if not fornecedora_raw or (isinstance(fornecedora_raw, str) and fornecedora_raw.strip() == '') or pd.isna(fornecedora_raw):
-                    continue # Pula para o próximo registro no loop
-                fornecedora = fornecedora_raw.strip().upper()
-
-                # Garante que o cliente seja contado apenas uma vez por fornecedora
-                if codigo_cliente in seen_clients_by_supplier[fornecedora]:
-                    continue
-                seen_clients_by_supplier[fornecedora].add(codigo_cliente)
-
-                total_unique_clients_by_supplier[fornecedora] += 1
-
-                # Determinar os pontos de deterioração
-                if atraso_status == 'SIM':
-                    try:
-                        dias_atraso = float(dias_atraso_raw) if dias_atraso_raw not in [None, '', 'N/A'] else 0
-                        if dias_atraso > 30: # Crítico: peso 2
-                            total_deterioration_points_by_supplier[fornecedora] += 2
-                        elif dias_atraso > 0 and dias_atraso <= 30: # Não Crítico: peso 1
-                            total_deterioration_points_by_supplier[fornecedora] += 1
-                        # Se dias_atraso <= 0 (e atraso_status == 'SIM'), não adiciona pontos de deterioração
-                    except (ValueError, TypeError):
-                        logger.warning(f"Dias de atraso inválidos para cliente {codigo_cliente}: '{dias_atraso_raw}'. Tratando como 0 pontos de deterioração.")
-                        # Se não conseguir parsear, não adiciona pontos de deterioração
-                # Se atraso_status == 'NÃO', não adiciona pontos de deterioração
-
-            except (KeyError, IndexError) as e:
-                logger.error(f"Erro de chave/índice ao processar linha: {e}. Linha de dados: {row}")
-                continue # Pula para a próxima linha para evitar quebrar o loop
-
-        # 4. Calcular o score final para cada fornecedora
-        scores = []
-        for fornecedora, total_clients in total_unique_clients_by_supplier.items():
-            deterioration_points = total_deterioration_points_by_supplier.get(fornecedora, 0)
-
-            # O máximo de pontos de deterioração se todos os clientes fossem críticos (peso 2)
-            max_possible_deterioration_points = total_clients * 2
-
-            score = 0.0
-            if total_clients > 0:
-                # Evita divisão por zero para max_possible_deterioration_points
-                if max_possible_deterioration_points > 0:
-                    score = 100 - ((deterioration_points / max_possible_deterioration_points) * 100)
-                    # Garante que o score não seja negativo
-                    score = max(0.0, score)
-                else: 
-                    # Se não há clientes com atraso (max_possible_deterioration_points é 0),
-                    # ou todos estão no tempo, o score é 100
-                    score = 100.0
-            else: 
-                # Se não há clientes para essa fornecedora, o score pode ser considerado 100 (saúde perfeita por ausência de dados negativos)
-                score = 100.0 
-
-            scores.append((fornecedora, round(score, 2)))
-
-        # 5. Ordenar pelo score, do maior para o menor
-        scores.sort(key=lambda x: x[1], reverse=True)
-        
+        # 2. Calcula pontos de deterioração e score de todas as fornecedoras numa única passagem
+        from . import analytics  # pandas sob demanda
+        summary = analytics.summarize_injection_by_fornecedora(df_boletos)
+        scores = analytics.green_scores_from_summary(summary)
+
         logger.info(f"Green Score (Atraso Injeção) calculado para {len(scores)} fornecedoras com pesos.")
         return scores
 
@@ -581,50 +528,69 @@ def get_green_score_by_fornecedora(fornecedora_filter: Optional[str] = None) ->
         logger.error(f"Erro inesperado ao calcular o Green Score (Atraso Injeção) com pesos: {e}", exc_info=True)
         return None
 
+# --- RESUMO DO MAPA (ativos, consumo e atraso por UF numa única query) ---
+_STATE_MAP_SUMMARY_QUERY = reports_boletos.CTE_BASE + reports_boletos.OVERDUE_BY_UF_CTE + """,
+AtivosPorUF AS (
+    SELECT
+        UPPER(TRIM(c.ufconsumo)) AS uf,
+        COUNT(DISTINCT c.idcliente) AS total_clientes,
+        SUM(COALESCE(c.consumomedio, 0)) AS total_consumo_medio
+    FROM public."CLIENTES" c
+    WHERE
+        c.data_ativo IS NOT NULL
+        AND c.ufconsumo IS NOT NULL AND TRIM(c.ufconsumo) <> ''
+        AND (c.origem IS NULL OR c.origem IN ('', 'WEB', 'BACKOFFICE', 'APP'))
+    GROUP BY UPPER(TRIM(c.ufconsumo))
+)
+SELECT
+    COALESCE(a.uf, o.uf) AS uf,
+    COALESCE(a.total_clientes, 0) AS total_clientes,
+    COALESCE(a.total_consumo_medio, 0) AS total_consumo_medio,
+    COALESCE(o.overdue_count, 0) AS overdue_count
+FROM AtivosPorUF a
+FULL OUTER JOIN AtrasoPorUF o ON o.uf = a.uf
+WHERE COALESCE(a.uf, o.uf) <> ''
+ORDER BY 1;
+"""
+
+@versioned_cache(*reports_boletos.BOLETOS_TABLES)
+def get_state_map_summary() -> List[Dict[str, Any]]:
+    """
+    Resumo por UF para o mapa: clientes ativos, soma de consumo médio e clientes com
+    'Atraso na Injeção' = 'SIM'. Tudo é agregado no banco (≈27 linhas voltam para o
+    Python) e o resultado fica em cache até as tabelas de origem mudarem.
+    """
+
+    ufs, concessionarias, fornecedoras, prazos = reports_boletos.load_prazos_arrays(_PROJECT_ROOT)
+    params = ('CANCELADO%', ufs, concessionarias, fornecedoras, prazos,
+              reports_boletos.load_codigos_com_retorno(_PROJECT_ROOT))
+    logger.info("Buscando resumo do mapa por estado (ativos, consumo e atraso)...")
+    try:
+        results = execute_analytics_query(_STATE_MAP_SUMMARY_QUERY, params)
+        summary = [
+            {
+                'uf': str(row['uf']),
+                'count': int(row['total_clientes'] or 0),
+                'sum_consumo': float(row['total_consumo_medio'] or 0.0),
+                'overdue_count': int(row['overdue_count'] or 0),
+            }
+            for row in results
+        ]
+        logger.info(f"Resumo do mapa encontrado: {len(summary)} estados.")
+        return summary
+    except Exception as e:
+        logger.error(f"Erro ao buscar resumo do mapa por estado: {e}", exc_info=True)
+        return []
+
 def get_overdue_clients_by_state_for_map() -> List[Tuple[str, int]]:
     """
     Busca a contagem de clientes com 'Atraso na Injeção' = 'SIM',
-    agrupados por estado (UF).
+    agrupados por estado (UF). Derivado de get_state_map_summary (agregado no banco).
     """
-    logger.info("Buscando clientes com atraso na injeção por estado para o mapa...")
-
-    try:
-        all_clients_data = reports_boletos.get_boletos_por_cliente_data(
-            limit=None,
-            export_mode=True,
-            fornecedora=None
-        )
-
-        if not all_clients_data:
-            logger.warning("Nenhum dado retornado do relatório de boletos para calcular atraso por estado.")
-            return []
-
-        overdue_counts_by_uf = defaultdict(int)
-        seen_codigos = set()
-
-        for row in all_clients_data:
-            codigo_cliente = row.get('codigo')
-            if codigo_cliente and codigo_cliente not in seen_codigos:
-                seen_codigos.add(codigo_cliente)
-                
-                if row.get('atraso_na_injecao') == 'SIM':
-                    uf = row.get('ufconsumo')
-                    if uf and isinstance(uf, str) and uf.strip() != '':
-                        uf_cleaned = uf.strip().upper()
-                        overdue_counts_by_uf[uf_cleaned] += 1
-                    else:
-                        logger.debug(f"UF inválida ou vazia encontrada no registro para o cliente {codigo_cliente}")
-
-        formatted_results = sorted(overdue_counts_by_uf.items(), key=lambda item: item[0])
-
-        logger.info(f"Dados de clientes com atraso por estado para o mapa encontrados: {len(formatted_results)} estados.")
-        return formatted_results
-
-    except Exception as e:
-        logger.error(f"Erro ao buscar clientes com atraso por estado para o mapa: {e}", exc_info=True)
-        return []
+    return [(row['uf'], row['overdue_count']) for row in get_state_map_summary() if row['overdue_count'] > 0]
 
 # --- NOVA FUNÇÃO: get_total_consumo_medio_consolidado ---
+@versioned_cache(*CLIENTES_TABLES)
 def get_total_consumo_medio_consolidado(fornecedora: Optional[str] = None) -> float:
     """
     Calcula a soma total de 'consumomedio' para clientes ativos,
@@ -645,13 +611,14 @@ def get_total_consumo_medio_consolidado(fornecedora: Optional[str] = None) -> fl
     final_query = base_query.format(fornecedora_filter=fornecedora_filter_sql)
     logger.info(f"Buscando consumo médio consolidado (Forn: {fornecedora or 'Todos'}): {final_query}")
     try:
-        result = execute_query_one(final_query, tuple(params))
+        result = execute_analytics_query_one(final_query, tuple(params))
         return float(result.get('total_consumo', 0.0)) if result else 0.0
     except Exception as e:
         logger.error(f"Erro get_total_consumo_medio_consolidado (Forn: {fornecedora}): {e}", exc_info=True)
         return 0.0
 
 # --- NOVA FUNÇÃO: count_clientes_ativos_consolidado ---
+@versioned_cache(*CLIENTES_TABLES)
 def count_clientes_ativos_consolidado(fornecedora: Optional[str] = None) -> int:
     """
     Conta o total de clientes ativos (data_ativo)
@@ -672,13 +639,14 @@ def count_clientes_ativos_consolidado(fornecedora: Optional[str] = None) -> int:
     final_query = base_query.format(fornecedora_filter=fornecedora_filter_sql)
     logger.info(f"Contando clientes ativos consolidados (Forn: {fornecedora or 'Todos'}): {final_query}")
     try:
-        result = execute_query_one(final_query, tuple(params))
+        result = execute_analytics_query_one(final_query, tuple(params))
         return int(result.get('total_clientes', 0)) if result else 0
     except Exception as e:
         logger.error(f"Erro count_clientes_ativos_consolidado (Forn: {fornecedora}): {e}", exc_info=True)
         return 0
 
 # --- NOVA FUNÇÃO: count_clientes_registrados_consolidado ---
+@versioned_cache(*CLIENTES_TABLES)
 def count_clientes_registrados_consolidado(fornecedora: Optional[str] = None) -> int:
     """
     Conta o total de clientes registrados (dtcad)
@@ -699,12 +667,13 @@ def count_clientes_registrados_consolidado(fornecedora: Optional[str] = None) ->
     final_query = base_query.format(fornecedora_filter=fornecedora_filter_sql)
     logger.info(f"Contando clientes registrados consolidados (Forn: {fornecedora or 'Todos'}): {final_query}")
     try:
-        result = execute_query_one(final_query, tuple(params))
+        result = execute_analytics_query_one(final_query, tuple(params))
         return int(result.get('total_clientes', 0)) if result else 0
     except Exception as e:
         logger.error(f"Erro count_clientes_registrados_consolidado (Forn: {fornecedora}): {e}", exc_info=True)
         return 0
 
+@versioned_cache(*reports_boletos.BOLETOS_TABLES)
 def count_overdue_injection_clients(fornecedora: Optional[str] = None) -> dict:
     """
     Conta o número total de clientes que possuem "Atraso na Injeção" = 'SIM',
@@ -726,62 +695,22 @@ def count_overdue_injection_clients(fornecedora: Optional[str] = None) -> dict:
     logger.info(log_msg)
 
     try:
-        # Reutiliza a função get_boletos_por_cliente_data para obter os dados já processados.
-        all_clients_data = reports_boletos.get_boletos_por_cliente_data(
-            limit=None,
-            export_mode=True,
-            fornecedora=fornecedora
-        )
+        # Reutiliza o DataFrame do relatório de boletos (lógica de "Atraso na Injeção" já aplicada)
+        df_boletos = reports_boletos.get_boletos_por_cliente_frame(limit=None, fornecedora=fornecedora)
 
-        if not all_clients_data:
+        if df_boletos.empty:
             logger.warning("Nenhum dado retornado do relatório de boletos para contar clientes com atraso na injeção.")
             return {'count': 0, 'average_delay_days': 0, 'pending_kwh': 0}
 
-        # Processar dados únicos por cliente
-        seen_codigos = set()
-        unique_overdue_count = 0
-        total_dias_atraso = 0
-        total_consumo_medio = 0
-        clientes_com_dias_validos = 0
-
-        for row in all_clients_data:
-            codigo_cliente = row.get('codigo')
-            if codigo_cliente and codigo_cliente not in seen_codigos:
-                seen_codigos.add(codigo_cliente)
-                if row.get('atraso_na_injecao') == 'SIM':
-                    unique_overdue_count += 1
-                    
-                    # Processar dias em atraso
-                    try:
-                        dias_atraso_raw = row.get('dias_em_atraso')
-                        dias_atraso = float(dias_atraso_raw) if dias_atraso_raw not in [None, '', 'N/A'] else 0
-                        if dias_atraso > 0: # Considera apenas se dias_atraso > 0
-                            total_dias_atraso += dias_atraso
-                            clientes_com_dias_validos += 1
-                    except (ValueError, TypeError):
-                        pass  # Ignora valores inválidos
-                    
-                    # Processar consumo médio
-                    try:
-                        consumo_medio_raw = row.get('consumomedio')
-                        consumo_medio = float(consumo_medio_raw) if consumo_medio_raw not in [None, '', 'N/A'] else 0
-                        total_consumo_medio += consumo_medio
-                    except (ValueError, TypeError):
-                        pass  # Ignora valores inválidos
-
-        # Calcular média de dias de atraso
-        average_delay_days = int(total_dias_atraso / clientes_com_dias_validos) if clientes_com_dias_validos > 0 else 0
-
-        # Log detalhado da contagem e cálculos
-        logger.info(f"Contagem de clientes com atraso na injeção: {unique_overdue_count}")
-        logger.info(f"Soma total de dias de atraso: {total_dias_atraso} (Clientes com dias válidos: {clientes_com_dias_validos})")
-        logger.info(f"Soma total de consumo médio (kWh pendentes): {total_consumo_medio}")
-
-        return {
-            'count': unique_overdue_count,
-            'average_delay_days': average_delay_days,
-            'pending_kwh': total_consumo_medio
-        }
+        from . import analytics  # pandas sob demanda
+        summary = analytics.summarize_injection_by_fornecedora(df_boletos)
+        result = analytics.overdue_kpi_from_summary(summary, bucket='all')
+
+        logger.info(f"Contagem de clientes com atraso na injeção: {result['count']}")
+        logger.info(f"Média de dias de atraso: {result['average_delay_days']}")
+        logger.info(f"Soma total de consumo médio (kWh pendentes): {result['pending_kwh']}")
+
+        return result
 
     except Exception as e:
         logger.error(f"Erro inesperado ao contar clientes com atraso na injeção: {e}", exc_info=True)
@@ -789,6 +718,7 @@ def count_overdue_injection_clients(fornecedora: Optional[str] = None) -> dict:
 
 
 # --- NOVA FUNÇÃO: count_overdue_injection_clients_up_to_30_days ---
+@versioned_cache(*reports_boletos.BOLETOS_TABLES)
 def count_overdue_injection_clients_up_to_30_days(fornecedora: Optional[str] = None) -> dict:
     """
     Conta o número total de clientes com "Atraso na Injeção" = 'SIM'
@@ -814,64 +744,22 @@ def count_overdue_injection_clients_up_to_30_days(fornecedora: Optional[str] = N
     logger.info(log_msg)
 
     try:
-        # Reutiliza a função get_boletos_por_cliente_data para obter os dados já processados.
-        # Isso garante que a lógica de "Atraso na Injeção" e "Dias em Atraso" já esteja aplicada.
-        all_clients_data = reports_boletos.get_boletos_por_cliente_data(
-            limit=None,
-            export_mode=True,
-            fornecedora=fornecedora
-        )
+        # Reutiliza o DataFrame do relatório de boletos (lógica de "Atraso na Injeção" já aplicada)
+        df_boletos = reports_boletos.get_boletos_por_cliente_frame(limit=None, fornecedora=fornecedora)
 
-        if not all_clients_data:
+        if df_boletos.empty:
             logger.warning("Nenhum dado retornado do relatório de boletos para contar clientes com atraso na injeção <= 30 dias.")
             return {'count': 0, 'average_delay_days': 0, 'pending_kwh': 0}
 
-        # Processar dados únicos por cliente com a nova condição de 30 dias
-        seen_codigos = set()
-        unique_overdue_count = 0
-        total_dias_atraso = 0
-        total_consumo_medio = 0
-        clientes_com_dias_validos = 0
-
-        for row in all_clients_data:
-            codigo_cliente = row.get('codigo')
-            if codigo_cliente and codigo_cliente not in seen_codigos:
-                seen_codigos.add(codigo_cliente)
-                
-                # Verifica a condição principal de atraso na injeção
-                if row.get('atraso_na_injecao') == 'SIM':
-                    # Nova condição: Dias em Atraso <= 30
-                    try:
-                        dias_atraso_raw = row.get('dias_em_atraso')
-                        dias_atraso = float(dias_atraso_raw) if dias_atraso_raw not in [None, '', 'N/A'] else 0
-                        
-                        if dias_atraso > 0 and dias_atraso <= 30: # Aplica o filtro de 30 dias
-                            unique_overdue_count += 1
-                            total_dias_atraso += dias_atraso
-                            clientes_com_dias_validos += 1
-                            
-                            # Processar consumo médio para os clientes filtrados
-                            try:
-                                consumo_medio_raw = row.get('consumomedio')
-                                consumo_medio = float(consumo_medio_raw) if consumo_medio_raw not in [None, '', 'N/A'] else 0
-                                total_consumo_medio += consumo_medio
-                            except (ValueError, TypeError):
-                                pass  # Ignora valores inválidos
-                    except (ValueError, TypeError):
-                        pass  # Ignora valores inválidos para 'dias_em_atraso'
-
-        # Calcular média de dias de atraso
-        average_delay_days = int(total_dias_atraso / clientes_com_dias_validos) if clientes_com_dias_validos > 0 else 0
-
-        logger.info(f"Contagem de clientes com atraso na injeção <= 30 dias: {unique_overdue_count}")
-        logger.info(f"Soma total de dias de atraso (<= 30d): {total_dias_atraso} (Clientes com dias válidos: {clientes_com_dias_validos})")
-        logger.info(f"Soma total de consumo médio (kWh pendentes <= 30d): {total_consumo_medio}")
-
-        return {
-            'count': unique_overdue_count,
-            'average_delay_days': average_delay_days,
-            'pending_kwh': total_consumo_medio
-        }
+        from . import analytics  # pandas sob demanda
+        summary = analytics.summarize_injection_by_fornecedora(df_boletos)
+        result = analytics.overdue_kpi_from_summary(summary, bucket='up_to_30')
+
+        logger.info(f"Contagem de clientes com atraso na injeção <= 30 dias: {result['count']}")
+        logger.info(f"Média de dias de atraso <= 30 dias: {result['average_delay_days']}")
+        logger.info(f"Soma total de consumo médio (kWh pendentes <= 30 dias): {result['pending_kwh']}")
+
+        return result
 
     except Exception as e:
         logger.error(f"Erro inesperado ao contar clientes com atraso na injeção <= 30 dias: {e}", exc_info=True)
@@ -879,6 +767,7 @@ def count_overdue_injection_clients_up_to_30_days(fornecedora: Optional[str] = N
 
 
 # --- NOVA FUNÇÃO: count_overdue_injection_clients_over_30_days ---
+@versioned_cache(*reports_boletos.BOLETOS_TABLES)
 def count_overdue_injection_clients_over_30_days(fornecedora: Optional[str] = None) -> dict:
     """
     Conta o número total de clientes com "Atraso na Injeção" = 'SIM'
@@ -904,64 +793,23 @@ def count_overdue_injection_clients_over_30_days(fornecedora: Optional[str] = No
     logger.info(log_msg)
 
     try:
-        # Reutiliza a função get_boletos_por_cliente_data para obter os dados já processados.
-        all_clients_data = reports_boletos.get_boletos_por_cliente_data(
-            limit=None,
-            export_mode=True,
-            fornecedora=fornecedora
-        )
+        # Reutiliza o DataFrame do relatório de boletos (lógica de "Atraso na Injeção" já aplicada)
+        df_boletos = reports_boletos.get_boletos_por_cliente_frame(limit=None, fornecedora=fornecedora)
 
-        if not all_clients_data:
+        if df_boletos.empty:
             logger.warning("Nenhum dado retornado do relatório de boletos para contar clientes com atraso na injeção > 30 dias.")
             return {'count': 0, 'average_delay_days': 0, 'pending_kwh': 0}
 
-        # Processar dados únicos por cliente com a nova condição de > 30 dias
-        seen_codigos = set()
-        unique_overdue_count = 0
-        total_dias_atraso = 0
-        total_consumo_medio = 0
-        clientes_com_dias_validos = 0
-
-        for row in all_clients_data:
-            codigo_cliente = row.get('codigo')
-            if codigo_cliente and codigo_cliente not in seen_codigos:
-                seen_codigos.add(codigo_cliente)
-                
-                # Verifica a condição principal de atraso na injeção
-                if row.get('atraso_na_injecao') == 'SIM':
-                    # Nova condição: Dias em Atraso > 30
-                    try:
-                        dias_atraso_raw = row.get('dias_em_atraso')
-                        dias_atraso = float(dias_atraso_raw) if dias_atraso_raw not in [None, '', 'N/A'] else 0
-                        
-                        if dias_atraso > 30: # Aplica o filtro de > 30 dias
-                            unique_overdue_count += 1
-                            total_dias_atraso += dias_atraso
-                            clientes_com_dias_validos += 1
-                            
-                            # Processar consumo médio para os clientes filtrados
-                            try:
-                                consumo_medio_raw = row.get('consumomedio')
-                                consumo_medio = float(consumo_medio_raw) if consumo_medio_raw not in [None, '', 'N/A'] else 0
-                                total_consumo_medio += consumo_medio
-                            except (ValueError, TypeError):
-                                pass  # Ignora valores inválidos
-                    except (ValueError, TypeError):
-                        pass  # Ignora valores inválidos para 'dias_em_atraso'
-
-        # Calcular média de dias de atraso
-        average_delay_days = int(total_dias_atraso / clientes_com_dias_validos) if clientes_com_dias_validos > 0 else 0
-
-        logger.info(f"Contagem de clientes com atraso na injeção > 30 dias: {unique_overdue_count}")
-        logger.info(f"Soma total de dias de atraso (> 30d): {total_dias_atraso} (Clientes com dias válidos: {clientes_com_dias_validos})")
-        logger.info(f"Soma total de consumo médio (kWh pendentes > 30d): {total_consumo_medio}")
-
-        return {
-            'count': unique_overdue_count,
-            'average_delay_days': average_delay_days,
-            'pending_kwh': total_consumo_medio
-        }
+        from . import analytics  # pandas sob demanda
+        summary = analytics.summarize_injection_by_fornecedora(df_boletos)
+        result = analytics.overdue_kpi_from_summary(summary, bucket='over_30')
+
+        logger.info(f"Contagem de clientes com atraso na injeção > 30 dias: {result['count']}")
+        logger.info(f"Média de dias de atraso > 30 dias: {result['average_delay_days']}")
+        logger.info(f"Soma total de consumo médio (kWh pendentes > 30 dias): {result['pending_kwh']}")
+
+        return result
 
     except Exception as e:
         logger.error(f"Erro inesperado ao contar clientes com atraso na injeção > 30 dias: {e}", exc_info=True)
-        return {'count': 0, 'average_delay_days': 0, 'pending_kwh': 0}
\ No newline at end of file
+        return {'count': 0, 'average_delay_days': 0, 'pending_kwh': 0}
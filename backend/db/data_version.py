@@ -0,0 +1,410 @@
+# backend/db/data_version.py
+"""
+Versões dos dados por tabela, usadas para invalidar caches (ETag das APIs, KPIs,
+resumos, snapshot de boletos, dados da TV).
+
+Uma sonda barata roda a cada DATA_VERSION_TTL segundos numa thread de fundo e
+calcula uma assinatura por tabela de origem:
+  * contadores cumulativos de pg_stat_user_tables (n_tup_ins/upd/del, n_live_tup),
+    sem varrer as tabelas;
+  * max(dtultalteracao) em CLIENTES e max(updated_at) em DEVOLUTIVAS.
+Quando a assinatura de uma tabela muda, a versão dela sobe (+1, nunca desce).
+
+As versões ficam num arquivo JSON em instance/ (com flock), compartilhado pelos
+workers do Gunicorn: todos enxergam os mesmos números e só um deles precisa rodar a
+sonda em cada intervalo. Os caches usam `versioned_cache(...)`, cuja chave inclui as
+versões das tabelas de que a função depende, a data de hoje (várias queries usam
+CURRENT_DATE) e a assinatura dos CSVs de apoio. Com DB_NOTIFY_LISTENER, as versões
+também sobem assim que chega um NOTIFY (ver db.notify).
+
+A sonda roda no primário, mas parte das leituras vai para a réplica de leitura, que
+pode estar até DB_REPLICA_MAX_LAG segundos atrás. Por isso cada tabela guarda também
+quando a sua versão subiu: enquanto a mudança é mais recente que esse atraso
+(replica_settled), os caches chaveados pela versão leem do primário
+(connection.primary_reads), para não guardar dados antigos da réplica sob o token novo.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+from functools import wraps
+from typing import Dict, Iterable, Optional
+from flask import current_app
+from . import analytics_replica, timeouts
+from .connection import primary_reads
+from .executor import execute_query, execute_query_one
+from ..cache import TTLCache
+
+try:
+    import fcntl  # trava entre processos (Linux/macOS)
+except ImportError:  # Windows: só a trava entre threads
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+CSV_FILES = ('prazos.csv', 'devolutivas.csv')
+
+# Tabelas de origem monitoradas
+SOURCE_TABLES = (
+    'CLIENTES', 'RCB_CLIENTES', 'DEVOLUTIVAS', 'MV_DEVOLUTIVAS', 'CONSULTOR',
+    'CONTROLE_PRO', 'CLIENTES_CONTRATOS', 'CLIENTES_CONTRATOS_SIGNER',
+)
+# Views não aparecem em pg_stat_user_tables: dependem das tabelas de origem
+VIEW_DEPENDENCIES = {
+    'V_CUSTOMER': ('CLIENTES', 'CONSULTOR'),
+}
+
+_QUERY_TABLE_STATS = """
+    SELECT
+        relname,
+        n_tup_ins + n_tup_upd + n_tup_del AS modificacoes,
+        n_live_tup
+    FROM pg_stat_user_tables
+    WHERE schemaname = 'public' AND relname = ANY(%s);
+"""
+
+# Marcas de alteração nas próprias linhas (colunas de auditoria)
+_QUERY_TABLE_MARKS = """
+    SELECT
+        (SELECT MAX(dtultalteracao) FROM public."CLIENTES")::text AS "CLIENTES",
+        (SELECT MAX(updated_at) FROM public."DEVOLUTIVAS")::text AS "DEVOLUTIVAS";
+"""
+
+_MISSING = object()
+
+
+def _csv_signature() -> str:
+    partes = []
+    for nome in CSV_FILES:
+        try:
+            st = os.stat(os.path.join(_PROJECT_ROOT, 'data', nome))
+            partes.append(f"{nome}:{st.st_mtime_ns}:{st.st_size}")
+        except OSError:
+            partes.append(f"{nome}:-")
+    return "|".join(partes)
+
+
+def probe_signatures() -> Optional[Dict[str, str]]:
+    """Roda a sonda e retorna {tabela: assinatura}. Retorna None se o banco não responder."""
+    stats = execute_query(_QUERY_TABLE_STATS, (list(SOURCE_TABLES),))
+    if not stats:
+        return None
+    marks = execute_query_one(_QUERY_TABLE_MARKS) or {}
+    signatures = {}
+    for row in stats:
+        tabela = row['relname']
+        signatures[tabela] = f"{row['modificacoes']}:{row['n_live_tup']}:{marks.get(tabela) or '-'}"
+    return signatures
+
+
+class DataVersionService:
+    """Versões monotônicas por tabela, publicadas num arquivo compartilhado entre os processos."""
+
+    def __init__(self, state_path: str, interval: float = 10.0, notify_interval: float = 300.0):
+        self.state_path = state_path
+        self.interval = float(interval)
+        self.notify_interval = float(notify_interval)  # com o listener de NOTIFY ativo (db.notify)
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+        self._changed_at: Dict[str, float] = {}
+        self._state_stamp = None
+        self._memory_state = {'tables': {}, 'probed_at': 0.0}  # sem arquivo (instance/ somente leitura)
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+
+    # --- Estado compartilhado ---
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is None or self.state_path is None:
+                yield
+                return
+            with open(self.state_path + '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_state(self) -> dict:
+        if self.state_path is None:
+            return self._memory_state
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'tables': {}, 'probed_at': 0.0}
+
+    def _write_state(self, state: dict) -> None:
+        if self.state_path is None:
+            self._memory_state = state
+            return
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _update(self, fn) -> list:
+        """Aplica `fn(state)` sob a trava; retorna as tabelas cuja versão mudou."""
+        try:
+            with self._locked():
+                state = self._read_state()
+                changed = fn(state)
+                if changed is not None:
+                    self._write_state(state)
+        except OSError as e:
+            logger.warning(f"Arquivo de versões indisponível ({e}); usando apenas memória do processo.")
+            self.state_path = None
+            return self._update(fn)
+        self._load(state)
+        return changed or []
+
+    def _load(self, state: dict) -> None:
+        self._versions = {t: int(info.get('version', 0)) for t, info in state.get('tables', {}).items()}
+        self._changed_at = {t: float(info.get('changed_at', 0)) for t, info in state.get('tables', {}).items()}
+        self._state_stamp = self._stamp()
+
+    def _stamp(self):
+        if self.state_path is None:
+            return None
+        try:
+            st = os.stat(self.state_path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    # --- Sonda e publicação ---
+    def probe(self, force: bool = False) -> list:
+        """
+        Roda a sonda (se nenhum processo a rodou no último intervalo, ou se force=True)
+        e sobe a versão das tabelas cuja assinatura mudou. Retorna essas tabelas.
+        """
+        state = self._read_state()
+        agora = time.time()
+        interval = self.notify_interval if float(state.get('listener_until', 0)) > agora else self.interval
+        if not force and agora - float(state.get('probed_at', 0)) < interval and state.get('tables'):
+            self._load(state)
+            return []
+
+        signatures = probe_signatures()
+        if signatures is None:
+            return []
+
+        def apply(state):
+            changed = []
+            agora = time.time()
+            tables = state.setdefault('tables', {})
+            for tabela, signature in signatures.items():
+                info = tables.setdefault(tabela, {'version': 0, 'signature': None})
+                if info.get('signature') != signature:
+                    info['version'] = int(info.get('version', 0)) + 1
+                    info['signature'] = signature
+                    info['changed_at'] = agora
+                    changed.append(tabela)
+            state['probed_at'] = agora
+            return changed
+
+        changed = self._update(apply)
+        if changed:
+            logger.info(f"Dados alterados, nova versão: {', '.join(f'{t}={self._versions.get(t)}' for t in changed)}")
+        return changed
+
+    def bump(self, *tables: str) -> None:
+        """Sobe a versão das tabelas informadas (invalidação explícita, ex.: NOTIFY)."""
+        def apply(state):
+            agora = time.time()
+            entries = state.setdefault('tables', {})
+            for tabela in tables:
+                info = entries.setdefault(tabela, {'version': 0, 'signature': None})
+                info['version'] = int(info.get('version', 0)) + 1
+                info['changed_at'] = agora
+            return list(tables)
+        self._update(apply)
+
+    def set_listener_heartbeat(self, until: float) -> None:
+        """Publica até quando o listener de NOTIFY é considerado ativo (0 = inativo)."""
+        def apply(state):
+            state['listener_until'] = until
+            return []
+        self._update(apply)
+
+    def versions(self) -> Dict[str, int]:
+        """Versões atuais ({tabela: versão}); recarrega do arquivo se outro processo publicou."""
+        if self._stamp() != self._state_stamp:
+            self._load(self._read_state())
+        return dict(self._versions)
+
+    def changed_at(self) -> Dict[str, float]:
+        """Quando a versão de cada tabela subiu pela última vez (epoch; 0 = desconhecido)."""
+        if self._stamp() != self._state_stamp:
+            self._load(self._read_state())
+        return dict(self._changed_at)
+
+    # --- Thread de fundo ---
+    def ensure_started(self, app) -> None:
+        """Inicia a thread da sonda neste processo (sob demanda e de novo após um fork)."""
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(app, self._stop),
+                                            name='data-version-probe', daemon=True)
+            self._thread.start()
+        if app.config.get('DB_NOTIFY_LISTENER', False):
+            from .notify import start_listener
+            start_listener(app, self)
+
+    def _run(self, app, stop: threading.Event) -> None:
+        while not stop.is_set():
+            try:
+                with app.app_context():
+                    self.probe()
+            except Exception as e:
+                logger.error(f"Erro na sonda de versão dos dados: {e}", exc_info=True)
+            stop.wait(self.interval)
+
+    def stop(self, app=None) -> None:
+        self._stop.set()
+        if app is not None and app.config.get('DB_NOTIFY_LISTENER', False):
+            from .notify import stop_listener
+            stop_listener(app)
+
+
+_service_lock = threading.Lock()
+
+
+def get_service(app=None) -> DataVersionService:
+    """Serviço de versões da aplicação (criado na primeira chamada)."""
+    app = app or current_app._get_current_object()
+    service = app.extensions.get('data_versions')
+    if service is None:
+        with _service_lock:
+            service = app.extensions.get('data_versions')
+            if service is None:
+                state_path = os.path.join(app.instance_path, 'data_versions.json')
+                try:
+                    os.makedirs(app.instance_path, exist_ok=True)
+                except OSError:
+                    state_path = None
+                service = DataVersionService(state_path, app.config.get('DATA_VERSION_TTL', 10),
+                                             app.config.get('DATA_VERSION_TTL_WITH_NOTIFY', 300))
+                app.extensions['data_versions'] = service
+    return service
+
+
+def _expand(tables: Iterable[str]) -> list:
+    result = set()
+    for tabela in tables:
+        result.update(VIEW_DEPENDENCIES.get(tabela, (tabela,)))
+    return sorted(result)
+
+
+def table_versions(tables: Optional[Iterable[str]] = None) -> Optional[Dict[str, int]]:
+    """
+    Versões das tabelas pedidas (todas, se None). Na primeira chamada do processo roda
+    a sonda de forma síncrona. Retorna None se nenhuma sonda funcionou ainda.
+    """
+    app = current_app._get_current_object()
+    service = get_service(app)
+    service.ensure_started(app)
+    versions = service.versions()
+    if not versions:
+        service.probe()
+        versions = service.versions()
+        if not versions:
+            return None
+    wanted = _expand(tables) if tables is not None else sorted(versions)
+    return {t: versions.get(t, 0) for t in wanted}
+
+
+def version_token(tables: Optional[Iterable[str]] = None) -> Optional[str]:
+    """
+    Token das tabelas pedidas + data de hoje + CSVs de apoio + geração da réplica
+    analítica, se ligada (None se o banco não responder).
+    """
+    versions = table_versions(tables)
+    if versions is None:
+        return None
+    tabelas = ",".join(f"{t}:{v}" for t, v in versions.items())
+    return f"{tabelas}|{date.today().isoformat()}|{_csv_signature()}|{analytics_replica.generation()}"
+
+
+def replica_settled(tables: Optional[Iterable[str]] = None) -> bool:
+    """
+    True se a réplica de leitura já teve tempo de aplicar a última mudança das tabelas
+    (todas, se None): a versão subiu há mais de DB_REPLICA_MAX_LAG +
+    DB_REPLICA_LAG_CHECK_INTERVAL segundos (a medição do atraso tem essa idade máxima).
+    Sem réplica configurada, sempre True.
+    """
+    config = current_app.config
+    if not config.get('DB_REPLICA_DSN'):
+        return True
+    janela = float(config.get('DB_REPLICA_MAX_LAG', 30)) + float(config.get('DB_REPLICA_LAG_CHECK_INTERVAL', 10))
+    changed = get_service().changed_at()
+    wanted = _expand(tables) if tables is not None else list(changed)
+    ultima = max((changed.get(t, 0.0) for t in wanted), default=0.0)
+    return time.time() - ultima >= janela
+
+
+def get_data_version() -> Optional[str]:
+    """Token de versão global (todas as tabelas), usado no ETag das APIs."""
+    token = version_token()
+    return hashlib.sha1(token.encode('utf-8')).hexdigest()[:16] if token is not None else None
+
+
+def invalidate_data_version() -> None:
+    """Força uma nova sonda agora (ex.: após uma carga de dados conhecida)."""
+    get_service().probe(force=True)
+
+
+def versioned_cache(*tables: str, maxsize: int = 32):
+    """
+    Decorator: guarda o resultado da função por (versões de `tables`, data, CSVs,
+    argumentos). Uma alteração em qualquer uma das tabelas muda a chave, então o
+    cache é invalidado exatamente quando os dados mudam. DATA_CACHE_MAX_AGE limita
+    a idade das entradas (proteção caso a sonda pare). Resultados None ou vazios e os
+    de chamadas em que alguma query falhou ou foi interrompida (db.timeouts) não são
+    guardados: o executor devolve []/None no erro, que a função pode ter convertido
+    em 0 ou num dicionário zerado. Logo depois de uma mudança nas tabelas, a função roda
+    com as leituras da réplica desviadas para o primário (replica_settled).
+    """
+    cache = TTLCache(maxsize=maxsize, ttl=3600)
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = version_token(tables)
+            if token is None:
+                return fn(*args, **kwargs)
+            key = (token, args, tuple(sorted(kwargs.items())))
+            result = cache.get(key, _MISSING)
+            if result is not _MISSING:
+                return result
+            falhas = timeouts.failure_count()
+            with primary_reads(not replica_settled(tables)):
+                result = fn(*args, **kwargs)
+            if timeouts.failure_count() != falhas:
+                return result  # query com erro, estourou o tempo ou foi cancelada: resultado incompleto
+            if result is not None and not _is_empty(result):
+                cache.set(key, result, ttl=current_app.config.get('DATA_CACHE_MAX_AGE', 3600))
+            return result
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def _is_empty(result) -> bool:
+    empty = getattr(result, 'empty', None)  # DataFrame
+    if isinstance(empty, bool):
+        return empty
+    return isinstance(result, (list, tuple, dict)) and len(result) == 0
@@ -1,50 +1,172 @@
 # backend/db/executor.py
 import logging
+from typing import Iterator
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from flask import current_app
+from . import prepared, timeouts
+from .connection import ROUTE_PRIMARY, get_pool
+from .rows import Row, build_index, make_rows
 
 logger = logging.getLogger(__name__)
 
-def execute_query(query, params=None):
+def execute_query(query, params=None, route: str = ROUTE_PRIMARY, query_class=None):
     """
-    Executa uma query SELECT e retorna todos os resultados como uma lista de dicionários.
+    Executa uma query SELECT e retorna todos os resultados como uma lista de `Row`
+    (acesso por nome ou posição: row['coluna'], row[0], row.get('coluna')).
+    `route` escolhe o pool (ROUTE_PRIMARY ou ROUTE_REPLICA, ver connection.get_pool);
+    `query_class` pede um orçamento de tempo próprio (ver db.timeouts).
     """
     conn = None
     try:
-        # Acessa a pool através da extensão do app
-        pool = current_app.extensions['db_pool']
+        # Acessa o pool do processo atual (criado sob demanda após um fork)
+        pool = get_pool(route=route)
         conn = pool.getconn()
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        with conn.cursor() as cursor, timeouts.guard(conn, cursor, query_class):
             logger.debug(f"Executando query: {query}")
-            cursor.execute(query, params)
-            results = cursor.fetchall()
+            prepared.execute(conn, cursor, query, params)
+            # Um único mapa de colunas para todas as linhas do resultado
+            results = make_rows(cursor.description, cursor.fetchall())
             return results
+    except timeouts.QueryInterrupted as e:
+        logger.warning(f"Query interrompida (query): {e}")
+        return []
     except (KeyError, psycopg2.Error, Exception) as e:
         logger.error(f"Erro ao executar a query: {e}", exc_info=True)
+        timeouts.record_failure()
         return []
     finally:
         if conn:
             pool.putconn(conn)
 
-def execute_query_one(query, params=None):
+def execute_query_one(query, params=None, route: str = ROUTE_PRIMARY, query_class=None):
     """
-    Executa uma query SELECT e retorna o resultado da primeira linha como um dicionário.
+    Executa uma query SELECT e retorna a primeira linha como `Row`.
     Retorna None se a query não encontrar resultados.
     """
     conn = None
     try:
-        # Acessa a pool através da extensão do app
-        pool = current_app.extensions['db_pool']
+        # Acessa o pool do processo atual (criado sob demanda após um fork)
+        pool = get_pool(route=route)
         conn = pool.getconn()
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        with conn.cursor() as cursor, timeouts.guard(conn, cursor, query_class):
             logger.debug(f"Executando query one: {query}")
-            cursor.execute(query, params)
-            result = cursor.fetchone()
+            prepared.execute(conn, cursor, query, params)
+            values = cursor.fetchone()
+            result = Row(build_index(cursor.description), values) if values is not None else None
             return result
+    except timeouts.QueryInterrupted as e:
+        logger.warning(f"Query interrompida (query one): {e}")
+        return None
     except (KeyError, psycopg2.Error, Exception) as e:
         logger.error(f"Erro ao executar a query one: {e}", exc_info=True)
+        timeouts.record_failure()
         return None
     finally:
         if conn:
-            pool.putconn(conn)
\ No newline at end of file
+            pool.putconn(conn)
+
+def execute_query_stream(query, params=None, batch_size: int = 2000, route: str = ROUTE_PRIMARY,
+                         query_class=None) -> Iterator[Row]:
+    """
+    Executa uma query SELECT num cursor do servidor (named cursor) e entrega as linhas
+    como `Row`, lidas em lotes de `batch_size`: o resultado nunca fica inteiro na memória
+    (exportações). A conexão fica presa até o gerador terminar ou ser fechado.
+    Diferente das demais funções, erros são PROPAGADOS: quem consome um stream pela
+    metade precisa saber que ele não terminou.
+    """
+    pool = get_pool(route=route)
+    conn = pool.getconn()
+    try:
+        # O SET LOCAL do orçamento de tempo vai num cursor comum: o named cursor só executa uma query
+        with conn.cursor() as cursor, timeouts.guard(conn, cursor, query_class):
+            with conn.cursor(name='fbi_stream') as stream:
+                stream.itersize = batch_size
+                logger.debug(f"Executando query em streaming: {query}")
+                stream.execute(query, params)
+                index = None
+                while True:
+                    batch = stream.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    if index is None:
+                        index = build_index(stream.description)
+                    for values in batch:
+                        yield Row(index, values)
+    finally:
+        pool.putconn(conn)
+
+# --- API COLUNAR (para análises com pandas/numpy) ---
+# OIDs dos tipos do PostgreSQL usados para escolher o dtype de cada coluna
+_INT_OIDS = {20, 21, 23, 26}          # int8, int2, int4, oid
+_FLOAT_OIDS = {700, 701, 1700}        # float4, float8, numeric
+_BOOL_OIDS = {16}
+_DATE_OIDS = {1082, 1114}             # date, timestamp
+_TIMESTAMPTZ_OIDS = {1184}
+
+def _build_column(values: list, type_code: int):
+    """Converte a lista de valores de uma coluna num array NumPy com o dtype adequado."""
+    import numpy as np
+    import pandas as pd
+
+    has_nulls = any(v is None for v in values)
+    if type_code in _INT_OIDS:
+        # Mesmo comportamento do pandas: inteiros com nulos viram float64 (NaN)
+        return np.array(values, dtype='float64' if has_nulls else 'int64')
+    if type_code in _FLOAT_OIDS:
+        return np.array(values, dtype='float64')  # Decimal -> float, None -> NaN
+    if type_code in _BOOL_OIDS and not has_nulls:
+        return np.array(values, dtype='bool')
+    if type_code in _DATE_OIDS:
+        return pd.to_datetime(values).to_numpy()
+    if type_code in _TIMESTAMPTZ_OIDS:
+        return pd.to_datetime(values, utc=True).to_numpy()
+    return np.array(values, dtype=object)
+
+def execute_query_columns(query, params=None, batch_size: int = 10000, route: str = ROUTE_PRIMARY,
+                          query_class=None) -> dict:
+    """
+    Executa uma query SELECT e retorna os resultados em formato colunar:
+    um dicionário {nome_coluna: numpy.ndarray}, na ordem do SELECT.
+
+    Usa um cursor simples (tuplas) e lê em lotes de `batch_size`, sem criar
+    um dicionário por linha. Os dtypes vêm de cursor.description (inteiros,
+    numéricos, datas e texto). Retorna {} em caso de erro.
+    """
+    conn = None
+    try:
+        pool = get_pool(route=route)
+        conn = pool.getconn()
+        with conn.cursor() as cursor, timeouts.guard(conn, cursor, query_class):
+            logger.debug(f"Executando query colunar: {query}")
+            prepared.execute(conn, cursor, query, params)
+            description = cursor.description or []
+            columns = [[] for _ in description]
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for column, values in zip(columns, zip(*rows)):
+                    column.extend(values)
+        return {
+            desc.name: _build_column(values, desc.type_code)
+            for desc, values in zip(description, columns)
+        }
+    except timeouts.QueryInterrupted as e:
+        logger.warning(f"Query interrompida (query colunar): {e}")
+        return {}
+    except (KeyError, psycopg2.Error, Exception) as e:
+        logger.error(f"Erro ao executar a query colunar: {e}", exc_info=True)
+        timeouts.record_failure()
+        return {}
+    finally:
+        if conn:
+            pool.putconn(conn)
+
+def execute_query_frame(query, params=None, batch_size: int = 10000, route: str = ROUTE_PRIMARY,
+                        query_class=None):
+    """
+    Executa uma query SELECT e retorna um pandas.DataFrame com colunas tipadas
+    (ver execute_query_columns). Retorna um DataFrame vazio em caso de erro ou sem linhas.
+    """
+    import pandas as pd
+    return pd.DataFrame(execute_query_columns(query, params, batch_size=batch_size, route=route,
+                                              query_class=query_class))
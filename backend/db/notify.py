@@ -0,0 +1,178 @@
+# backend/db/notify.py
+"""
+Invalidação de caches por LISTEN/NOTIFY (opcional, DB_NOTIFY_LISTENER=True).
+
+Uma thread mantém uma conexão dedicada fazendo `LISTEN fastbi_changes`. Triggers
+(ver `flask notify-triggers`) ou um ETL externo enviam NOTIFY com o nome da tabela
+alterada no payload (ex.: 'CLIENTES', 'CLIENTES,RCB_CLIENTES' ou '*'). Cada
+notificação sobe a versão da tabela no serviço de versões (db.data_version), cujo
+estado é compartilhado pelos workers: os caches e o snapshot da TV de todos os
+processos são invalidados de uma vez.
+
+Só um processo por máquina escuta (trava em instance/notify_listener.lock), para
+que cada notificação suba a versão uma única vez. Enquanto o listener está ativo, a
+sonda periódica roda a cada DATA_VERSION_TTL_WITH_NOTIFY segundos (só como
+garantia); sem conexão ou sem notificações, volta ao intervalo normal.
+"""
+import logging
+import os
+import re
+import select
+import threading
+import time
+import psycopg2
+import psycopg2.extensions
+from .data_version import SOURCE_TABLES
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANNEL = 'fastbi_changes'
+# Tabelas com trigger de notificação (as demais continuam cobertas pela sonda)
+NOTIFY_TABLES = ('CLIENTES', 'RCB_CLIENTES', 'DEVOLUTIVAS')
+HEARTBEAT_SECONDS = 30
+RETRY_SECONDS = 30
+
+_CHANNEL_RE = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+
+def parse_payload(payload: str) -> list:
+    """Tabelas citadas no payload ('*' ou vazio = todas as tabelas monitoradas)."""
+    tabelas = [t.strip().strip('"') for t in (payload or '').split(',') if t.strip()]
+    if not tabelas or '*' in tabelas:
+        return list(SOURCE_TABLES)
+    return [t.split('.')[-1].strip('"') for t in tabelas]
+
+
+def trigger_sql(channel: str = DEFAULT_CHANNEL, tables=NOTIFY_TABLES) -> str:
+    """SQL que cria a função e os triggers (por statement) que notificam o canal."""
+    if not _CHANNEL_RE.match(channel):
+        raise ValueError(f"Nome de canal inválido: {channel!r}")
+    partes = [f"""CREATE OR REPLACE FUNCTION public.fastbi_notify_change() RETURNS trigger AS $$
+BEGIN
+    -- Payloads iguais na mesma transação são agrupados pelo PostgreSQL
+    PERFORM pg_notify('{channel}', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;"""]
+    for tabela in tables:
+        partes.append(
+            f'DROP TRIGGER IF EXISTS fastbi_notify_change ON public."{tabela}";\n'
+            f'CREATE TRIGGER fastbi_notify_change\n'
+            f'    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public."{tabela}"\n'
+            f'    FOR EACH STATEMENT EXECUTE FUNCTION public.fastbi_notify_change();'
+        )
+    return "\n\n".join(partes) + "\n"
+
+
+class ChangeListener:
+    """Thread que escuta o canal e sobe as versões das tabelas notificadas."""
+
+    def __init__(self, app, service, channel: str = DEFAULT_CHANNEL):
+        if not _CHANNEL_RE.match(channel):
+            raise ValueError(f"Nome de canal inválido: {channel!r}")
+        self.app = app
+        self.service = service
+        self.channel = channel
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='data-change-listener', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _acquire_leadership(self) -> bool:
+        """Garante que só um processo da máquina escute (trava não bloqueante)."""
+        if fcntl is None or self._lock_file is not None:
+            return True
+        path = os.path.join(self.app.instance_path, 'notify_listener.lock')
+        lock_file = None
+        try:
+            lock_file = open(path, 'a')
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            if lock_file is not None:
+                lock_file.close()
+            return False
+        self._lock_file = lock_file  # mantida aberta enquanto o processo viver
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if not self._acquire_leadership():
+                self._stop.wait(RETRY_SECONDS)
+                continue
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.app.config['DB_CONFIG'])
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel};")
+                logger.info(f"Listener de alterações ativo no canal '{self.channel}' (pid {os.getpid()}).")
+                # Alterações feitas enquanto ninguém escutava: a sonda as detecta agora
+                with self.app.app_context():
+                    self.service.probe(force=True)
+                self._listen(conn)
+            except psycopg2.Error as e:
+                logger.warning(f"Listener de alterações sem conexão ({e}); usando apenas a sonda periódica.")
+            except Exception as e:
+                logger.error(f"Erro inesperado no listener de alterações: {e}", exc_info=True)
+            finally:
+                self.service.set_listener_heartbeat(0)
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except psycopg2.Error:
+                        pass
+            self._stop.wait(RETRY_SECONDS)
+
+    def _listen(self, conn) -> None:
+        proximo_heartbeat = 0.0
+        while not self._stop.is_set():
+            agora = time.time()
+            if agora >= proximo_heartbeat:
+                self.service.set_listener_heartbeat(agora + 2 * HEARTBEAT_SECONDS)
+                proximo_heartbeat = agora + HEARTBEAT_SECONDS
+            if select.select([conn], [], [], HEARTBEAT_SECONDS)[0] == []:
+                continue
+            conn.poll()
+            tabelas = set()
+            while conn.notifies:
+                tabelas.update(parse_payload(conn.notifies.pop(0).payload))
+            if tabelas:
+                self.service.bump(*sorted(tabelas))
+                logger.info(f"NOTIFY recebido: versões atualizadas para {', '.join(sorted(tabelas))}")
+
+
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+
+def start_listener(app, service) -> None:
+    """Inicia o listener deste processo (uma vez por pid; após um fork, de novo)."""
+    pid = os.getpid()
+    with _listeners_lock:
+        listener = _listeners.get(id(app))
+        if listener is not None and listener[0] == pid and listener[1].is_alive():
+            return
+        novo = ChangeListener(app, service, app.config.get('DB_NOTIFY_CHANNEL', DEFAULT_CHANNEL))
+        novo.start()
+        _listeners[id(app)] = (pid, novo)
+
+
+def stop_listener(app) -> None:
+    with _listeners_lock:
+        listener = _listeners.pop(id(app), None)
+    if listener is not None and listener[0] == os.getpid():
+        listener[1].stop()
@@ -0,0 +1,220 @@
+# backend/db/parallel.py
+"""
+Execução paralela de consultas independentes dentro de uma mesma requisição.
+
+Cada tarefa roda num thread de um pool limitado (DB_PARALLEL_WORKERS), dentro de
+um app context próprio; as funções de db (execute_query, etc.) pegam e devolvem
+a sua própria conexão do pool (connection.BlockingConnectionPool, que espera por
+uma conexão livre em vez de falhar quando todas estão em uso). Assim, a latência do
+handler passa a ser a da query mais lenta, e não a soma de todas.
+
+Uso:
+    total, dados = parallel.gather(
+        partial(db.count_boletos_por_cliente, fornecedora=forn),
+        partial(db.get_boletos_por_cliente_data, offset=0, limit=50, fornecedora=forn),
+    )
+"""
+import logging
+import os
+import queue
+import threading
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, List
+from flask import current_app
+from . import timeouts
+from .connection import primary_reads, primary_reads_active
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+
+_state = threading.local()          # Marca os threads do pool (evita submissões aninhadas)
+_executor_lock = threading.Lock()
+
+
+def _get_executor(app) -> ThreadPoolExecutor:
+    """Retorna o executor da aplicação, recriando-o após um fork (threads não sobrevivem ao fork)."""
+    entry = app.extensions.get('db_parallel')
+    if entry and entry[0] == os.getpid():
+        return entry[1]
+    with _executor_lock:
+        entry = app.extensions.get('db_parallel')
+        if entry and entry[0] == os.getpid():
+            return entry[1]
+        workers = int(app.config.get('DB_PARALLEL_WORKERS', DEFAULT_WORKERS))
+        executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='db-parallel')
+        app.extensions['db_parallel'] = (os.getpid(), executor)
+        logger.info(f"Executor de queries paralelas criado com {workers} threads.")
+        return executor
+
+
+def _prefetch_slots(app) -> threading.BoundedSemaphore:
+    """Vagas de produtores do prefetch neste processo (DB_PREFETCH_PRODUCERS)."""
+    entry = app.extensions.get('db_prefetch_slots')
+    if entry and entry[0] == os.getpid():
+        return entry[1]
+    with _executor_lock:
+        entry = app.extensions.get('db_prefetch_slots')
+        if entry and entry[0] == os.getpid():
+            return entry[1]
+        slots = threading.BoundedSemaphore(max(1, int(app.config.get('DB_PREFETCH_PRODUCERS', 2))))
+        app.extensions['db_prefetch_slots'] = (os.getpid(), slots)
+        return slots
+
+
+def _run_in_context(app, query_context, primary: bool, fn: Callable, args, kwargs):
+    _state.in_worker = True
+    try:
+        # Mesmo roteamento (connection.primary_reads) de quem agendou a tarefa
+        with app.app_context(), primary_reads(primary):
+            # Mesmo orçamento de tempo/cancelamento da requisição que agendou a tarefa
+            timeouts.bind(query_context)
+            return fn(*args, **kwargs)
+    finally:
+        _state.in_worker = False
+
+
+def _async_enabled(app) -> bool:
+    return not getattr(_state, 'in_worker', False) and int(app.config.get('DB_PARALLEL_WORKERS', DEFAULT_WORKERS)) > 1
+
+
+def submit(fn: Callable, *args, **kwargs) -> Future:
+    """
+    Agenda `fn(*args, **kwargs)` num thread do pool e retorna o Future.
+    Dentro de uma tarefa do próprio pool (chamada aninhada), executa de forma síncrona
+    para não esgotar os threads.
+    """
+    app = current_app._get_current_object()
+    if not _async_enabled(app):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return _get_executor(app).submit(_run_in_context, app, timeouts.current_context(),
+                                      primary_reads_active(), fn, args, kwargs)
+
+
+def gather(*calls: Callable[[], Any]) -> List[Any]:
+    """
+    Executa as funções (sem argumentos; use functools.partial) em paralelo e retorna
+    os resultados na mesma ordem. Uma exceção em qualquer tarefa é propagada.
+    """
+    futures = [submit(call) for call in calls]
+    return [future.result() for future in futures]
+
+
+_END = object()
+PREFETCH_POLL_SECONDS = 0.5
+
+
+def prefetch(make_iter: Callable[[], Iterable], max_batches: int = 4, batch_size: int = 500) -> Iterator:
+    """
+    Começa a consumir `make_iter()` agora, num thread próprio, e devolve um iterador
+    com os mesmos itens. Serve para pôr vários streams (ex.: as abas de uma exportação)
+    para rodar no banco ao mesmo tempo, embora sejam lidos um depois do outro.
+    No máximo `max_batches` lotes de `batch_size` itens ficam em memória: quando o
+    buffer enche, o produtor espera. Exceções do produtor são levantadas no consumidor;
+    se o iterador for abandonado (fechado ou coletado), o produtor para e fecha a fonte.
+    O produtor não usa o executor de submit/gather: ele fica preso durante toda a
+    exportação, e esgotaria os threads das consultas interativas (contagem e página
+    dos relatórios, TV). Cada produtor segura uma conexão, então há no máximo
+    DB_PREFETCH_PRODUCERS por processo. Sem vaga, em chamada aninhada ou com
+    DB_PARALLEL_WORKERS <= 1, a fonte é consumida diretamente, sem antecipação.
+    """
+    app = current_app._get_current_object()
+    if not _async_enabled(app):
+        return iter(make_iter())
+    slots = _prefetch_slots(app)
+    if not slots.acquire(blocking=False):
+        logger.debug("Sem vaga para produtor de prefetch; a fonte será lida sob demanda.")
+        return iter(make_iter())
+
+    buffer: 'queue.Queue' = queue.Queue(maxsize=max(1, max_batches))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=PREFETCH_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        source = iter(make_iter())
+        try:
+            lote = []
+            for item in source:
+                lote.append(item)
+                if len(lote) >= batch_size:
+                    if not put(lote):
+                        return
+                    lote = []
+            if lote and not put(lote):
+                return
+            put(_END)
+        except BaseException as e:
+            put(e)
+        finally:
+            close = getattr(source, 'close', None)
+            if close is not None:
+                close()
+
+    def run():
+        try:
+            _run_in_context(app, query_context, primary, produce, (), {})
+        except BaseException as e:
+            # Falha antes de `produce` (ex.: app context): o consumidor não pode ficar esperando
+            logger.error(f"Erro no produtor do prefetch: {e}", exc_info=True)
+            put(e)
+        finally:
+            slots.release()
+
+    def next_item(producer: threading.Thread):
+        while True:
+            try:
+                return buffer.get(timeout=PREFETCH_POLL_SECONDS)
+            except queue.Empty:
+                if producer.is_alive():
+                    continue
+            # O produtor terminou: o que ele publicou já está no buffer
+            try:
+                return buffer.get_nowait()
+            except queue.Empty:
+                return RuntimeError("O produtor do prefetch terminou sem entregar o fim do stream.")
+
+    def consume(producer: threading.Thread):
+        try:
+            while True:
+                item = next_item(producer)
+                if item is _END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield from item
+        finally:
+            stop.set()
+
+    query_context = timeouts.current_context()
+    primary = primary_reads_active()
+    producer = threading.Thread(target=run, name='db-prefetch', daemon=True)
+    try:
+        producer.start()
+    except BaseException:
+        slots.release()
+        raise
+    consumer = consume(producer)
+    # Um consumidor que nunca começou não executa o `finally` ao ser fechado
+    weakref.finalize(consumer, stop.set)
+    return consumer
+
+
+def shutdown(app) -> None:
+    """Encerra o executor da aplicação (usado no desligamento do worker)."""
+    entry = app.extensions.pop('db_parallel', None)
+    if entry and entry[0] == os.getpid():
+        entry[1].shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,177 @@
+# backend/db/prepared.py
+"""
+Cache de prepared statements no servidor, usado pelo executor.
+
+As mesmas queries parametrizadas (KPIs, User.get_by_id, resumos, páginas e
+contagens dos relatórios) rodam milhares de vezes por dia; sem
+preparo, o PostgreSQL faz parse e plano a cada execução. Aqui, uma query que já
+rodou DB_PREPARE_THRESHOLD vezes no processo é preparada na conexão
+(`PREPARE fbi_<hash> AS ...`, com os %s convertidos em $1..$n) e, dali em diante,
+executada com `EXECUTE fbi_<hash> (%s, ...)` (o psycopg2 continua adaptando os
+parâmetros, inclusive listas -> ARRAY).
+
+* O registro do que foi preparado fica por conexão (WeakKeyDictionary): sobrevive
+  ao vaivém da conexão no pool e some junto com ela. Cada conexão guarda no máximo
+  DB_PREPARED_CACHE_SIZE statements (LRU; o mais antigo recebe DEALLOCATE).
+* Não são preparadas queries com %s dentro de literais (ex.: INTERVAL '%s day'),
+  com parâmetros nomeados ou com mais de um comando; uma query cujo PREPARE falhar
+  (tipo de parâmetro indeterminado, etc.) volta a rodar sem preparo para sempre.
+* DB_PREPARED_STATEMENTS=False desliga tudo (kill-switch).
+"""
+import hashlib
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+import psycopg2
+import psycopg2.errors
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 3
+DEFAULT_CACHE_SIZE = 64
+MAX_TRACKED_QUERIES = 4096
+
+_statements = weakref.WeakKeyDictionary()   # conexão -> OrderedDict(nome -> None)
+_statements_lock = threading.Lock()
+_executions = {}                             # nome -> execuções no processo
+_unpreparable = set()                        # nomes cujo PREPARE falhou
+
+
+@lru_cache(maxsize=512)
+def to_positional(query: str, interpolate: bool) -> Optional[Tuple[str, int, str]]:
+    """
+    Converte os placeholders do psycopg2 em $1..$n. Retorna (sql, n, nome) ou None se a
+    query não puder ser preparada com segurança. `interpolate` indica se o psycopg2
+    faria a interpolação (params não é None), caso em que '%%' vira '%'.
+    """
+    partes, n, i, tamanho = [], 0, 0, len(query)
+    while i < tamanho:
+        c = query[i]
+        if c in ("'", '"'):
+            j = query.find(c, i + 1)
+            while j != -1 and query.startswith(c, j + 1):  # aspas escapadas ('' ou "")
+                j = query.find(c, j + 2)
+            if j == -1:
+                return None
+            trecho = query[i:j + 1]
+            if '%s' in trecho or '%(' in trecho:
+                return None  # placeholder dentro de literal: só a interpolação do cliente funciona
+            partes.append(trecho.replace('%%', '%') if interpolate else trecho)
+            i = j + 1
+            continue
+        if query.startswith('--', i):
+            j = query.find('\n', i)
+            j = tamanho if j == -1 else j
+            trecho = query[i:j]
+            if '%s' in trecho:
+                return None
+            partes.append(trecho.replace('%%', '%') if interpolate else trecho)
+            i = j
+            continue
+        if c == '%' and interpolate:
+            seguinte = query[i + 1:i + 2]
+            if seguinte == 's':
+                n += 1
+                partes.append(f"${n}")
+                i += 2
+                continue
+            if seguinte == '%':
+                partes.append('%')
+                i += 2
+                continue
+            return None  # %(nome)s e afins
+        partes.append(c)
+        i += 1
+
+    sql = "".join(partes).strip().rstrip(';').strip()
+    if ';' in sql or not sql.upper().startswith(('SELECT', 'WITH')):
+        return None  # só leituras de um único comando
+    nome = "fbi_" + hashlib.sha1(sql.encode('utf-8')).hexdigest()[:20]
+    return sql, n, nome
+
+
+def _settings():
+    if not has_app_context():
+        return False, DEFAULT_THRESHOLD, DEFAULT_CACHE_SIZE
+    config = current_app.config
+    return (config.get('DB_PREPARED_STATEMENTS', True),
+            config.get('DB_PREPARE_THRESHOLD', DEFAULT_THRESHOLD),
+            config.get('DB_PREPARED_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+
+
+def _prepared_on(conn) -> OrderedDict:
+    with _statements_lock:
+        prepared = _statements.get(conn)
+        if prepared is None:
+            prepared = _statements[conn] = OrderedDict()
+        return prepared
+
+
+def forget(conn) -> None:
+    """Esquece o que foi preparado na conexão (ex.: sessão reiniciada)."""
+    with _statements_lock:
+        _statements.pop(conn, None)
+
+
+def _prepare(conn, cursor, sql: str, nome: str, cache_size: int) -> bool:
+    """PREPARE dentro de um savepoint: uma falha não derruba a transação (nem o SET LOCAL)."""
+    prepared = _prepared_on(conn)
+    cursor.execute("SAVEPOINT fbi_prepare")
+    try:
+        cursor.execute(f"PREPARE {nome} AS {sql}")
+    except psycopg2.Error as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT fbi_prepare")
+        _unpreparable.add(nome)
+        logger.info(f"Query não será preparada ({nome}): {e}".strip())
+        return False
+    finally:
+        if not conn.closed:
+            cursor.execute("RELEASE SAVEPOINT fbi_prepare")
+    prepared[nome] = None
+    while len(prepared) > cache_size:
+        antigo, _ = prepared.popitem(last=False)
+        cursor.execute(f"DEALLOCATE {antigo}")
+    return True
+
+
+def execute(conn, cursor, query, params=None) -> None:
+    """cursor.execute(query, params), usando um prepared statement quando a query é "quente"."""
+    ativo, limiar, cache_size = _settings()
+    if not ativo or not (params is None or isinstance(params, (tuple, list))):
+        cursor.execute(query, params)
+        return
+    convertida = to_positional(query, params is not None)
+    if convertida is None:
+        cursor.execute(query, params)
+        return
+    sql, n, nome = convertida
+    if n != len(params or ()) or nome in _unpreparable:
+        cursor.execute(query, params)
+        return
+
+    prepared = _prepared_on(conn)
+    if nome not in prepared:
+        execucoes = _executions.get(nome, 0) + 1
+        if len(_executions) >= MAX_TRACKED_QUERIES:
+            _executions.clear()
+        _executions[nome] = execucoes
+        if execucoes < limiar or not _prepare(conn, cursor, sql, nome, cache_size):
+            cursor.execute(query, params)
+            return
+    else:
+        prepared.move_to_end(nome)
+
+    comando = f"EXECUTE {nome} ({', '.join(['%s'] * n)})" if n else f"EXECUTE {nome}"
+    try:
+        cursor.execute(comando, params)
+    except psycopg2.errors.InvalidSqlStatementName:
+        # A sessão perdeu os statements (DISCARD ALL de um pooler, p.ex.): caso raro, então
+        # desfaz a transação (e o SET LOCAL com ela) e refaz sem preparo.
+        logger.warning(f"Prepared statement {nome} sumiu da sessão; refazendo sem preparo.")
+        conn.rollback()
+        forget(conn)
+        cursor.execute(query, params)
@@ -0,0 +1,317 @@
+# backend/db/replica_sync.py
+"""
+Sincronização incremental da réplica analítica (db.analytics_replica).
+
+Em vez de recarregar as tabelas inteiras, cada passada:
+  1. roda a sonda de versões (data_version.probe_signatures) e só mexe nas
+     relações cuja assinatura mudou desde a última passada;
+  2. nas tabelas com marca de alteração (INCREMENTAL), busca no PostgreSQL apenas
+     as linhas alteradas desde a marca d'água local (maior valor já replicado,
+     menos ANALYTICS_REPLICA_SYNC_OVERLAP segundos de folga para transações
+     longas) e as aplica como "upsert": apaga as linhas das chaves recebidas e
+     insere a versão nova;
+  3. recarrega por inteiro as relações pequenas ou derivadas (CONSULTOR,
+     CONTROLE_PRO, V_CUSTOMER, MV_DEVOLUTIVAS) quando mudam; as views no máximo a
+     cada ANALYTICS_REPLICA_VIEW_REFRESH segundos;
+  4. a cada ANALYTICS_REPLICA_RECONCILE_INTERVAL segundos, concilia as chaves das
+     tabelas incrementais: remove o que foi apagado no PostgreSQL e busca o que a
+     marca d'água não pegou.
+
+As métricas (linhas aplicadas, duração, defasagem) ficam no arquivo de estado ao
+lado da réplica (`analytics.duckdb.sync.json`) e aparecem em
+`flask analytics-replica status`. A recarga completa (`analytics-replica build`)
+continua disponível e é usada automaticamente se a réplica não existir.
+"""
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+from flask import current_app
+from .analytics_replica import (
+    REPLICA_RELATIONS, _duckdb, build_replica, copy_rows, replica_path, select_sql, sync_state_path,
+)
+from .connection import get_pool
+from .data_version import VIEW_DEPENDENCIES, probe_signatures
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Tabelas sincronizadas por marca d'água: chave do upsert e colunas de alteração.
+# DEVOLUTIVAS tem várias linhas por cliente: o upsert troca o grupo inteiro do cliente.
+INCREMENTAL = {
+    'CLIENTES': {'key': 'idcliente', 'watermarks': ('dtultalteracao',)},
+    'DEVOLUTIVAS': {'key': 'idcliente', 'watermarks': ('updated_at',)},
+    # idrcb crescente pega boletos novos; dtpagamento, os pagamentos registrados
+    'RCB_CLIENTES': {'key': 'idrcb', 'watermarks': ('idrcb', 'dtpagamento')},
+}
+# Views (sem chave conhecida): recarregadas no máximo a cada ANALYTICS_REPLICA_VIEW_REFRESH s.
+# As demais relações fora de INCREMENTAL são pequenas e recarregadas sempre que mudam.
+DERIVED = tuple(VIEW_DEPENDENCIES) + ('MV_DEVOLUTIVAS',)
+RECOVER_BATCH = 10000
+
+
+# --- Estado ---
+def _load_state(app) -> dict:
+    try:
+        with open(sync_state_path(app), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(app, state: dict) -> None:
+    path = sync_state_path(app)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, default=str, indent=1)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _sync_lock(app, wait: bool):
+    """Uma sincronização/recarga por vez (entre processos). Rende False se outra estiver rodando."""
+    if fcntl is None:
+        yield True
+        return
+    path = replica_path(app) + '.lock'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _relation_signatures(signatures: dict) -> dict:
+    """Assinatura de cada relação da réplica (views: assinaturas das tabelas de que dependem)."""
+    return {
+        relation: "|".join(signatures.get(t, '-') for t in VIEW_DEPENDENCIES.get(relation, (relation,)))
+        for relation in REPLICA_RELATIONS
+    }
+
+
+# --- Operações no DuckDB ---
+def _watermark_condition(duck, relation: str, overlap: int):
+    """Condição SQL (PostgreSQL) das linhas alteradas desde a marca d'água local, e os parâmetros."""
+    spec = INCREMENTAL[relation]
+    colunas = spec['watermarks']
+    marcas = duck.execute(
+        f'SELECT {", ".join(f"MAX({c})" for c in colunas)} FROM "{relation}"'
+    ).fetchone()
+    condicoes, params = [], []
+    for coluna, marca in zip(colunas, marcas):
+        if marca is None:
+            condicoes.append(f"{coluna} IS NOT NULL")
+            continue
+        if isinstance(marca, datetime):
+            marca -= timedelta(seconds=overlap)  # datas (dtpagamento) já são comparadas com >=
+        condicoes.append(f"{coluna} >= %s")
+        params.append(marca)
+    return " OR ".join(condicoes), params, dict(zip(colunas, marcas))
+
+
+def _upsert(pg_conn, duck, relation: str, sql: str, params) -> int:
+    """Troca, na réplica, as linhas das chaves devolvidas por `sql` pela versão do PostgreSQL."""
+    key = INCREMENTAL[relation]['key']
+    duck.execute(f'CREATE OR REPLACE TEMP TABLE _stage AS SELECT * FROM "{relation}" LIMIT 0')
+    recebidas = copy_rows(pg_conn, duck, '_stage', sql, params)
+    if recebidas:
+        duck.execute(f'DELETE FROM "{relation}" WHERE {key} IN (SELECT {key} FROM _stage)')
+        duck.execute(f'INSERT INTO "{relation}" SELECT * FROM _stage')
+    duck.execute('DROP TABLE _stage')
+    return recebidas
+
+
+def _sync_incremental(pg_conn, duck, relation: str, overlap: int) -> dict:
+    key = INCREMENTAL[relation]['key']
+    condicao, params, marcas = _watermark_condition(duck, relation, overlap)
+    sql = (f'{select_sql(relation)} WHERE {key} IN '
+           f'(SELECT {key} FROM public."{relation}" WHERE {condicao})')
+    return {'atualizadas': _upsert(pg_conn, duck, relation, sql, params), 'marca': marcas}
+
+
+def _reconcile(pg_conn, duck, relation: str) -> dict:
+    """Compara as chaves da réplica com as do PostgreSQL: remove as apagadas e busca as que faltam."""
+    import pandas as pd
+
+    key = INCREMENTAL[relation]['key']
+    with pg_conn.cursor() as cursor:
+        cursor.execute(f'SELECT DISTINCT {key} FROM public."{relation}" WHERE {key} IS NOT NULL')
+        chaves = [row[0] for row in cursor.fetchall()]
+    pg_conn.rollback()
+
+    duck.register('chaves_pg', pd.DataFrame({'k': chaves}))
+    try:
+        removidas = duck.execute(
+            f'DELETE FROM "{relation}" WHERE {key} IS NOT NULL AND {key} NOT IN (SELECT k FROM chaves_pg)'
+        ).fetchone()[0]
+        faltando = [row[0] for row in duck.execute(
+            f'SELECT k FROM chaves_pg EXCEPT SELECT {key} FROM "{relation}"'
+        ).fetchall()]
+    finally:
+        duck.unregister('chaves_pg')
+
+    recuperadas = 0
+    for inicio in range(0, len(faltando), RECOVER_BATCH):
+        lote = faltando[inicio:inicio + RECOVER_BATCH]
+        recuperadas += _upsert(pg_conn, duck, relation, f'{select_sql(relation)} WHERE {key} = ANY(%s)', (lote,))
+    return {'removidas': int(removidas), 'recuperadas': recuperadas}
+
+
+def _reload(pg_conn, duck, relation: str) -> int:
+    duck.execute(f'DELETE FROM "{relation}"')
+    return copy_rows(pg_conn, duck, f'"{relation}"', select_sql(relation))
+
+
+# --- API ---
+def rebuild(app=None) -> dict:
+    """Recarga completa (build_replica) + estado inicial da sincronização."""
+    app = app or current_app._get_current_object()
+    with _sync_lock(app, wait=True):
+        signatures = probe_signatures()
+        contagens = build_replica(app)
+        agora = time.time()
+        _save_state(app, {
+            'sincronizado_em': agora,
+            'conciliado_em': agora,
+            'recarregado_em': agora,
+            # Capturadas antes da cópia: o que mudou durante ela é buscado na próxima passada
+            'assinaturas': _relation_signatures(signatures) if signatures else {},
+            'atualizado_em': {relation: agora for relation in REPLICA_RELATIONS},
+            'tabelas': {},
+        })
+    return contagens
+
+
+def sync_replica(app=None, reconcile: Optional[bool] = None) -> Optional[dict]:
+    """
+    Uma passada de sincronização. Retorna as métricas por relação, ou None se outra
+    sincronização já estiver rodando. Sem réplica em disco, faz a recarga completa.
+    `reconcile` força (True) ou impede (False) a conciliação de chaves; None segue o intervalo.
+    """
+    app = app or current_app._get_current_object()
+    if not os.path.exists(replica_path(app)):
+        logger.info("Réplica analítica inexistente: fazendo a recarga completa.")
+        rebuild(app)
+        return {relation: {'recarregada': True} for relation in REPLICA_RELATIONS}
+
+    duckdb = _duckdb()
+    if duckdb is None:
+        raise RuntimeError("O pacote 'duckdb' não está instalado.")
+    config = app.config
+    overlap = config.get('ANALYTICS_REPLICA_SYNC_OVERLAP', 300)
+    view_refresh = config.get('ANALYTICS_REPLICA_VIEW_REFRESH', 300)
+
+    with _sync_lock(app, wait=False) as obtida:
+        if not obtida:
+            logger.info("Sincronização da réplica analítica já em andamento; passada ignorada.")
+            return None
+        inicio = time.time()
+        state = _load_state(app)
+        signatures = probe_signatures()
+        if signatures is None:
+            raise RuntimeError("PostgreSQL indisponível para a sincronização da réplica.")
+        novas = _relation_signatures(signatures)
+        antigas = state.get('assinaturas', {})
+        atualizado_em = state.get('atualizado_em', {})
+        if reconcile is None:
+            reconcile = inicio - state.get('conciliado_em', 0) >= config.get('ANALYTICS_REPLICA_RECONCILE_INTERVAL', 3600)
+
+        pendentes = [r for r in REPLICA_RELATIONS if novas[r] != antigas.get(r)]
+        adiadas = [r for r in pendentes if r in DERIVED and inicio - atualizado_em.get(r, 0) < view_refresh]
+        metricas = {}
+
+        if pendentes != adiadas or reconcile:
+            pool = get_pool(app)
+            pg_conn = pool.getconn()
+            duck = duckdb.connect(replica_path(app))
+            try:
+                duck.execute("SET schema = 'public'")
+                for relation in REPLICA_RELATIONS:
+                    comeco = time.time()
+                    resultado = {}
+                    duck.begin()
+                    try:
+                        if relation in pendentes and relation not in adiadas:
+                            if relation in INCREMENTAL:
+                                resultado.update(_sync_incremental(pg_conn, duck, relation, overlap))
+                            else:
+                                resultado['recarregadas'] = _reload(pg_conn, duck, relation)
+                        if reconcile and relation in INCREMENTAL:
+                            resultado.update(_reconcile(pg_conn, duck, relation))
+                        duck.commit()
+                    except Exception:
+                        duck.rollback()
+                        pg_conn.rollback()
+                        raise
+                    if not resultado:
+                        continue
+                    if relation in pendentes and relation not in adiadas:
+                        # Alterações na fonte ficaram no máximo este tempo sem aparecer na réplica
+                        resultado['defasagem_s'] = round(time.time() - state.get('sincronizado_em', comeco), 1)
+                        antigas[relation] = novas[relation]
+                        atualizado_em[relation] = time.time()
+                    resultado['duracao_s'] = round(time.time() - comeco, 2)
+                    metricas[relation] = resultado
+                duck.execute("CHECKPOINT")
+            finally:
+                duck.close()
+                pool.putconn(pg_conn)
+
+        state.update({
+            'sincronizado_em': time.time(),
+            'duracao_s': round(time.time() - inicio, 2),
+            'assinaturas': antigas,
+            'atualizado_em': atualizado_em,
+            'adiadas': adiadas,
+            'tabelas': {**state.get('tabelas', {}), **metricas},
+        })
+        if reconcile:
+            state['conciliado_em'] = state['sincronizado_em']
+        _save_state(app, state)
+
+    if metricas:
+        resumo = ", ".join(
+            f"{r}: +{m.get('atualizadas', m.get('recarregadas', 0))}/-{m.get('removidas', 0)}" for r, m in metricas.items()
+        )
+        logger.info(f"Réplica analítica sincronizada em {state['duracao_s']:.2f} s ({resumo})")
+    return metricas
+
+
+def sync_status(app=None) -> dict:
+    """Métricas da última sincronização e a defasagem atual (segundos desde a última passada)."""
+    app = app or current_app._get_current_object()
+    state = _load_state(app)
+    agora = time.time()
+    return {
+        'arquivo': replica_path(app),
+        'existe': os.path.exists(replica_path(app)),
+        'atraso_s': round(agora - state['sincronizado_em'], 1) if 'sincronizado_em' in state else None,
+        'desde_conciliacao_s': round(agora - state['conciliado_em'], 1) if 'conciliado_em' in state else None,
+        'ultima_duracao_s': state.get('duracao_s'),
+        'adiadas': state.get('adiadas', []),
+        'tabelas': state.get('tabelas', {}),
+    }
+
+
+def run_loop(app, interval: Optional[float] = None) -> None:
+    """Sincroniza indefinidamente a cada `interval` segundos (ANALYTICS_REPLICA_SYNC_INTERVAL)."""
+    interval = interval or app.config.get('ANALYTICS_REPLICA_SYNC_INTERVAL', 60)
+    while True:
+        try:
+            sync_replica(app)
+        except Exception as e:
+            logger.error(f"Erro na sincronização da réplica analítica: {e}", exc_info=True)
+        time.sleep(interval)
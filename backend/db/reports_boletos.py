@@ -1,13 +1,23 @@
 # backend/db/reports_boletos.py
+import csv
 import logging
 import os
-import pandas as pd
-import numpy as np
-from typing import List, Tuple, Optional, Union, Dict, Any
-from .executor import execute_query, execute_query_one
+import re
+from typing import TYPE_CHECKING, List, Tuple, Optional, Union, Dict, Any
+from .connection import ROUTE_REPLICA
+from .executor import execute_query, execute_query_one, execute_query_frame
+from .data_version import versioned_cache
+
+# pandas/numpy são importados sob demanda (só este relatório e as análises usam),
+# para não pesar no boot de cada worker.
+if TYPE_CHECKING:
+    import pandas as pd
 
 logger = logging.getLogger(__name__)
 
+# Tabelas lidas pelo relatório (chave do snapshot em cache; os CSVs entram no token de versão)
+BOLETOS_TABLES = ('CLIENTES', 'RCB_CLIENTES', 'CONSULTOR', 'CONTROLE_PRO', 'DEVOLUTIVAS')
+
 # --- NOVO: Variável final_columns_order movida para o nível do módulo ---
 final_columns_order = [
      "codigo", "nome", "instalacao", "numero_cliente", "cpf_cnpj", "cidade",
@@ -36,8 +46,10 @@ WITH LatestDevolutiva AS (
     ORDER BY idcliente, updated_at DESC
 ),
 BaseQuery AS (
-    -- 2. A query principal agora usa o resultado da CTE acima
-    SELECT 
+    -- 2. A query principal agora usa o resultado da CTE acima.
+    -- DISTINCT ON garante uma linha por cliente (ex.: idconsultor repetido em CONSULTOR),
+    -- para que a contagem, as páginas e a exportação tenham as mesmas linhas
+    SELECT DISTINCT ON (c.idcliente)
         c.idcliente AS codigo, 
         c.nome, 
         c.numinstalacao AS instalacao,  
@@ -58,7 +70,7 @@ BaseQuery AS (
             END
         END AS fornecedora,
         c.consumomedio,
-        TO_CHAR(c.data_ativo, 'DD/MM/YYYY') AS data_ativo,
+        c.data_ativo,
         CASE
             WHEN c.data_ativo IS NOT NULL 
             THEN EXTRACT(DAY FROM (NOW() - c.data_ativo))::INTEGER
@@ -82,7 +94,7 @@ BaseQuery AS (
             WHEN cp.dtgraduacao IS NULL THEN 'NÃO'
             ELSE 'SIM'
         END AS status_pro,
-        TO_CHAR(cp.dtgraduacao, 'DD/MM/YYYY') AS data_graduacao_pro,
+        cp.dtgraduacao AS data_graduacao_pro,
         COUNT(rcb.numinstalacao) AS quantidade_boletos,
         -- Adicionando campos da nova lógica de 'Retorno Fornecedora'
         (SELECT obs FROM public."DEVOLUTIVAS" WHERE idcliente=c.idcliente AND corrigida = false ORDER BY updated_at DESC LIMIT 1) AS obs_devolutiva_nao_corrigida
@@ -111,35 +123,106 @@ BaseQuery AS (
         c.idconsultor, cons.nome, cp.dtgraduacao, c.cnpj, c."cpf/cnpj", c.numcliente,
         d.obs,
         d.corrigida -- <<< CAMPO ADICIONADO AO GROUP BY >>>
+    ORDER BY c.idcliente
 )
 """
 
-def load_csv_prazos(project_root: str) -> pd.DataFrame:
+def load_csv_prazos(project_root: str) -> 'pd.DataFrame':
     """Carrega o CSV de prazos, padronizando colunas de string."""
+    import pandas as pd
     csv_path_prazos = os.path.join(project_root, 'data', 'prazos.csv')
     try:
         df = pd.read_csv(csv_path_prazos, delimiter=';')
         for col in ['ufconsumo', 'concessionaria', 'fornecedora']:
             if col in df.columns:
                 df[col] = df[col].astype(str).str.strip().str.upper()
-        return df
+        # Uma linha por chave: prazos repetidos multiplicariam os clientes no merge
+        chave = [col for col in ['ufconsumo', 'concessionaria', 'fornecedora'] if col in df.columns]
+        return df.drop_duplicates(subset=chave, keep='first') if chave else df
     except FileNotFoundError:
         logger.error(f"Arquivo 'prazos.csv' não encontrado: {csv_path_prazos}")
         return pd.DataFrame()
 
-def load_csv_devolutivas(project_root: str) -> pd.DataFrame:
+def load_csv_devolutivas(project_root: str) -> 'pd.DataFrame':
     """Carrega o CSV de devolutivas, renomeando colunas conforme necessário."""
+    import pandas as pd
     csv_path_devolutivas = os.path.join(project_root, 'data', 'devolutivas.csv')
     try:
         df = pd.read_csv(csv_path_devolutivas, delimiter=';', dtype={'idcliente': 'Int64'})
         df.rename(columns={'idcliente': 'codigo', 'retorno_fornecedora': 'retorno_fornecedora'}, inplace=True)
-        return df
+        # Uma linha por cliente (a primeira do CSV): devolutivas repetidas multiplicariam o cliente no merge
+        return df.drop_duplicates(subset='codigo', keep='first') if 'codigo' in df.columns else df
     except FileNotFoundError:
         logger.error(f"Arquivo 'devolutivas.csv' não encontrado: {csv_path_devolutivas}")
         return pd.DataFrame()
 
-def calcular_colunas_atraso(df: pd.DataFrame) -> pd.DataFrame:
+def load_prazos_arrays(project_root: str) -> Tuple[List[str], List[str], List[str], List[int]]:
+    """
+    Lê o CSV de prazos sem pandas, como arrays paralelos (UF, concessionária,
+    fornecedora, prazo em dias) prontos para `unnest(...)` no SQL.
+    Linhas com algum campo vazio são ignoradas: no merge do pandas esses campos viram
+    NaN e nunca casam com um cliente (a fornecedora vem do SQL como ''), então o
+    resultado é o mesmo do relatório.
+    """
+    ufs, concessionarias, fornecedoras, prazos = [], [], [], []
+    csv_path_prazos = os.path.join(project_root, 'data', 'prazos.csv')
+    try:
+        with open(csv_path_prazos, newline='', encoding='utf-8-sig') as f:
+            for linha in csv.DictReader(f, delimiter=';'):
+                chave = [str(linha.get(col) or '').strip().upper() for col in ('ufconsumo', 'concessionaria', 'fornecedora')]
+                prazo = re.search(r'(\d+)', str(linha.get('injecao') or ''))
+                if not all(chave) or prazo is None:
+                    continue
+                ufs.append(chave[0]); concessionarias.append(chave[1]); fornecedoras.append(chave[2])
+                prazos.append(int(prazo.group(1)))
+    except FileNotFoundError:
+        logger.error(f"Arquivo 'prazos.csv' não encontrado: {csv_path_prazos}")
+    return ufs, concessionarias, fornecedoras, prazos
+
+def load_codigos_com_retorno(project_root: str) -> List[int]:
+    """Códigos de clientes com 'retorno_fornecedora' preenchido no CSV de devolutivas (nunca estão em atraso)."""
+    codigos = []
+    csv_path_devolutivas = os.path.join(project_root, 'data', 'devolutivas.csv')
+    try:
+        with open(csv_path_devolutivas, newline='', encoding='utf-8-sig') as f:
+            for linha in csv.DictReader(f, delimiter=';'):
+                idcliente = str(linha.get('idcliente') or '').strip()
+                if idcliente.isdigit() and str(linha.get('retorno_fornecedora') or '').strip():
+                    codigos.append(int(idcliente))
+    except FileNotFoundError:
+        logger.error(f"Arquivo 'devolutivas.csv' não encontrado: {csv_path_devolutivas}")
+    return codigos
+
+# Contagem de clientes em atraso na injeção por UF, no banco: mesma regra de
+# calcular_colunas_atraso, com os prazos e as devolutivas dos CSVs como arrays.
+# Parâmetros: 'CANCELADO%', ufs[], concessionarias[], fornecedoras[], prazos[], codigos_com_retorno[]
+OVERDUE_BY_UF_CTE = """,
+Prazos AS (
+    SELECT * FROM unnest(%s::text[], %s::text[], %s::text[], %s::int[])
+        AS p(ufconsumo, concessionaria, fornecedora, prazo)
+),
+AtrasoPorUF AS (
+    SELECT
+        UPPER(TRIM(b.ufconsumo)) AS uf,
+        COUNT(DISTINCT b.codigo) AS overdue_count
+    FROM BaseQuery b
+    JOIN Prazos p
+        ON p.ufconsumo = UPPER(TRIM(b.ufconsumo))
+        AND p.concessionaria = UPPER(TRIM(b.concessionaria))
+        AND p.fornecedora = UPPER(TRIM(b.fornecedora))
+    WHERE b.quantidade_boletos = 0
+        AND b.data_ativo IS NOT NULL
+        AND b.dias_desde_ativacao - p.prazo > 0
+        AND COALESCE(b.devolutiva, '') = ''
+        AND b.codigo <> ALL(%s::bigint[])
+    GROUP BY UPPER(TRIM(b.ufconsumo))
+)
+"""
+
+def calcular_colunas_atraso(df: 'pd.DataFrame') -> 'pd.DataFrame':
     """Calcula as colunas 'atraso_na_injecao' e 'dias_em_atraso' no DataFrame."""
+    import numpy as np
+    import pandas as pd
     df['prazo_numerico'] = pd.to_numeric(df['injecao'].astype(str).str.extract(r'(\d+)', expand=False), errors='coerce')
     cond_qtd_boletos = (df['quantidade_boletos'] == 0)
     cond_data_ativo = df['data_ativo'].notna() & (df['data_ativo'] != '')
@@ -159,11 +242,16 @@ def calcular_colunas_atraso(df: pd.DataFrame) -> pd.DataFrame:
     df['dias_em_atraso'] = np.where(df['atraso_na_injecao'] == 'SIM', dias_em_atraso_calculado, np.nan)
     return df
 
-def get_boletos_por_cliente_data(offset: int = 0, limit: Optional[int] = None, fornecedora: Optional[str] = None, export_mode: bool = False) -> List[Union[Dict[str, Any], Tuple]]:
+@versioned_cache(*BOLETOS_TABLES, maxsize=8)
+def get_boletos_por_cliente_frame(offset: int = 0, limit: Optional[int] = None, fornecedora: Optional[str] = None) -> 'pd.DataFrame':
     """
     Busca dados, junta com CSVs e calcula as colunas 'Atraso na Injeção' e 'Dias em Atraso'.
-    Modularizado para facilitar manutenção e testes.
+    Retorna o DataFrame final (valores crus, sem formatação de exibição), na ordem de
+    `final_columns_order`. Usado pelo relatório e pelas análises vetorizadas (Green Score/KPIs).
+    O snapshot fica em cache até alguma tabela de origem (ou CSV) mudar: não altere o
+    DataFrame retornado.
     """
+    import pandas as pd
     # 1. Busca os dados do banco de dados (SQL)
     query_final_sql = "SELECT * FROM BaseQuery"
     params_sql = ['CANCELADO%']
@@ -179,16 +267,17 @@ def get_boletos_por_cliente_data(offset: int = 0, limit: Optional[int] = None, f
         params_sql.append(offset)
     full_query_sql = CTE_BASE + query_final_sql + ";"
 
+    # 2. Lê o resultado já em formato colunar (sem um dicionário por linha)
     try:
-        results_sql = execute_query(full_query_sql, tuple(params_sql)) or []
-        if not results_sql:
-            return []
+        # Sem paginação (Green Score, KPIs de atraso, exportação): orçamento de tempo 'analytics'
+        df_sql = execute_query_frame(full_query_sql, tuple(params_sql), route=ROUTE_REPLICA,
+                                     query_class='analytics' if limit is None else None)
+        if df_sql.empty:
+            return pd.DataFrame(columns=final_columns_order)
     except Exception as e:
         logger.error(f"Erro ao buscar dados de boletos (SQL): {e}", exc_info=True)
-        return []
+        return pd.DataFrame(columns=final_columns_order)
 
-    # 2. Converte os resultados do SQL para um DataFrame
-    df_sql = pd.DataFrame(results_sql)
     for col in ['ufconsumo', 'concessionaria', 'fornecedora']:
         if col in df_sql.columns:
             df_sql[col] = df_sql[col].astype(str).str.strip().str.upper()
@@ -214,17 +303,24 @@ def get_boletos_por_cliente_data(offset: int = 0, limit: Optional[int] = None, f
     for col in ['injecao', 'atraso_na_injecao', 'dias_em_atraso', 'retorno_fornecedora']:
         if col in df_final.columns:
             df_final[col] = df_final[col].fillna('')
-    if not export_mode:
-        for col in ['consumomedio']:
-            if col in df_final.columns:
-                df_final[col] = df_final[col].apply(lambda x: f"{x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".") if pd.notna(x) else '')
-    if not export_mode and 'dias_desde_ativacao' in df_final.columns:
-        df_final['dias_desde_ativacao'] = df_final['dias_desde_ativacao'].astype('Int64').astype(str).replace('<NA>', '')
-    
-    # CORREÇÃO: Altera o retorno para lista de dicionários para compatibilidade
+    return df_final
+
+def get_boletos_por_cliente_data(offset: int = 0, limit: Optional[int] = None, fornecedora: Optional[str] = None, export_mode: bool = False) -> List[Union[Dict[str, Any], Tuple]]:
+    """
+    Busca os dados do relatório 'Boletos por Cliente' como lista de dicionários.
+    Retorna sempre valores crus (datas como datetime, consumo numérico); a formatação
+    pt-BR é feita na camada de apresentação (backend.formatting). `export_mode` é
+    mantido por compatibilidade.
+    """
+    df_final = get_boletos_por_cliente_frame(offset=offset, limit=limit, fornecedora=fornecedora)
+    if df_final.empty:
+        return []
+    # NaT/NaN viram None para que o exportador grave células vazias
+    df_final = df_final.astype(object).where(df_final.notna(), None)
     return df_final.to_dict('records')
 
 
+@versioned_cache(*BOLETOS_TABLES)
 def count_boletos_por_cliente(fornecedora: Optional[str] = None) -> int:
     """Conta o total de clientes. Esta função não é alterada."""
     query_final = "SELECT COUNT(*) AS total_boletos FROM BaseQuery"
@@ -238,7 +334,7 @@ def count_boletos_por_cliente(fornecedora: Optional[str] = None) -> int:
 
     try: 
         # CORREÇÃO: Usando execute_query_one e acessando por chave
-        result = execute_query_one(full_query, tuple(params))
+        result = execute_query_one(full_query, tuple(params), route=ROUTE_REPLICA)
         return int(result['total_boletos']) if result and result['total_boletos'] is not None else 0
     except Exception as e: 
         logger.error(f"Erro ao contar boletos por cliente: {e}", exc_info=True)
@@ -0,0 +1,395 @@
+# backend/db/reports_engine.py
+"""
+Motor genérico dos relatórios declarados em db.reports_registry.
+
+A partir de um ReportSpec, monta e executa:
+* a contagem (em cache por versão dos dados quando o relatório é `cacheable`);
+* a projeção das colunas escolhidas (`cols`): só elas entram no SELECT e os JOINs
+  que nenhuma coluna/condição usa são omitidos;
+* a busca textual (`q`) sobre os campos declarados em `search`, atendida por índices
+  de trigramas (pg_trgm; SQL em `search_index_sql`, aplicado com `flask search-indexes`);
+* a página, por keyset (`WHERE chave > última_chave ORDER BY chave LIMIT n`) quando
+  o relatório tem `key` e a navegação é sequencial, ou por OFFSET nos saltos;
+* a exportação em streaming (cursor no servidor, linhas entregues em lotes); nas
+  exportações multi-aba, as queries das abas rodam ao mesmo tempo (parallel.prefetch);
+* métricas por relatório e operação (chamadas, erros, linhas, tempos), por processo.
+"""
+import itertools
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from . import parallel
+from .connection import ROUTE_REPLICA
+from .data_version import versioned_cache
+from .executor import execute_query, execute_query_one, execute_query_stream
+from .reports_registry import REPORTS, SEARCH_MIN_LENGTH, Column, ReportSpec
+
+logger = logging.getLogger(__name__)
+
+STREAM_BATCH_SIZE = 2000
+
+
+# --- Filtros ---
+def parse_filters(spec: ReportSpec, args) -> Dict[str, Any]:
+    """Lê da URL os filtros aceitos pelo relatório; retorna só os ativos ({nome: valor})."""
+    filters = {}
+    for f in spec.filters:
+        value = f.parse(args.get(f.name))
+        if value is not None:
+            filters[f.name] = value
+    if spec.search:
+        termo = parse_search(args.get('q'))
+        if termo:
+            filters['q'] = termo
+    return filters
+
+
+def parse_columns(spec: ReportSpec, keys: Iterable[str]) -> Optional[Tuple[Column, ...]]:
+    """
+    Colunas escolhidas (chaves de `spec.columns`), na ordem do relatório e com as
+    obrigatórias (keyset). None = todas (nenhuma escolha, ou todas escolhidas).
+    """
+    escolhidas = set(keys or ()) & {c.key for c in spec.columns}
+    if not escolhidas:
+        return None
+    escolhidas.update(spec.required_columns)
+    selecionadas = tuple(c for c in spec.columns if c.key in escolhidas)
+    return None if len(selecionadas) == len(spec.columns) else selecionadas
+
+
+def parse_search(value: Optional[str]) -> Optional[str]:
+    """Termo da busca com espaços normalizados (None se vazio ou curto demais)."""
+    termo = " ".join((value or '').split())
+    return termo if len(termo) >= SEARCH_MIN_LENGTH else None
+
+
+def _like_pattern(termo: str) -> str:
+    """Padrão '%termo%' com os curingas do LIKE escapados (a barra é o escape padrão)."""
+    return "%" + termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + "%"
+
+
+def _search(spec: ReportSpec, termo: str) -> Tuple[Optional[str], List[Any]]:
+    """Cláusula (campo1 OR campo2 ...) da busca; campos de dígitos só entram com 3+ dígitos."""
+    digitos = re.sub(r'\D', '', termo)
+    partes, params = [], []
+    for campo in spec.search:
+        valor = digitos if campo.digits else termo
+        if len(valor) < SEARCH_MIN_LENGTH:
+            continue
+        partes.append(campo.clause)
+        params.append(_like_pattern(valor))
+    if not partes:
+        return None, []
+    return f"({' OR '.join(partes)})", params
+
+
+def _where(spec: ReportSpec, filters: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+    clauses, params = list(spec.where), []
+    for f in spec.filters:
+        if f.name in filters:
+            clauses.append(f.clause)
+            params.append(filters[f.name])
+    if spec.search and filters.get('q'):
+        clause, search_params = _search(spec, filters['q'])
+        if clause:
+            clauses.append(clause)
+            params.extend(search_params)
+    return clauses, params
+
+
+def search_index_sql() -> str:
+    """
+    SQL dos índices usados pela busca dos relatórios (extensão pg_trgm e um índice por
+    expressão pesquisada), criados com CONCURRENTLY para não bloquear as escritas.
+    """
+    partes, vistos = ["CREATE EXTENSION IF NOT EXISTS pg_trgm;"], set()
+    for spec in REPORTS.values():
+        for campo in spec.search:
+            for tabela, metodo, expr in campo.indexes:
+                if (tabela, metodo, expr) in vistos:
+                    continue
+                vistos.add((tabela, metodo, expr))
+                sufixo = re.sub(r'[^a-z0-9]+', '_', expr.lower().replace('gin_trgm_ops', 'trgm')).strip('_')
+                nome = f"fbi_search_{tabela.lower()}_{sufixo}"[:63]
+                partes.append(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {nome}\n'
+                              f'    ON public."{tabela}" USING {metodo} ({expr});')
+    return "\n\n".join(partes) + "\n"
+
+
+# --- Montagem das queries ---
+def _uses_alias(alias: str, text: str) -> bool:
+    return re.search(rf'(?<![\w"]){re.escape(alias)}\.', text) is not None
+
+
+def _joins(spec: ReportSpec, *parts: str) -> str:
+    """JOINs cujo alias aparece em alguma parte da query (os demais são omitidos)."""
+    texto = " ".join(p for p in parts if p)
+    return " ".join(sql for alias, sql in spec.joins if _uses_alias(alias, texto))
+
+
+def _order_by(order_by: Optional[str], omitidas: Iterable[Column]) -> Optional[str]:
+    """Troca, no ORDER BY, os aliases de colunas não projetadas pelas suas expressões."""
+    if not order_by:
+        return order_by
+    for col in omitidas:
+        if col.value != col.expr:
+            order_by = re.sub(rf'(?<![\w."]){re.escape(col.key)}(?![\w"])', lambda _: col.value, order_by)
+    return order_by
+
+
+def build_select(spec: ReportSpec, filters: Dict[str, Any], offset: int = 0, limit: Optional[int] = None,
+                 after: Any = None, before: Any = None,
+                 columns: Optional[Sequence[Column]] = None) -> Tuple[str, tuple]:
+    """
+    SELECT do relatório; `after`/`before` aplicam o keyset sobre `spec.key` e `columns`
+    restringe a projeção (None = todas as colunas).
+    """
+    clauses, params = _where(spec, filters)
+    columns = columns or spec.columns
+    order_by = _order_by(spec.order_by, [c for c in spec.columns if c not in columns])
+    if spec.key and after is not None:
+        clauses.append(f"{spec.key} > %s"); params.append(after)
+        order_by = spec.key
+    elif spec.key and before is not None:
+        # Página anterior: lê de trás para frente e o chamador inverte
+        clauses.append(f"{spec.key} < %s"); params.append(before)
+        order_by = f"{spec.key} DESC"
+    select = ", ".join(c.expr for c in columns)
+    if spec.distinct_on:
+        # DISTINCT ON exige que o ORDER BY comece pela mesma expressão
+        if not order_by or re.split(r'[\s,]', order_by.strip(), 1)[0] != spec.distinct_on:
+            order_by = f"{spec.distinct_on}, {order_by}" if order_by else spec.distinct_on
+        select = f"DISTINCT ON ({spec.distinct_on}) {select}"
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    partes = [f"SELECT {select} FROM {spec.from_}", _joins(spec, select, where, spec.group_by or '', order_by or ''), where]
+    if spec.group_by:
+        partes.append(f"GROUP BY {spec.group_by}")
+    if order_by:
+        partes.append(f"ORDER BY {order_by}")
+    if limit is not None:
+        partes.append("LIMIT %s"); params.append(limit)
+    if offset > 0:
+        partes.append("OFFSET %s"); params.append(offset)
+    return " ".join(p for p in partes if p) + ";", tuple(params)
+
+
+def build_count(spec: ReportSpec, filters: Dict[str, Any]) -> Tuple[str, tuple]:
+    """COUNT do relatório, só com os JOINs exigidos pelo WHERE/GROUP BY."""
+    clauses, params = _where(spec, filters)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    distinct = spec.distinct_on
+    base = " ".join(p for p in [f"FROM {spec.from_}", _joins(spec, where, spec.group_by or '', distinct or ''), where] if p)
+    if spec.group_by:
+        linha = f"DISTINCT ON ({distinct}) 1" if distinct else "1"
+        return f"SELECT COUNT(*) AS count FROM (SELECT {linha} {base} GROUP BY {spec.group_by}) t;", tuple(params)
+    if distinct:
+        return f"SELECT COUNT(DISTINCT {distinct}) AS count {base};", tuple(params)
+    return f"SELECT COUNT(*) AS count {base};", tuple(params)
+
+
+# --- Métricas ---
+_metrics: Dict[str, Dict[str, Dict[str, float]]] = {}
+_metrics_lock = threading.Lock()
+
+
+@contextmanager
+def _measure(spec: ReportSpec, operation: str):
+    """Mede uma operação; o bloco pode informar as linhas em `stats['rows']`."""
+    stats = {'rows': 0, 'error': False}
+    inicio = time.perf_counter()
+    try:
+        yield stats
+    except Exception:
+        stats['error'] = True
+        raise
+    finally:
+        ms = (time.perf_counter() - inicio) * 1000
+        with _metrics_lock:
+            m = _metrics.setdefault(spec.name, {}).setdefault(
+                operation, {'calls': 0, 'errors': 0, 'rows': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            m['calls'] += 1
+            m['errors'] += int(stats['error'])
+            m['rows'] += stats['rows']
+            m['total_ms'] += ms
+            m['max_ms'] = max(m['max_ms'], ms)
+        logger.debug(f"Relatório '{spec.name}' ({operation}): {ms:.0f} ms, {stats['rows']} linha(s)")
+
+
+def metrics_snapshot() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Métricas do processo: {relatório: {operação: {calls, errors, rows, total_ms, avg_ms, max_ms}}}."""
+    with _metrics_lock:
+        return {
+            nome: {
+                op: {**m, 'total_ms': round(m['total_ms'], 1), 'max_ms': round(m['max_ms'], 1),
+                     'avg_ms': round(m['total_ms'] / m['calls'], 1) if m['calls'] else 0.0}
+                for op, m in ops.items()
+            }
+            for nome, ops in _metrics.items()
+        }
+
+
+def reset_metrics() -> None:
+    with _metrics_lock:
+        _metrics.clear()
+
+
+# --- Contagem ---
+def _count_sql(spec: ReportSpec, filters: Dict[str, Any]) -> Optional[int]:
+    query, params = build_count(spec, filters)
+    result = execute_query_one(query, params, route=ROUTE_REPLICA)
+    return int(result['count']) if result and result['count'] is not None else None
+
+
+_count_caches: Dict[str, Any] = {}
+_count_caches_lock = threading.Lock()
+
+
+def _cached_count(spec: ReportSpec):
+    """Função de contagem com cache por versão das tabelas do relatório (uma por relatório)."""
+    with _count_caches_lock:
+        fn = _count_caches.get(spec.name)
+        if fn is None:
+            @versioned_cache(*spec.tables, maxsize=64)
+            def fn(name: str, filtros: tuple) -> Optional[int]:
+                return _count_sql(spec, dict(filtros))
+            _count_caches[spec.name] = fn
+        return fn
+
+
+def count(spec: ReportSpec, filters: Dict[str, Any]) -> int:
+    """Total de linhas do relatório com os filtros (0 em caso de erro)."""
+    with _measure(spec, 'count') as stats:
+        if spec.count is not None:
+            total = spec.count(filters)
+        elif spec.cacheable and spec.tables and 'q' not in filters:
+            # Buscas livres não entram no cache (poluiriam o LRU); o índice já as torna rápidas
+            total = _cached_count(spec)(spec.name, tuple(sorted(filters.items())))
+        else:
+            total = _count_sql(spec, filters)
+        stats['rows'] = total or 0
+        return total or 0
+
+
+# --- Página ---
+def _project(rows: Iterable, columns: Optional[Sequence[Column]]) -> Iterator:
+    """Projeção em Python, para relatórios calculados fora do banco (fetch/stream)."""
+    if not columns:
+        yield from rows
+        return
+    keys = [c.key for c in columns]
+    for row in rows:
+        yield {k: row.get(k) for k in keys}
+
+
+def fetch_page(spec: ReportSpec, filters: Dict[str, Any], offset: int, limit: int,
+               after: Any = None, before: Any = None,
+               columns: Optional[Sequence[Column]] = None) -> List[Any]:
+    """
+    Linhas de uma página (keyset com `after`/`before` quando o relatório tem `key`),
+    só com as colunas de `columns` (None = todas).
+    """
+    with _measure(spec, 'page') as stats:
+        if spec.fetch is not None:
+            rows = list(_project(spec.fetch(filters, offset, limit) or [], columns))
+        else:
+            if not spec.key:
+                after = before = None
+            keyset = after is not None or before is not None
+            query, params = build_select(spec, filters, offset=0 if keyset else offset,
+                                         limit=limit, after=after, before=before, columns=columns)
+            rows = execute_query(query, params, route=ROUTE_REPLICA) or []
+            if before is not None and after is None:
+                rows = rows[::-1]
+        stats['rows'] = len(rows)
+        return rows
+
+
+def page_bounds(spec: ReportSpec, rows: List[Any]) -> Tuple[Any, Any]:
+    """(primeira, última) chave da página, para os links de keyset (None sem `key`)."""
+    chave = spec.key_column
+    if not chave or not rows or spec.fetch is not None:
+        return None, None
+    return rows[0].get(chave), rows[-1].get(chave)
+
+
+# --- Exportação ---
+def iter_rows(spec: ReportSpec, filters: Dict[str, Any], batch_size: int = STREAM_BATCH_SIZE,
+              columns: Optional[Sequence[Column]] = None) -> Iterator[Any]:
+    """
+    Todas as linhas do relatório, em streaming (cursor no servidor), sem materializar o
+    resultado. Erros do banco são propagados: uma exportação parcial seria pior que nenhuma.
+    """
+    with _measure(spec, 'export') as stats:
+        if spec.stream is not None:
+            rows = _project(spec.stream(filters), columns)
+        else:
+            query, params = build_select(spec, filters, columns=columns)
+            rows = execute_query_stream(query, params, batch_size=batch_size, route=ROUTE_REPLICA)
+        for row in rows:
+            stats['rows'] += 1
+            yield row
+
+
+def _counted(spec: ReportSpec, rows: Iterable) -> Iterator[Any]:
+    with _measure(spec, 'export') as stats:
+        for row in rows:
+            stats['rows'] += 1
+            yield row
+
+
+def _sheet_data(rows: Iterator[Any]):
+    """
+    Dados da aba a partir das linhas: [] se não houver nenhuma (a primeira é lida já
+    aqui), senão um gerador de tuplas na ordem do SELECT.
+    """
+    primeira = next(rows, None)
+    if primeira is None:
+        return []
+
+    def valores():
+        # Row.values() já é a tupla na ordem do SELECT; dicionários seguem a ordem das colunas
+        for row in itertools.chain((primeira,), rows):
+            yield tuple(row.values())
+    return valores()
+
+
+def export_sheets(spec: ReportSpec, filters: Dict[str, Any],
+                  columns: Optional[Sequence[Column]] = None) -> List[Dict[str, Any]]:
+    """
+    Abas da exportação, com as linhas em streaming (valores na ordem dos cabeçalhos) e
+    só as colunas de `columns` (None = todas): uma aba com o relatório ou, com
+    `export_queries`, uma aba por query, todas já rodando no banco em paralelo. Abas
+    sem linhas são devolvidas com 'data' vazio; use `has_rows` antes de gerar o arquivo.
+    """
+    headers = [c.header for c in columns] if columns else spec.headers
+    if spec.export_queries is not None:
+        abas = spec.export_queries(filters, [c.expr for c in columns or spec.columns])
+        # Todas as queries começam agora; cada aba é lida quando o exportador chegar nela
+        streams = [
+            parallel.prefetch(partial(execute_query_stream, query, params, batch_size=STREAM_BATCH_SIZE,
+                                      route=ROUTE_REPLICA))
+            for _, query, params in abas
+        ]
+        return [
+            {'name': nome[:31], 'headers': headers, 'data': _sheet_data(_counted(spec, rows)),
+             'column_formats': spec.column_formats}
+            for (nome, _, _), rows in zip(abas, streams)
+        ]
+    fornecedora = filters.get('fornecedora') or spec.fixed_fornecedora
+    titulo = spec.sheet_title.format(fornecedora=sheet_fornecedora(fornecedora))[:31]
+    data = _sheet_data(iter_rows(spec, filters, columns=columns))
+    return [{'name': titulo, 'headers': headers, 'data': data, 'column_formats': spec.column_formats}]
+
+
+def has_rows(sheets: List[Dict[str, Any]]) -> bool:
+    return any(not isinstance(s['data'], (list, tuple)) or len(s['data']) > 0 for s in sheets)
+
+
+def sheet_fornecedora(fornecedora: Optional[str]) -> str:
+    """Fornecedora como aparece em nomes de arquivo/aba ('Consolidado' sem filtro)."""
+    from werkzeug.utils import secure_filename
+    return secure_filename(fornecedora).replace('_', '') if fornecedora else 'Consolidado'
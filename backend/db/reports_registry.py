@@ -0,0 +1,393 @@
+# backend/db/reports_registry.py
+"""
+Registro declarativo dos relatórios de /relatorios e /export.
+
+Cada relatório declara aqui a sua query base (colunas, FROM, JOINs, WHERE fixo,
+GROUP BY e ORDER BY), a coluna-chave da paginação por keyset, os filtros aceitos,
+os cabeçalhos (um por coluna, na ordem do SELECT), as tabelas de origem e se a
+contagem pode ficar em cache. O motor genérico (db.reports_engine) monta as queries
+de página, contagem e exportação a partir dessas declarações; relatórios que não
+são uma query simples (Boletos por Cliente, com CSVs e pandas) declaram funções
+próprias, e as exportações multi-aba do rateio declaram uma query por aba.
+"""
+import logging
+import re
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from .reports_base import RATEIO_EXPORT_TABLES, _get_query_fields, rateio_base_query
+from .reports_boletos import (
+    BOLETOS_TABLES, final_columns_order, get_boletos_por_cliente_data, count_boletos_por_cliente
+)
+from .reports_specific import _get_rateio_rzk_fields, _get_recebiveis_clientes_fields
+from ..formatting import EXCEL_MONTH_FORMAT
+
+logger = logging.getLogger(__name__)
+
+# Filtro de origem comum aos relatórios de clientes
+ORIGEM_CLIENTE = "(c.origem IS NULL OR c.origem IN ('', 'WEB', 'BACKOFFICE', 'APP'))"
+
+# --- Cabeçalhos por chave de coluna (nome da coluna no resultado) ---
+HEADER_MAP = {
+    "idcliente": "ID Cliente", "nome": "Nome", "numinstalacao": "Instalação", "celular": "Celular",
+    "cidade": "Cidade", "regiao": "Região", "data_ativo": "Data Ativo", "qtdeassinatura": "Assinaturas",
+    "consumomedio": "Consumo Médio", "status": "Status Cliente", "dtcad": "Data Cadastro",
+    "cpf/cnpj": "CPF/CNPJ", "numcliente": "Num Cliente", "dtultalteracao": "Dt Ult Alteracao",
+    "celular_2": "Celular 2", "email": "Email", "rg": "RG", "emissor": "Emissor",
+    "datainjecao": "Data Injeção", "idconsultor": "ID Licenciado", "consultor_nome": "Licenciado",
+    "consultor_celular": "Celular Licenciado", "cep": "CEP", "endereco": "Endereço", "numero": "Número",
+    "bairro": "Bairro", "complemento": "Complemento", "cnpj": "CNPJ", "razao": "Razão Social",
+    "fantasia": "Nome Fantasia", "ufconsumo": "UF", "classificacao": "Classificação",
+    "keycontrato": "Key Contrato", "keysigner": "Key Signer", "leadidsolatio": "Lead ID Solatio",
+    "indcli": "Indicação Cliente", "enviadocomerc": "Enviado Comercial", "obs": "Obs",
+    "posvenda": "Pós Venda", "retido": "Retido", "contrato_verificado": "Contrato Verificado",
+    "rateio": "Rateio", "validadosucesso": "Validado Sucesso", "status_sucesso": "Status Sucesso",
+    "documentos_enviados": "Docs Enviados", "link_documento": "Link Documento",
+    "caminhoarquivo": "Caminho Arquivo", "caminhoarquivocnpj": "Caminho CNPJ",
+    "caminhoarquivodoc1": "Caminho Doc 1", "caminhoarquivodoc2": "Caminho Doc 2",
+    "caminhoarquivoenergia2": "Caminho Energia 2", "caminhocontratosocial": "Caminho CS",
+    "caminhocomprovante": "Caminho Comprovante", "caminhoarquivoestatutoconvencao": "Caminho Estatuto",
+    "senhapdf": "Senha PDF", "codigo": "Código", "elegibilidade": "Elegibilidade",
+    "idplanopj": "ID Plano PJ", "dtcancelado": "Data Cancelado", "data_ativo_original": "Data Ativo Original",
+    "fornecedora": "Fornecedora", "desconto_cliente": "Desconto Cliente", "dtnasc": "Data Nascimento",
+    "origem": "Origem", "cm_tipo_pagamento": "CM Tipo Pagamento", "status_financeiro": "Status Financeiro",
+    "logindistribuidora": "Login Distribuidora", "senhadistribuidora": "Senha Distribuidora",
+    "nacionalidade": "Nacionalidade", "profissao": "Profissão", "estadocivil": "Estado Civil",
+    "obs_compartilhada": "Obs Compartilhada", "linkassinatura1": "Link Assinatura 1",
+    "nome_cliente_rateio": "Nome Cliente (RZK)", "devolutiva": "Devolutiva", "licenciado": "Licenciado",
+    "chave_contrato": "Chave Contrato", "data_ativo_formatado": "Data Ativo",
+    # Licenciados
+    "cpf": "CPF Licenciado", "uf": "UF Licenciado", "quantidade_clientes_ativos": "Qtd Clientes Ativos",
+    "data_ativo_formatada": "Data Ativo", "data_graduacao_formatada": "Data Graduação",
+    "dias_para_graduacao": "Dias para Graduar",
+    # Recebíveis
+    "idrcb": "Idrcb", "codigo_cliente": "Codigo Cliente", "cliente_nome": "Cliente",
+    "valorseria": "Quanto Seria", "valorapagar": "Valor A Pagar", "valorcomcashback": "Valor Com Cashback",
+    "data_referencia": "Data Referencia", "data_vencimento": "Data Vencimento",
+    "data_pagamento": "Data Pagamento", "data_vencimento_original": "Data Vencimento Original",
+    "status_financeiro_cliente": "Status Financeiro Cliente", "id_licenciado": "ID Licenciado",
+    "nome_licenciado": "Licenciado", "celular_licenciado": "Celular Licenciado",
+    "status_calculado": "Status Pagamento", "urldemonstrativo": "Url Demonstrativo",
+    "urlboleto": "Url Boleto", "qrcode": "Qrcode Pix", "urlcontacemig": "Url Boleto Distribuidora",
+    "valor_distribuidora": "Valor Distribuidora", "codigobarra": "Codigo Barra Boleto",
+    "fornecedora_cliente": "Fornecedora Cliente", "concessionaria": "Concessionaria",
+    "cpf_cnpj_cliente": "Cpf Cliente", "nrodocumento": "Numero Documento", "idcomerc": "Idcomerc",
+    "idbomfuturo": "Idbomfuturo", "energiainjetada": "Energia Injetada",
+    "energiacompensada": "Energia Compensada", "energiaacumulada": "Energia Acumulada",
+    "energiaajuste": "Energia Ajuste", "energiafaturamento": "Energia Faturamento",
+    "qtd_rcb_cliente": "Qt de Rcb",
+    # Boletos por Cliente
+    "instalacao": "Instalação", "numero_cliente": "Nº Cliente", "cpf_cnpj": "CPF/CNPJ",
+    "dias_desde_ativacao": "Dias Ativo", "injecao": "Prazo Injeção", "atraso_na_injecao": "Atraso na Injeção",
+    "dias_em_atraso": "Dias em Atraso", "validado_sucesso": "Validado", "retorno_fornecedora": "Retorno Fornecedora",
+    "status_pro": "Status PRO", "data_graduacao_pro": "Data PRO", "quantidade_boletos": "Qtd. Boletos",
+}
+
+_ALIAS_RE = re.compile(r'\s+AS\s+("?)([\w/]+)\1\s*$', re.IGNORECASE)
+
+
+def column_key(expr: str) -> str:
+    """Nome da coluna no resultado: o alias (… AS nome) ou o nome após o último ponto."""
+    alias = _ALIAS_RE.search(expr)
+    if alias:
+        return alias.group(2)
+    return expr.strip().split('.')[-1].replace('"', '')
+
+
+class Column:
+    """
+    Coluna de um relatório: expressão SQL (com alias, se houver), expressão sem o alias
+    (`value`, usada no ORDER BY quando a coluna não é projetada), chave no resultado e
+    cabeçalho exibido.
+    """
+    __slots__ = ('expr', 'value', 'key', 'header')
+
+    def __init__(self, expr: str, header: Optional[str] = None):
+        self.expr = expr
+        self.value = _ALIAS_RE.sub('', expr).strip()
+        self.key = column_key(expr)
+        self.header = header or HEADER_MAP.get(self.key) or self.key.replace('_', ' ').title()
+
+    def __repr__(self) -> str:
+        return f"Column({self.key!r})"
+
+
+def columns(fields: Sequence[str], **headers: str) -> Tuple[Column, ...]:
+    """Cria as colunas a partir da lista de campos SQL; `headers` sobrescreve cabeçalhos por chave."""
+    return tuple(Column(f, headers.get(column_key(f))) for f in fields)
+
+
+class Filter:
+    """Filtro de relatório lido da URL (ex.: fornecedora) e a cláusula SQL correspondente."""
+    __slots__ = ('name', 'clause', 'parse')
+
+    def __init__(self, name: str, clause: str, parse: Callable[[Optional[str]], Any]):
+        self.name = name
+        self.clause = clause
+        self.parse = parse  # valor cru da URL -> valor do parâmetro (None = filtro inativo)
+
+
+def _parse_fornecedora(value: Optional[str]) -> Optional[str]:
+    value = (value or '').strip()
+    return value if value and value.lower() != 'consolidado' else None
+
+
+def _parse_date(value: Optional[str]) -> Optional[str]:
+    try:
+        return datetime.strptime((value or '').strip(), '%Y-%m-%d').date().isoformat()
+    except ValueError:
+        return None
+
+
+FORNECEDORA = Filter('fornecedora', "c.fornecedora = %s", _parse_fornecedora)
+START_DATE = Filter('start_date', "c.data_ativo >= %s", _parse_date)
+END_DATE = Filter('end_date', "c.data_ativo <= %s", _parse_date)
+
+
+# --- Busca textual (parâmetro `q`) ---
+SEARCH_MIN_LENGTH = 3  # trigramas: termos menores não usam o índice
+
+
+class SearchField:
+    """
+    Campo pesquisado pela busca do relatório: `clause` tem um único %s, que recebe o
+    padrão ILIKE ('%termo%'). `digits` pesquisa só os dígitos do termo (CPF/CNPJ,
+    digitados com ou sem pontuação). `indexes` lista os índices que atendem a
+    cláusula, como (tabela, método, expressão), criados por `flask search-indexes`.
+    """
+    __slots__ = ('label', 'clause', 'digits', 'indexes')
+
+    def __init__(self, label: str, clause: str, digits: bool = False,
+                 indexes: Sequence[Tuple[str, str, str]] = ()):
+        self.label = label
+        self.clause = clause
+        self.digits = digits
+        self.indexes = tuple(indexes)
+
+    def __repr__(self) -> str:
+        return f"SearchField({self.label!r})"
+
+
+def _trgm(table: str, expr: str) -> Tuple[str, str, str]:
+    return (table, 'gin', f"({expr}) gin_trgm_ops")
+
+
+_CPF_DIGITS = """regexp_replace({}"cpf/cnpj", '[^0-9]', '', 'g')"""
+
+# Clientes: nome, CPF/CNPJ, instalação, email e licenciado. O licenciado entra como
+# `idconsultor = ANY(ARRAY(...))`: o subselect vira um parâmetro calculado uma vez e
+# a condição usa o índice de CLIENTES.idconsultor, combinada (BitmapOr) com os
+# índices de trigramas das demais colunas.
+CLIENT_SEARCH = (
+    SearchField('Nome', "c.nome ILIKE %s", indexes=[_trgm('CLIENTES', 'nome')]),
+    SearchField('CPF/CNPJ', f"{_CPF_DIGITS.format('c.')} LIKE %s", digits=True,
+                indexes=[_trgm('CLIENTES', _CPF_DIGITS.format(''))]),
+    SearchField('Instalação', "c.numinstalacao ILIKE %s", indexes=[_trgm('CLIENTES', 'numinstalacao')]),
+    SearchField('Email', "c.email ILIKE %s", indexes=[_trgm('CLIENTES', 'email')]),
+    SearchField('Licenciado',
+                'c.idconsultor = ANY(ARRAY(SELECT idconsultor FROM public."CONSULTOR" WHERE nome ILIKE %s))',
+                indexes=[_trgm('CONSULTOR', 'nome'), ('CLIENTES', 'btree', 'idconsultor')]),
+)
+
+# Licenciados (relatórios sobre CONSULTOR com alias c)
+CONSULTOR_SEARCH = (
+    SearchField('Nome', "c.nome ILIKE %s", indexes=[_trgm('CONSULTOR', 'nome')]),
+    SearchField('CPF', "regexp_replace(c.cpf, '[^0-9]', '', 'g') LIKE %s", digits=True,
+                indexes=[_trgm('CONSULTOR', "regexp_replace(cpf, '[^0-9]', '', 'g')")]),
+    SearchField('Email', "c.email ILIKE %s", indexes=[_trgm('CONSULTOR', 'email')]),
+)
+
+
+class ReportSpec:
+    """
+    Declaração de um relatório. Relatórios SQL informam `columns`, `from_`, `joins`,
+    `where`, `group_by` e `order_by`; `key` é a expressão única e ordenável usada na
+    paginação por keyset (None = só OFFSET). `fetch`/`count`/`stream` substituem o
+    motor SQL (relatórios calculados fora do banco) e `export_queries(filters, campos)`
+    devolve as abas próprias da exportação como [(nome da aba, query, params)].
+    `tables` são as tabelas de origem (versão dos dados nos caches); `export_tables`,
+    as da exportação, quando as abas de `export_queries` leem outras tabelas.
+    `search` lista os campos da busca textual (vazio = relatório sem busca).
+    `distinct_on` deduplica no próprio SQL (SELECT DISTINCT ON, e COUNT(DISTINCT …) na
+    contagem), para que contagem, páginas e exportação concordem; quando houver keyset,
+    deve ser a própria `key`.
+    Os JOINs opcionais devem ser "para um" (não multiplicar linhas): o motor só os
+    inclui quando alguma coluna/condição usa o alias.
+    """
+
+    def __init__(self, name: str, title: str, columns: Sequence[Column], *,
+                 from_: Optional[str] = None, joins: Sequence[Tuple[str, str]] = (),
+                 where: Sequence[str] = (), group_by: Optional[str] = None, order_by: Optional[str] = None,
+                 key: Optional[str] = None, filters: Sequence[Filter] = (),
+                 search: Sequence[SearchField] = (), tables: Sequence[str] = (),
+                 cacheable: bool = True, distinct_on: Optional[str] = None,
+                 sheet_title: Optional[str] = None, filename: Optional[str] = None,
+                 column_formats: Optional[Dict[str, str]] = None, fixed_fornecedora: Optional[str] = None,
+                 fetch: Optional[Callable] = None, count: Optional[Callable] = None,
+                 stream: Optional[Callable] = None, export_queries: Optional[Callable] = None,
+                 export_tables: Sequence[str] = ()):
+        self.name = name
+        self.title = title
+        self.columns = tuple(columns)
+        self.from_ = from_
+        self.joins = tuple(joins)
+        self.where = tuple(where)
+        self.group_by = group_by
+        self.order_by = order_by
+        self.key = key
+        self.filters = tuple(filters)
+        self.search = tuple(search)
+        self.tables = tuple(tables)
+        self.cacheable = cacheable
+        self.distinct_on = distinct_on
+        self.sheet_title = sheet_title or title
+        self.filename = filename or f"Relatorio_{name}"
+        self.column_formats = column_formats
+        self.fixed_fornecedora = fixed_fornecedora
+        self.fetch = fetch
+        self.count = count
+        self.stream = stream
+        self.export_queries = export_queries
+        self.export_tables = tuple(export_tables) or self.tables
+
+    @property
+    def headers(self) -> List[str]:
+        return [c.header for c in self.columns]
+
+    @property
+    def key_column(self) -> Optional[str]:
+        """Chave da coluna de keyset no resultado (ex.: 'c.idcliente' -> 'idcliente')."""
+        return column_key(self.key) if self.key else None
+
+    @property
+    def required_columns(self) -> List[str]:
+        """Colunas sempre projetadas (chave do keyset, usada nos links Anterior/Próximo)."""
+        return [self.key_column] if self.key_column else []
+
+    def filter_names(self) -> List[str]:
+        """Parâmetros de URL aceitos pelo relatório (filtros e, se houver busca, 'q')."""
+        return [f.name for f in self.filters] + (['q'] if self.search else [])
+
+    def __repr__(self) -> str:
+        return f"ReportSpec({self.name!r})"
+
+
+REPORTS: Dict[str, ReportSpec] = {}
+
+
+def register(spec: ReportSpec) -> ReportSpec:
+    REPORTS[spec.name] = spec
+    return spec
+
+
+def get_report(name: Optional[str]) -> Optional[ReportSpec]:
+    return REPORTS.get(name or '')
+
+
+def get_headers(report_type: str) -> List[str]:
+    """Cabeçalhos do relatório, na ordem das colunas do resultado ([] se desconhecido)."""
+    spec = get_report(report_type)
+    return spec.headers if spec else []
+
+
+# --- Exportações multi-aba (Rateio): uma query por aba, sem lista de IDs ---
+def _rateio_queries(filters: Dict[str, Any], campos: List[str]) -> List[Tuple[str, str, tuple]]:
+    fornecedora = filters.get('fornecedora')
+    return [
+        ('Base Nova', *rateio_base_query('nova', campos, fornecedora)),
+        ('Base Enviada', *rateio_base_query('enviada', campos, fornecedora)),
+    ]
+
+
+def _rateio_rzk_queries(filters: Dict[str, Any], campos: List[str]) -> List[Tuple[str, str, tuple]]:
+    return [
+        ('Base Nova RZK', *rateio_base_query('nova', campos, 'RZK')),
+        ('Base Enviada RZK', *rateio_base_query('enviada', campos, 'RZK')),
+    ]
+
+
+# --- Boletos por Cliente (DataFrame com CSVs; paginação e contagem próprias) ---
+def _boletos_fetch(filters: Dict[str, Any], offset: int, limit: Optional[int]):
+    return get_boletos_por_cliente_data(offset=offset, limit=limit, fornecedora=filters.get('fornecedora'))
+
+
+def _boletos_count(filters: Dict[str, Any]) -> int:
+    return count_boletos_por_cliente(fornecedora=filters.get('fornecedora'))
+
+
+def _boletos_stream(filters: Dict[str, Any]):
+    for linha in get_boletos_por_cliente_data(limit=None, fornecedora=filters.get('fornecedora')):
+        yield linha
+
+
+# --- Relatórios ---
+_CLIENTES = 'public."CLIENTES" c'
+_JOIN_CONSULTOR = ('co', 'LEFT JOIN public."CONSULTOR" co ON co.idconsultor = c.idconsultor')
+
+register(ReportSpec(
+    'base_clientes', 'Base Clientes', columns(_get_query_fields('base_clientes')),
+    from_=_CLIENTES, joins=[_JOIN_CONSULTOR], where=[ORIGEM_CLIENTE],
+    order_by='c.idcliente', key='c.idcliente', filters=[FORNECEDORA], search=CLIENT_SEARCH,
+    tables=('CLIENTES', 'CONSULTOR'), distinct_on='c.idcliente',
+    sheet_title='Base Clientes ({fornecedora})', filename='Clientes_Base_{fornecedora}',
+))
+
+register(ReportSpec(
+    'rateio', 'Rateio (Geral)', columns(_get_query_fields('rateio')),
+    from_=_CLIENTES, joins=[_JOIN_CONSULTOR], where=[ORIGEM_CLIENTE],
+    order_by='c.idcliente', key='c.idcliente', filters=[FORNECEDORA], search=CLIENT_SEARCH,
+    tables=('CLIENTES', 'CONSULTOR'), export_tables=RATEIO_EXPORT_TABLES,
+    filename='Clientes_Rateio_{fornecedora}', export_queries=_rateio_queries,
+))
+
+register(ReportSpec(
+    'rateio_rzk', 'Rateio RZK (Especial)', columns(_get_rateio_rzk_fields()),
+    from_=_CLIENTES, joins=[_JOIN_CONSULTOR],
+    where=["c.fornecedora = 'RZK'", "c.rateio = 'S'", ORIGEM_CLIENTE],
+    order_by='c.idcliente', key='c.idcliente', search=CLIENT_SEARCH, tables=('CLIENTES', 'CONSULTOR'),
+    export_tables=RATEIO_EXPORT_TABLES, fixed_fornecedora='RZK', filename='Clientes_Rateio_RZK_MultiBase',
+    export_queries=_rateio_rzk_queries,
+))
+
+register(ReportSpec(
+    'clientes_por_licenciado', 'Clientes por Licenciado',
+    columns(["c.idconsultor", "c.nome", "c.cpf", "c.email", "c.uf",
+             "COUNT(cl.idconsultor) AS quantidade_clientes_ativos"], nome="Nome Licenciado"),
+    from_='public."CONSULTOR" c JOIN public."CLIENTES" cl ON c.idconsultor = cl.idconsultor',
+    where=["cl.data_ativo IS NOT NULL", "(cl.origem IS NULL OR cl.origem IN ('', 'WEB', 'BACKOFFICE', 'APP'))"],
+    group_by='c.idconsultor, c.nome, c.cpf, c.email, c.uf',
+    order_by='quantidade_clientes_ativos DESC, c.nome', search=CONSULTOR_SEARCH,
+    tables=('CONSULTOR', 'CLIENTES'),
+    filename='Qtd_Clientes_Licenciado',
+))
+
+register(ReportSpec(
+    'boletos_por_cliente', 'Boletos por Cliente', columns(final_columns_order),
+    # Um cliente por linha já garantido no SQL (DISTINCT ON em BaseQuery) e nos CSVs
+    filters=[FORNECEDORA], tables=BOLETOS_TABLES,
+    sheet_title='Boletos Cliente ({fornecedora})', filename='Qtd_Boletos_Cliente_{fornecedora}',
+    fetch=_boletos_fetch, count=_boletos_count, stream=_boletos_stream,
+))
+
+register(ReportSpec(
+    'graduacao_licenciado', 'PRO - Graduação',
+    columns(["c.idconsultor", "c.nome", "c.celular", "c.data_ativo AS data_ativo_formatada",
+             "cp.dtgraduacao AS data_graduacao_formatada",
+             "(cp.dtgraduacao - c.data_ativo) AS dias_para_graduacao"], nome="Nome Licenciado"),
+    from_='public."CONSULTOR" c JOIN public."CONTROLE_PRO" cp ON c.idconsultor = cp.idconsultor',
+    where=["c.data_ativo IS NOT NULL", "cp.dtgraduacao IS NOT NULL", "cp.dtgraduacao >= c.data_ativo"],
+    order_by='dias_para_graduacao ASC', filters=[START_DATE, END_DATE], search=CONSULTOR_SEARCH,
+    # Tabelas pequenas e datas livres na URL: a contagem não compensa o cache
+    tables=('CONSULTOR', 'CONTROLE_PRO'), cacheable=False, filename='PRO_Graduacao',
+))
+
+register(ReportSpec(
+    'recebiveis_clientes', 'Recebíveis Clientes', columns(_get_recebiveis_clientes_fields()),
+    from_='public."RCB_CLIENTES" rcb',
+    joins=[('c', 'LEFT JOIN public."CLIENTES" c ON rcb.numinstalacao = c.numinstalacao'),
+           ('co', 'LEFT JOIN public."CONSULTOR" co ON c.idconsultor = co.idconsultor')],
+    where=[ORIGEM_CLIENTE], order_by='rcb.idrcb',
+    # Sem keyset: qtd_rcb_cliente é uma window function sobre todo o resultado filtrado
+    filters=[FORNECEDORA], search=CLIENT_SEARCH, tables=('RCB_CLIENTES', 'CLIENTES', 'CONSULTOR'),
+    sheet_title='Recebíveis ({fornecedora})', filename='Recebiveis_Clientes_{fornecedora}',
+    column_formats={'Data Referencia': EXCEL_MONTH_FORMAT},
+))
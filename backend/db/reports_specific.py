@@ -1,7 +1,8 @@
 # backend/db/reports_specific.py
 import logging
 from typing import List, Tuple, Optional
-from .executor import execute_query # Import local
+from .connection import ROUTE_REPLICA
+from .executor import execute_query, execute_query_one # Import local
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +30,7 @@ def get_clientes_por_licenciado_data(offset: int = 0, limit: Optional[int] = Non
     
     actual_params_tuple = tuple(final_params_list)
     logger.debug(f"REPORTS_SPECIFIC - Query get_clientes_por_licenciado_data: [{paginated_query}], Params (tupla): [{actual_params_tuple}]")
-    try: return execute_query(paginated_query, actual_params_tuple) or []
+    try: return execute_query(paginated_query, actual_params_tuple, route=ROUTE_REPLICA) or []
     except Exception as e: logger.error(f"Erro get_clientes_por_licenciado_data: {e}", exc_info=True); return []
 
 def count_clientes_por_licenciado() -> int:
@@ -40,7 +41,7 @@ def count_clientes_por_licenciado() -> int:
         WHERE cl.data_ativo IS NOT NULL AND (cl.origem IS NULL OR cl.origem IN ('', 'WEB', 'BACKOFFICE', 'APP')); """
     logger.debug(f"REPORTS_SPECIFIC - Query count_clientes_por_licenciado: [{count_query_sql}], Params (tupla): [()]")
     try:
-        result = execute_query(count_query_sql, (), fetch_one=True)
+        result = execute_query_one(count_query_sql, (), route=ROUTE_REPLICA)
         # --- CORREÇÃO DE INDENTAÇÃO APLICADA AQUI ---
         return result[0] if result and result[0] is not None else 0
     except Exception as e:
@@ -53,7 +54,7 @@ def get_boletos_por_cliente_data(offset: int = 0, limit: Optional[int] = None, f
     base_query = """
         SELECT c.idcliente, c.nome, c.numinstalacao, c.celular, c.cidade,
                CASE WHEN c.concessionaria IS NULL OR c.concessionaria = '' THEN '' ELSE (c.uf || '-' || c.concessionaria) END AS regiao,
-               c.fornecedora, TO_CHAR(c.data_ativo, 'DD/MM/YYYY') AS data_ativo_formatado,
+               c.fornecedora, c.data_ativo AS data_ativo_formatado,
                CASE
                    WHEN c.data_ativo IS NOT NULL THEN EXTRACT(DAY FROM (NOW() - c.data_ativo))::INTEGER
                    ELSE NULL
@@ -99,7 +100,7 @@ def get_boletos_por_cliente_data(offset: int = 0, limit: Optional[int] = None, f
     # Log para verificar a query e os parâmetros finais
     logger.debug(f"REPORTS_SPECIFIC - Query get_boletos_por_cliente_data: [{paginated_query}], Params (tupla): [{actual_params_tuple}]")
     
-    try: return execute_query(paginated_query, actual_params_tuple) or []
+    try: return execute_query(paginated_query, actual_params_tuple, route=ROUTE_REPLICA) or []
     except Exception as e: logger.error(f"Erro get_boletos_por_cliente_data: {e}", exc_info=True); return []
 
 def count_boletos_por_cliente(fornecedora: Optional[str] = None) -> int:
@@ -126,74 +127,16 @@ def count_boletos_por_cliente(fornecedora: Optional[str] = None) -> int:
     logger.debug(f"REPORTS_SPECIFIC - Query count_boletos_por_cliente: [{count_query_sql}], Params (tupla): [{actual_params_tuple}]")
 
     try: 
-        result = execute_query(count_query_sql, actual_params_tuple, fetch_one=True)
+        result = execute_query_one(count_query_sql, actual_params_tuple, route=ROUTE_REPLICA)
         return result[0] if result and result[0] is not None else 0
     except Exception as e: 
         logger.error(f"Erro count_boletos_por_cliente: {e}", exc_info=True)
         return 0
 
 # --- FUNÇÕES PARA RATEIO RZK --- (Manter código original, mas aplicar .strip() e .replace("  ", " ") na construção final da query se usar f-strings)
-def get_rateio_rzk_base_nova_ids() -> List[int]:
-    """Busca IDs para 'Base Nova' do Rateio RZK."""
-    query_base = """ SELECT DISTINCT cc.idcliente FROM public."CLIENTES_CONTRATOS" cc
-        INNER JOIN public."CLIENTES_CONTRATOS_SIGNER" ccs ON cc.idcliente_contrato = ccs.idcliente_contrato
-        INNER JOIN public."CLIENTES" c ON cc.idcliente = c.idcliente """
-    group_by = " GROUP BY cc.idcliente_contrato, cc.idcliente HAVING bool_and(ccs.signature_at IS NOT NULL) "
-    where_clauses = [
-        "c.fornecedora = 'RZK'", "cc.type_document = 'procuracao_igreen'", "upper(cc.status) = 'ATIVO'",
-        "c.data_ativo IS NOT NULL", "c.status IS NULL", "c.validadosucesso = 'S'",
-        "c.rateio = 'N'", " (c.origem IS NULL OR c.origem IN ('', 'WEB', 'BACKOFFICE', 'APP')) ",
-        " NOT EXISTS ( SELECT 1 FROM public.\"DEVOLUTIVAS\" d WHERE d.idcliente = c.idcliente ) "
-    ]
-    full_query = f"{query_base.strip()} WHERE {' AND '.join(where_clauses)} {group_by.strip()};".replace("  ", " ").strip()
-    logger.debug(f"REPORTS_SPECIFIC - Query get_rateio_rzk_base_nova_ids: [{full_query}], Params (tupla): [()]")
-    try: 
-        results = execute_query(full_query, ()) # Passar tupla vazia
-        return [r[0] for r in results] if results else []
-    except Exception as e: 
-        logger.error(f"Erro get_rateio_rzk_base_nova_ids: {e}")
-        return []
-
-def get_rateio_rzk_base_enviada_ids() -> List[int]:
-    """Busca IDs para 'Base Enviada' do Rateio RZK."""
-    query_base = 'SELECT c.idcliente FROM public."CLIENTES" c'
-    where_clauses = [ "c.fornecedora = 'RZK'", "c.rateio = 'S'", " (c.origem IS NULL OR c.origem IN ('', 'WEB', 'BACKOFFICE', 'APP')) " ]
-    full_query = f"{query_base.strip()} WHERE {' AND '.join(where_clauses)};".replace("  ", " ").strip()
-    logger.debug(f"REPORTS_SPECIFIC - Query get_rateio_rzk_base_enviada_ids: [{full_query}], Params (tupla): [()]")
-    try: 
-        results = execute_query(full_query, ()) # Passar tupla vazia
-        return [r[0] for r in results] if results else []
-    except Exception as e: 
-        logger.error(f"Erro get_rateio_rzk_base_enviada_ids: {e}")
-        return []
-
 def _get_rateio_rzk_fields() -> List[str]:
     """Retorna a lista de campos SQL EXATOS para Rateio RZK."""
-    return [ "c.idcliente", "c.nome", "c.numinstalacao", "c.celular", "c.cidade", "CASE WHEN c.concessionaria IS NULL OR c.concessionaria = '' THEN c.uf ELSE (c.uf || '-' || c.concessionaria) END AS regiao", "TO_CHAR(c.data_ativo, 'DD/MM/YYYY') AS data_ativo_formatado", "c.consumomedio", "c.status AS devolutiva", "TO_CHAR(c.dtcad, 'DD/MM/YYYY') AS dtcad", "c.\"cpf/cnpj\"", "c.numcliente", "c.email", "c.rg", "c.emissor", "co.nome AS licenciado", "c.cep", "c.endereco", "c.numero", "c.bairro", "c.complemento", "c.cnpj", "c.razao", "c.fantasia", "c.ufconsumo", "c.classificacao", "c.keycontrato AS chave_contrato", "c.link_documento", "c.caminhoarquivo", "c.caminhoarquivocnpj", "c.caminhoarquivodoc1", "c.caminhoarquivodoc2", "c.caminhoarquivoenergia2", "c.caminhocontratosocial", "c.caminhocomprovante", "c.caminhoarquivoestatutoconvencao", "c.senhapdf", "c.fornecedora", "c.desconto_cliente", "TO_CHAR(c.dtnasc, 'DD/MM/YYYY') AS dtnasc", "c.logindistribuidora", "c.senhadistribuidora", "c.nome AS nome_cliente_rateio", "c.nacionalidade", "c.profissao", "c.estadocivil" ]
-
-def get_rateio_rzk_client_details_by_ids(client_ids: List[int], batch_size: int = 1000) -> List[tuple]:
-    """Busca detalhes completos para Rateio RZK por lista de IDs."""
-    if not client_ids: return []
-    all_details = []
-    try:
-        campos = _get_rateio_rzk_fields()
-        if not campos: logger.error("Falha campos RZK details"); return []
-        select_sql = f"SELECT {', '.join(campos)}"
-        from_sql = 'FROM public."CLIENTES" c'
-        join_sql = ' LEFT JOIN public."CONSULTOR" co ON co.idconsultor = c.idconsultor'
-        where_sql = "WHERE c.idcliente = ANY(%s) AND (c.origem IS NULL OR c.origem IN ('', 'WEB', 'BACKOFFICE', 'APP'))" # Placeholder para ANY
-        order_sql = "ORDER BY c.idcliente"
-        query = f"{select_sql.strip()} {from_sql.strip()}{join_sql.strip()} {where_sql.strip()} {order_sql.strip()};".replace("  ", " ").strip()
-        for i in range(0, len(client_ids), batch_size):
-            batch_ids = client_ids[i:i + batch_size]
-            actual_params_tuple = (batch_ids,) # O parâmetro para ANY(%s) é uma lista/tupla
-            logger.debug(f"REPORTS_SPECIFIC - Query get_rateio_rzk_client_details_by_ids (batch): [{query}], Params (tupla): [{actual_params_tuple}]")
-            batch_results = execute_query(query, actual_params_tuple)
-            if batch_results: all_details.extend(batch_results)
-        return all_details
-    except Exception as e: 
-        logger.error(f"Erro get_rateio_rzk_client_details_by_ids: {e}", exc_info=True)
-        return []
+    return [ "c.idcliente", "c.nome", "c.numinstalacao", "c.celular", "c.cidade", "CASE WHEN c.concessionaria IS NULL OR c.concessionaria = '' THEN c.uf ELSE (c.uf || '-' || c.concessionaria) END AS regiao", "c.data_ativo AS data_ativo_formatado", "c.consumomedio", "c.status AS devolutiva", "c.dtcad", "c.\"cpf/cnpj\"", "c.numcliente", "c.email", "c.rg", "c.emissor", "co.nome AS licenciado", "c.cep", "c.endereco", "c.numero", "c.bairro", "c.complemento", "c.cnpj", "c.razao", "c.fantasia", "c.ufconsumo", "c.classificacao", "c.keycontrato AS chave_contrato", "c.link_documento", "c.caminhoarquivo", "c.caminhoarquivocnpj", "c.caminhoarquivodoc1", "c.caminhoarquivodoc2", "c.caminhoarquivoenergia2", "c.caminhocontratosocial", "c.caminhocomprovante", "c.caminhoarquivoestatutoconvencao", "c.senhapdf", "c.fornecedora", "c.desconto_cliente", "c.dtnasc", "c.logindistribuidora", "c.senhadistribuidora", "c.nome AS nome_cliente_rateio", "c.nacionalidade", "c.profissao", "c.estadocivil" ]
 
 def get_rateio_rzk_data(offset: int = 0, limit: Optional[int] = None) -> List[tuple]:
     """Busca dados paginados para display Rateio RZK (Base Enviada)."""
@@ -221,7 +164,7 @@ def get_rateio_rzk_data(offset: int = 0, limit: Optional[int] = None) -> List[tu
     actual_params_tuple = tuple(final_params_list)
     logger.debug(f"REPORTS_SPECIFIC - Query get_rateio_rzk_data: [{paginated_query}], Params (tupla): [{actual_params_tuple}]")
     try: 
-        return execute_query(paginated_query, actual_params_tuple) or []
+        return execute_query(paginated_query, actual_params_tuple, route=ROUTE_REPLICA) or []
     except Exception as e: 
         logger.error(f"Erro get_rateio_rzk_data (display): {e}", exc_info=True)
         return []
@@ -233,7 +176,7 @@ def count_rateio_rzk() -> int:
     count_query_sql = f'SELECT COUNT(c.idcliente) FROM public."CLIENTES" c {where_sql_part.strip()};'.replace("  ", " ").strip()
     logger.debug(f"REPORTS_SPECIFIC - Query count_rateio_rzk: [{count_query_sql}], Params (tupla): [()]")
     try: 
-        result = execute_query(count_query_sql, (), fetch_one=True) # Passar tupla vazia
+        result = execute_query_one(count_query_sql, (), route=ROUTE_REPLICA) # Passar tupla vazia
         return result[0] if result and result[0] is not None else 0
     except Exception as e: 
         logger.error(f"Erro count_rateio_rzk (display): {e}", exc_info=True)
@@ -246,10 +189,10 @@ def _get_recebiveis_clientes_fields() -> List[str]:
     return [
         "rcb.idrcb", "c.idcliente AS codigo_cliente", "c.nome AS cliente_nome", "rcb.numinstalacao",
         "rcb.valorseria", "rcb.valorapagar", "rcb.valorcomcashback",
-        "TO_CHAR(rcb.mesreferencia, 'MM/YYYY') AS data_referencia",
-        "TO_CHAR(rcb.dtvencimento, 'DD/MM/YYYY') AS data_vencimento",
-        "TO_CHAR(rcb.dtpagamento, 'DD/MM/YYYY') AS data_pagamento",
-        "TO_CHAR(rcb.cdatavencoriginal, 'DD/MM/YYYY') AS data_vencimento_original",
+        "rcb.mesreferencia AS data_referencia",
+        "rcb.dtvencimento AS data_vencimento",
+        "rcb.dtpagamento AS data_pagamento",
+        "rcb.cdatavencoriginal AS data_vencimento_original",
         "c.celular", "c.email", "c.status_financeiro AS status_financeiro_cliente", "c.numcliente",
         "c.idconsultor AS id_licenciado", "co.nome AS nome_licenciado", "co.celular AS celular_licenciado",
         """CASE
@@ -302,7 +245,7 @@ def get_recebiveis_clientes_data(offset: int = 0, limit: Optional[int] = None, f
     actual_params_tuple = tuple(final_params_list)
     logger.debug(f"REPORTS_SPECIFIC - Query get_recebiveis_clientes_data: [{paginated_query}], Params (tupla): [{actual_params_tuple}]")
     try: 
-        return execute_query(paginated_query, actual_params_tuple) or []
+        return execute_query(paginated_query, actual_params_tuple, route=ROUTE_REPLICA) or []
     except Exception as e: 
         logger.error(f"Erro get_recebiveis_clientes_data: {e}", exc_info=True)
         return []
@@ -326,7 +269,7 @@ def count_recebiveis_clientes(fornecedora: Optional[str] = None) -> int:
     actual_params_tuple = tuple(params_list)
     logger.debug(f"REPORTS_SPECIFIC - Query count_recebiveis_clientes: [{count_query_sql}], Params (tupla): [{actual_params_tuple}]")
     try:
-        result = execute_query(count_query_sql, actual_params_tuple, fetch_one=True)
+        result = execute_query_one(count_query_sql, actual_params_tuple, route=ROUTE_REPLICA)
         return result[0] if result and result[0] is not None else 0
     except Exception as e: 
         logger.error(f"Erro count_recebiveis_clientes: {e}", exc_info=True)
@@ -348,8 +291,8 @@ def get_graduacao_licenciado_data(
     base_query = """
         SELECT
             c.idconsultor, c.nome, c.celular,
-            TO_CHAR(c.data_ativo, 'DD/MM/YYYY') AS data_ativo_formatada,
-            TO_CHAR(cp.dtgraduacao, 'DD/MM/YYYY') AS data_graduacao_formatada,
+            c.data_ativo AS data_ativo_formatada,
+            cp.dtgraduacao AS data_graduacao_formatada,
             (cp.dtgraduacao - c.data_ativo) AS dias_para_graduacao
         FROM public."CONSULTOR" c
         JOIN public."CONTROLE_PRO" cp ON c.idconsultor = cp.idconsultor
@@ -383,7 +326,7 @@ def get_graduacao_licenciado_data(
     
     logger.debug(f"REPORTS_SPECIFIC - Query get_graduacao_licenciado_data: [{query}], Params: {params}")
     try:
-        return execute_query(query, tuple(params)) or []
+        return execute_query(query, tuple(params), route=ROUTE_REPLICA) or []
     except Exception as e:
         logger.error(f"Erro em get_graduacao_licenciado_data: {e}", exc_info=True)
         return []
@@ -417,7 +360,7 @@ def count_graduacao_licenciado(start_date: Optional[str] = None, end_date: Optio
 
     logger.debug(f"REPORTS_SPECIFIC - Query count_graduacao_licenciado: [{query}], Params: {params}")
     try:
-        result = execute_query(query, tuple(params), fetch_one=True)
+        result = execute_query_one(query, tuple(params), route=ROUTE_REPLICA)
         return result[0] if result and result[0] is not None else 0
     except Exception as e:
         logger.error(f"Erro em count_graduacao_licenciado: {e}", exc_info=True)
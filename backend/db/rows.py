@@ -0,0 +1,86 @@
+# backend/db/rows.py
+"""
+Linha compacta de resultado de query (alternativa ao RealDictRow).
+
+Cada `Row` guarda apenas a tupla de valores retornada pelo psycopg2 e uma
+referência ao mapa {nome_coluna: índice}, que é criado UMA vez por resultado e
+compartilhado por todas as linhas. Com 70+ colunas (ex.: 'base_clientes'), isso
+evita um dicionário inteiro por linha nas páginas, exportações e APIs.
+
+O acesso segue o DictRow do psycopg2: row['coluna'], row[0], row.get('coluna'),
+keys()/values()/items(); a iteração percorre os VALORES (como uma tupla).
+"""
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+
+class Row:
+    """Linha de resultado apoiada numa tupla, com acesso por nome ou por posição."""
+    __slots__ = ('_index', '_values')
+
+    def __init__(self, index: Dict[str, int], values: Tuple[Any, ...]):
+        self._index = index
+        self._values = values
+
+    # --- Acesso por nome/posição ---
+    def __getitem__(self, key):
+        if isinstance(key, (int, slice)):
+            return self._values[key]
+        return self._values[self._index[key]]
+
+    def get(self, key, default=None):
+        pos = self._index.get(key)
+        return default if pos is None else self._values[pos]
+
+    def __contains__(self, key) -> bool:
+        return key in self._index
+
+    # --- Interface de mapeamento (dict(row), **row, jsonify) ---
+    def keys(self):
+        return self._index.keys()
+
+    def values(self) -> Tuple[Any, ...]:
+        return self._values
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return zip(self._index, self._values)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(zip(self._index, self._values))
+
+    # --- Comportamento de sequência ---
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Row):
+            return self._values == other._values and list(self._index) == list(other._index)
+        if isinstance(other, dict):
+            return self.as_dict() == other
+        if isinstance(other, tuple):
+            return self._values == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __getstate__(self):
+        return self._index, self._values
+
+    def __setstate__(self, state):
+        self._index, self._values = state
+
+    def __repr__(self) -> str:
+        return f"Row({self.as_dict()!r})"
+
+
+def build_index(description: Sequence) -> Dict[str, int]:
+    """Cria o mapa {nome_coluna: posição} a partir de cursor.description."""
+    return {col.name if hasattr(col, 'name') else col[0]: pos for pos, col in enumerate(description or [])}
+
+
+def make_rows(description: Sequence, tuples: List[Tuple[Any, ...]]) -> List[Row]:
+    """Converte as tuplas de um resultado em `Row`s que compartilham o mesmo mapa de colunas."""
+    index = build_index(description)
+    return [Row(index, values) for values in tuples]
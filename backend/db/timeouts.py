@@ -0,0 +1,310 @@
+# backend/db/timeouts.py
+"""
+Orçamento de tempo das queries e cancelamento quando o cliente desiste.
+
+* Cada requisição recebe uma classe de query (QUERY_CLASSES): as rotas /api são
+  'interactive', as páginas de relatório 'report' e as rotas marcadas com
+  @query_class('export') 'export'. O executor aplica `SET LOCAL statement_timeout`
+  conforme DB_STATEMENT_TIMEOUTS; uma query pode pedir uma classe própria
+  (ex.: 'analytics' para o DataFrame completo de boletos), e vale o maior orçamento.
+* Um thread de vigia verifica, a cada DB_DISCONNECT_POLL_INTERVAL segundos, o
+  socket das requisições com query em andamento; se o cliente fechou a conexão
+  (aba fechada, download cancelado), chama `connection.cancel()` e a conexão volta
+  ao pool na hora, em vez de esperar o PostgreSQL terminar.
+* O executor continua devolvendo o valor padrão ([]/None) numa query interrompida,
+  mas a interrupção fica registrada na requisição: as rotas /api respondem 504 com
+  um erro estruturado, a exportação volta à página com uma mensagem, e os caches
+  versionados não guardam o resultado incompleto. Os demais erros de banco que o
+  executor engole também são contados (record_failure), pelo mesmo motivo.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Optional
+import psycopg2
+import psycopg2.errors
+from flask import flash, g, has_app_context, current_app, jsonify, redirect, request, url_for
+
+logger = logging.getLogger(__name__)
+
+QUERY_CLASSES = ('interactive', 'report', 'export', 'analytics')
+DEFAULT_TIMEOUTS_MS = {'interactive': 15000, 'report': 60000, 'export': 110000, 'analytics': 60000}
+
+# Classe padrão por blueprint (as demais rotas usam 'interactive')
+BLUEPRINT_CLASSES = {'api_bp': 'interactive', 'reports_bp': 'report'}
+
+
+class QueryInterrupted(Exception):
+    """Query interrompida pelo orçamento de tempo ou pelo cancelamento."""
+
+
+class QueryTimeoutError(QueryInterrupted):
+    def __init__(self, query_class: Optional[str], timeout_ms: int):
+        self.query_class = query_class
+        self.timeout_ms = timeout_ms
+        super().__init__(f"Query excedeu o limite de {timeout_ms / 1000:.0f} s (classe '{query_class}').")
+
+
+class QueryCancelledError(QueryInterrupted):
+    def __init__(self, motivo: str = "o cliente encerrou a conexão"):
+        super().__init__(f"Query cancelada: {motivo}.")
+
+
+class QueryContext:
+    """Estado das queries de uma requisição (compartilhado com os threads de db.parallel)."""
+
+    def __init__(self, query_class: str, client_socket=None):
+        self.query_class = query_class
+        self.client_socket = client_socket
+        self.cancelled = False
+        self.interruptions = 0
+        self.failures = 0
+        self.timeout: Optional[QueryTimeoutError] = None
+        self._active = set()
+        self._lock = threading.Lock()
+
+    def register(self, conn) -> None:
+        with self._lock:
+            if self.cancelled:
+                raise QueryCancelledError()
+            self._active.add(conn)
+
+    def unregister(self, conn) -> None:
+        # Chamado por `guard` antes do putconn: depois daqui, cancel() não toca mais na conexão
+        with self._lock:
+            self._active.discard(conn)
+
+    def has_active(self) -> bool:
+        return bool(self._active)
+
+    def cancel(self) -> int:
+        """
+        Cancela as queries em andamento (e as próximas) desta requisição. O cancel() roda
+        sob a trava: uma conexão só volta ao pool depois de unregister (mesma trava, no
+        fim de `guard`), então nunca se cancela a query de outra requisição que a pegou.
+        """
+        with self._lock:
+            self.cancelled = True
+            for conn in self._active:
+                try:
+                    conn.cancel()
+                except psycopg2.Error as e:
+                    logger.warning(f"Falha ao cancelar query: {e}")
+            return len(self._active)
+
+    def record(self, error: QueryInterrupted) -> None:
+        with self._lock:
+            self.interruptions += 1
+            if isinstance(error, QueryTimeoutError) and self.timeout is None:
+                self.timeout = error
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+
+
+# --- Contexto da requisição ---
+def current_context() -> Optional[QueryContext]:
+    return g.get('query_context') if has_app_context() else None
+
+
+def bind(context: Optional[QueryContext]) -> None:
+    """Associa o contexto ao app context atual (threads de db.parallel)."""
+    if context is not None:
+        g.query_context = context
+
+
+def interruption_count() -> int:
+    context = current_context()
+    return context.interruptions if context is not None else 0
+
+
+# Falhas fora de requisição (CLI, threads de fundo): contador do processo. Uma falha
+# de outro thread só faz um cache deixar de gravar um resultado, o que é seguro.
+_process_failures = 0
+_process_failures_lock = threading.Lock()
+
+
+def record_failure() -> None:
+    """Registra um erro de banco engolido pelo executor (resultado padrão devolvido)."""
+    global _process_failures
+    context = current_context()
+    if context is not None:
+        context.record_failure()
+        return
+    with _process_failures_lock:
+        _process_failures += 1
+
+
+def failure_count() -> int:
+    """Interrupções + erros de banco registrados até agora (requisição ou, sem ela, processo)."""
+    context = current_context()
+    if context is not None:
+        return context.interruptions + context.failures
+    return _process_failures
+
+
+def timeout_ms(query_class: Optional[str]) -> int:
+    if query_class is None or not has_app_context():
+        return 0
+    timeouts = current_app.config.get('DB_STATEMENT_TIMEOUTS') or DEFAULT_TIMEOUTS_MS
+    return int(timeouts.get(query_class, 0) or 0)
+
+
+@contextmanager
+def guard(conn, cursor, query_class: Optional[str] = None):
+    """
+    Envolve a execução de uma query no executor: aplica o statement_timeout da classe
+    (a maior entre a da requisição e a pedida), registra a conexão para cancelamento e
+    converte QueryCanceled em QueryTimeoutError / QueryCancelledError.
+    """
+    context = current_context()
+    classes = [c for c in (context.query_class if context else None, query_class) if c]
+    efetiva = max(classes, key=timeout_ms) if classes else None
+    limite = timeout_ms(efetiva)
+    if context is not None:
+        context.register(conn)
+    try:
+        if limite:
+            # SET LOCAL vale até o fim da transação (o pool faz rollback no putconn)
+            cursor.execute("SET LOCAL statement_timeout = %s", (limite,))
+        yield
+    except psycopg2.errors.QueryCanceled as e:
+        if context is not None and context.cancelled:
+            erro = QueryCancelledError()
+        elif limite:
+            erro = QueryTimeoutError(efetiva, limite)
+        else:
+            erro = QueryCancelledError("pg_cancel_backend ou desligamento do servidor")
+        if context is not None:
+            context.record(erro)
+        raise erro from e
+    finally:
+        if context is not None:
+            context.unregister(conn)
+
+
+def query_class(name: str):
+    """Decorator de rota: define a classe de query da requisição (ex.: 'export')."""
+    if name not in QUERY_CLASSES:
+        raise ValueError(f"Classe de query desconhecida: {name!r}")
+
+    def decorator(view):
+        view.query_class = name
+        return view
+    return decorator
+
+
+# --- Vigia de desconexão ---
+def client_disconnected(sock) -> bool:
+    """True se o cliente fechou a conexão (leitura sem consumir, não bloqueante)."""
+    try:
+        return sock.recv(1, socket.MSG_PEEK | getattr(socket, 'MSG_DONTWAIT', 0)) == b''
+    except (BlockingIOError, InterruptedError):
+        return False  # nada a ler: conexão aberta
+    except (ValueError, NotImplementedError, TypeError, AttributeError):
+        return False  # socket TLS ou sem suporte: não dá para saber
+    except OSError:
+        return True   # ECONNRESET e afins
+
+
+class DisconnectWatcher:
+    """Thread que cancela as queries das requisições cujo cliente desconectou."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._contexts = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def watch(self, context: QueryContext) -> None:
+        with self._lock:
+            self._contexts.add(context)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='query-disconnect-watcher', daemon=True)
+                self._thread.start()
+
+    def forget(self, context: QueryContext) -> None:
+        with self._lock:
+            self._contexts.discard(context)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                contexts = [c for c in self._contexts if c.has_active() and not c.cancelled]
+            for context in contexts:
+                if client_disconnected(context.client_socket):
+                    canceladas = context.cancel()
+                    logger.warning(f"Cliente desconectou; {canceladas} query(s) cancelada(s) (classe '{context.query_class}').")
+
+
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+def _get_watcher(app) -> DisconnectWatcher:
+    # Um vigia por processo (threads não sobrevivem ao fork; o da instância herdada é ignorado)
+    key = (id(app), os.getpid())
+    with _watchers_lock:
+        watcher = _watchers.get(key)
+        if watcher is None:
+            watcher = DisconnectWatcher(app.config.get('DB_DISCONNECT_POLL_INTERVAL', 0.5))
+            _watchers[key] = watcher
+        return watcher
+
+
+# --- Integração com o Flask ---
+def _request_class() -> str:
+    view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+    explicit = getattr(view, 'query_class', None)
+    if explicit:
+        return explicit
+    return BLUEPRINT_CLASSES.get(request.blueprint, 'interactive')
+
+
+def _start_request() -> None:
+    sock = request.environ.get('gunicorn.socket') or request.environ.get('werkzeug.socket')
+    context = QueryContext(_request_class(), sock)
+    g.query_context = context
+    if sock is not None and current_app.config.get('DB_CANCEL_ON_DISCONNECT', True):
+        _get_watcher(current_app._get_current_object()).watch(context)
+
+
+def _end_request(exception=None) -> None:
+    context = g.pop('query_context', None)
+    if context is not None and context.client_socket is not None:
+        _get_watcher(current_app._get_current_object()).forget(context)
+
+
+def _timeout_response(response):
+    """Troca a resposta por um erro estruturado se alguma query da requisição estourou o tempo."""
+    context = current_context()
+    if context is None or context.timeout is None:
+        return response
+    erro = context.timeout
+    if request.blueprint == 'api_bp':
+        response = jsonify({
+            "error": "A consulta excedeu o tempo limite. Tente um filtro mais restrito.",
+            "code": "query_timeout",
+            "query_class": erro.query_class,
+            "timeout_ms": erro.timeout_ms,
+        })
+        response.status_code = 504
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    if context.query_class == 'export':
+        flash(f"A exportação excedeu o tempo limite ({erro.timeout_ms / 1000:.0f} s). "
+              "Tente filtrar por fornecedora.", "error")
+        return redirect(url_for('reports_bp.relatorios', **request.args))
+    return response
+
+
+def init_app(app) -> None:
+    app.before_request(_start_request)
+    app.after_request(_timeout_response)
+    app.teardown_request(_end_request)
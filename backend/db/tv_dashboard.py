@@ -1,9 +1,16 @@
 # backend/db/tv_dashboard.py
 import logging
-from .executor import execute_query, execute_query_one
+# Agregações leem da réplica analítica (DuckDB) quando ligada; senão, do PostgreSQL
+from .analytics_replica import execute_analytics_query, execute_analytics_query_one
+from . import parallel
+from .data_version import versioned_cache
 
 logger = logging.getLogger(__name__)
 
+# Tabelas (e views) lidas pelo dashboard da TV
+TV_TABLES = ('V_CUSTOMER', 'CLIENTES', 'CONSULTOR', 'MV_DEVOLUTIVAS')
+
+@versioned_cache(*TV_TABLES, maxsize=1)
 def get_tv_dashboard_data():
     """
     Busca todos os dados necessários para o dashboard da TV.
@@ -33,7 +40,7 @@ def get_tv_dashboard_data():
                   "data ativo" BETWEEN DATE_TRUNC('month', CURRENT_DATE - INTERVAL '1 month') AND (CURRENT_DATE - INTERVAL '1 month')
               ) AS "contagem_mes_anterior";
         """
-        ativacoes = execute_query_one(query_ativacoes)
+        ativacoes = parallel.submit(execute_analytics_query_one, query_ativacoes)
         data['ativacoes'] = ativacoes
 
         # 2. Total de kWh
@@ -56,7 +63,7 @@ def get_tv_dashboard_data():
                   "data ativo" BETWEEN DATE_TRUNC('month', CURRENT_DATE - INTERVAL '1 month') AND (CURRENT_DATE - INTERVAL '1 month')
               ) AS "soma_consumo_mes_anterior";
         """
-        kwh = execute_query_one(query_kwh)
+        kwh = parallel.submit(execute_analytics_query_one, query_kwh)
         data['kwh'] = kwh
 
                 # --- NOVO: Cadastros, Validados e Cancelados ---
@@ -113,7 +120,7 @@ def get_tv_dashboard_data():
                   DATE_TRUNC('month', "data cancelamento") = DATE_TRUNC('month', CURRENT_DATE)
               ) AS "cancelados_soma_consumo";
         """
-        cadastros = execute_query_one(query_cadastros)
+        cadastros = parallel.submit(execute_analytics_query_one, query_cadastros)
 
         # Query para "Backlog - A Validar"
         query_backlog_a_validar = """
@@ -130,7 +137,7 @@ def get_tv_dashboard_data():
                 AND c.validadosucesso = 'N'
                 AND (c.fornecedora IS NOT NULL OR c.fornecedora <> '');
         """
-        backlog_a_validar = execute_query_one(query_backlog_a_validar)
+        backlog_a_validar = parallel.submit(execute_analytics_query_one, query_backlog_a_validar)
 
         # Query para "Mês Atual - A Validar"
         query_mes_atual_a_validar = """
@@ -147,26 +154,8 @@ def get_tv_dashboard_data():
                 AND c.validadosucesso = 'N'
                 AND (c.fornecedora IS NOT NULL OR c.fornecedora <> '');
         """
-        mes_atual_a_validar = execute_query_one(query_mes_atual_a_validar)
+        mes_atual_a_validar = parallel.submit(execute_analytics_query_one, query_mes_atual_a_validar)
         
-        if cadastros:
-            # Converte para dict para poder adicionar novas chaves
-            cadastros = dict(cadastros)
-            
-            if backlog_a_validar:
-                cadastros['backlog_a_validar_quantidade'] = backlog_a_validar.get('a_validar_quantidade', 0)
-                cadastros['backlog_a_validar_soma_consumo'] = backlog_a_validar.get('a_validar_soma_consumo', 0)
-            else:
-                cadastros['backlog_a_validar_quantidade'] = 0
-                cadastros['backlog_a_validar_soma_consumo'] = 0
-
-            if mes_atual_a_validar:
-                cadastros['a_validar_quantidade'] = mes_atual_a_validar.get('a_validar_quantidade', 0)
-                cadastros['a_validar_soma_consumo'] = mes_atual_a_validar.get('a_validar_soma_consumo', 0)
-            else:
-                cadastros['a_validar_quantidade'] = 0
-                cadastros['a_validar_soma_consumo'] = 0
-
         data['cadastros'] = cadastros
         # --- FIM NOVO ---
 
@@ -188,7 +177,7 @@ def get_tv_dashboard_data():
               "quantidade_registros" DESC
             LIMIT 5;
         """
-        regioes = execute_query(query_regioes)
+        regioes = parallel.submit(execute_analytics_query, query_regioes)
         data['top_regioes'] = regioes
 
         # 4. Top 5 Fornecedoras
@@ -209,7 +198,7 @@ def get_tv_dashboard_data():
               "quantidade_registros" DESC
             LIMIT 5;
         """
-        fornecedoras = execute_query(query_fornecedoras)
+        fornecedoras = parallel.submit(execute_analytics_query, query_fornecedoras)
         data['top_fornecedoras'] = fornecedoras
 
         # --- NOVO: Top 5 Licenciados ---
@@ -232,7 +221,7 @@ def get_tv_dashboard_data():
               "quantidade_registros" DESC
             LIMIT 5;
         """
-        licenciados = execute_query(query_licenciados)
+        licenciados = parallel.submit(execute_analytics_query, query_licenciados)
         data['top_licenciados'] = licenciados
         # --- FIM NOVO ---
 
@@ -293,8 +282,35 @@ def get_tv_dashboard_data():
             ORDER BY
               mes;
         """
-        grafico_mes = execute_query(query_grafico_mes)
+        grafico_mes = parallel.submit(execute_analytics_query, query_grafico_mes)
         data['grafico_ativacoes_mes'] = grafico_mes
+
+        # As 9 queries acima foram submetidas em paralelo; aguarda todas aqui
+        data = {chave: valor.result() for chave, valor in data.items()}
+        backlog_a_validar = backlog_a_validar.result()
+        mes_atual_a_validar = mes_atual_a_validar.result()
+        cadastros = data['cadastros']
+
+        if cadastros:
+            # Converte para dict para poder adicionar novas chaves
+            cadastros = dict(cadastros)
+            
+            if backlog_a_validar:
+                cadastros['backlog_a_validar_quantidade'] = backlog_a_validar.get('a_validar_quantidade', 0)
+                cadastros['backlog_a_validar_soma_consumo'] = backlog_a_validar.get('a_validar_soma_consumo', 0)
+            else:
+                cadastros['backlog_a_validar_quantidade'] = 0
+                cadastros['backlog_a_validar_soma_consumo'] = 0
+
+            if mes_atual_a_validar:
+                cadastros['a_validar_quantidade'] = mes_atual_a_validar.get('a_validar_quantidade', 0)
+                cadastros['a_validar_soma_consumo'] = mes_atual_a_validar.get('a_validar_soma_consumo', 0)
+            else:
+                cadastros['a_validar_quantidade'] = 0
+                cadastros['a_validar_soma_consumo'] = 0
+
+        data['cadastros'] = cadastros
+        # --- FIM NOVO ---
         
     except Exception as e:
         logger.error(f"Erro ao buscar dados para o dashboard da TV: {e}", exc_info=True)
@@ -0,0 +1,164 @@
+# backend/export_cache.py
+"""
+Cache em disco das exportações (/export), endereçado pelo conteúdo.
+
+A chave é o hash de (relatório, filtros, colunas, formato, versão dos dados das
+tabelas lidas pela exportação, ReportSpec.export_tables): enquanto os dados não
+mudam, a mesma exportação é servida do arquivo já gerado, sem banco nem openpyxl.
+Quando uma tabela muda, a chave muda e o arquivo antigo deixa de ser usado, até sair
+pelo LRU.
+
+Os arquivos ficam em instance/export_cache (ou EXPORT_CACHE_DIR), gravados de forma
+atômica (temporário + os.replace). O último acesso é registrado no atime do arquivo
+(os.utime explícito, independente de noatime/relatime) e, acima de
+EXPORT_CACHE_MAX_BYTES, os menos usados são apagados. O mtime continua sendo o da
+geração, usado como Last-Modified. Temporários de gerações interrompidas (processo
+morto no meio) entram na conta e são apagados depois de ORPHAN_TMP_SECONDS.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, BinaryIO, Callable, Dict, Optional, Sequence
+from flask import current_app
+from .db.data_version import replica_settled, version_token
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 1  # altere quando o layout do arquivo gerado mudar (invalida o cache)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+ORPHAN_TMP_SECONDS = 3600  # bem acima do GUNICORN_TIMEOUT: nenhuma geração dura tanto
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+
+def cache_dir(app=None) -> str:
+    app = app or current_app
+    return app.config.get('EXPORT_CACHE_DIR') or os.path.join(app.instance_path, 'export_cache')
+
+
+def cache_key(spec, filters: Dict[str, Any], columns: Optional[Sequence] = None, fmt: str = 'xlsx') -> Optional[str]:
+    """
+    Chave da exportação (hex), ou None se o cache estiver desligado, se a versão dos
+    dados não puder ser obtida (sem versão não há como saber se o arquivo está atual) ou
+    se a réplica de leitura, de onde saem as linhas, ainda pode não ter a versão atual.
+    """
+    if not current_app.config.get('EXPORT_CACHE', True):
+        return None
+    if not replica_settled(spec.export_tables or None):
+        return None
+    versao = version_token(spec.export_tables or None)
+    if versao is None:
+        return None
+    raw = json.dumps({
+        'report': spec.name, 'filters': filters, 'format': fmt, 'v': CACHE_FORMAT_VERSION,
+        'columns': [c.key for c in columns] if columns else None, 'data': versao,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _path(key: str, fmt: str) -> str:
+    return os.path.join(cache_dir(), f"{key}.{fmt}")
+
+
+def lookup(key: str, fmt: str = 'xlsx') -> Optional[str]:
+    """Caminho do arquivo em cache (registrando o acesso), ou None."""
+    path = _path(key, fmt)
+    try:
+        st = os.stat(path)
+        os.utime(path, (time.time(), st.st_mtime))
+        return path
+    except OSError:
+        return None
+
+
+def _key_lock(key: str) -> threading.Lock:
+    with _locks_lock:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def store(key: str, write: Callable[[BinaryIO], bool], fmt: str = 'xlsx') -> Optional[str]:
+    """
+    Gera o arquivo com `write(fileobj)` e o publica no cache; retorna o caminho.
+    `write` deve abrir as queries ele mesmo: ele só roda com a trava da chave e depois
+    de conferir que o arquivo ainda não existe, então pedidos simultâneos da mesma
+    chave neste processo esperam a primeira geração sem tocar no banco. Se `write`
+    retornar False (ex.: nenhuma linha), nada é publicado e o retorno é None.
+    Exceções de `write` são propagadas (nada é publicado).
+    """
+    directory = cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    with _key_lock(key):
+        path = lookup(key, fmt)
+        if path is not None:
+            return path
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{key[:16]}-", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                gerado = write(f)
+            if gerado is False:
+                os.remove(tmp_path)
+                return None
+            path = _path(key, fmt)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        finally:
+            with _locks_lock:
+                _locks.pop(key, None)
+    evict()
+    return path
+
+
+def evict(max_bytes: Optional[int] = None) -> int:
+    """
+    Apaga os temporários órfãos e os arquivos menos acessados até o cache caber em
+    `max_bytes`; retorna quantos arquivos foram apagados. Temporários recentes (geração
+    em andamento) contam no total, mas não são apagados.
+    """
+    limite = current_app.config.get('EXPORT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES) if max_bytes is None else max_bytes
+    directory = cache_dir()
+    agora = time.time()
+    arquivos = []
+    total = 0
+    removidos = 0
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+                if entry.name.startswith('.'):
+                    if entry.name.endswith('.tmp') and agora - st.st_mtime > ORPHAN_TMP_SECONDS:
+                        try:
+                            os.remove(entry.path)
+                            removidos += 1
+                            continue
+                        except OSError:
+                            pass
+                    total += st.st_size
+                    continue
+                arquivos.append((st.st_atime, st.st_size, entry.path))
+                total += st.st_size
+    except OSError:
+        return 0
+    for _, size, path in sorted(arquivos):
+        if total <= limite:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            removidos += 1
+        except OSError:
+            pass
+    if removidos:
+        logger.info(f"Cache de exportações: {removidos} arquivo(s) removido(s) pelo limite de {limite // (1024 * 1024)} MB.")
+    return removidos
@@ -1,10 +1,13 @@
 # backend/exporter.py
 import logging
+from datetime import date
 from io import BytesIO
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-from openpyxl.utils import get_column_letter
-from typing import List, Dict, Any
+from itertools import chain, islice
+from typing import BinaryIO, List, Dict, Any, Optional
+from .formatting import EXCEL_DATE_FORMAT
+
+# openpyxl é importado sob demanda (apenas quando uma exportação é gerada),
+# para não pesar no boot de cada worker.
 
 logger = logging.getLogger(__name__)
 
@@ -12,12 +15,16 @@ class ExcelExporter:
     """
     Classe utilitária para gerar arquivos Excel a partir de dados de consultas.
     """
+    SAMPLE_ROWS = 500  # linhas usadas para calcular a largura das colunas no modo streaming
 
     def __init__(self):
+        from openpyxl import Workbook
         self.wb = Workbook()
 
     def _add_headers(self, ws, headers: List[str]):
         """Adiciona os cabeçalhos em uma planilha e aplica formatação."""
+        from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+        from openpyxl.utils import get_column_letter
         header_fill = PatternFill(start_color="3C8DBC", end_color="3C8DBC", fill_type="solid")
         header_font = Font(name='Calibri', size=11, bold=True, color="FFFFFF")
         thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
@@ -33,20 +40,35 @@ class ExcelExporter:
         ws.row_dimensions[1].height = 20
         return ws
 
-    def _add_data(self, ws, data: List[List[Any]]):
-        """Adiciona os dados em uma planilha, ajusta a largura das colunas e formata."""
+    @staticmethod
+    def _formats_by_position(headers: List[str], column_formats: Optional[Dict[str, str]]) -> Dict[int, str]:
+        """Converte {cabeçalho: formato} em {posição da coluna (1..n): formato}."""
+        if not column_formats:
+            return {}
+        return {pos: column_formats[h] for pos, h in enumerate(headers, 1) if h in column_formats}
+
+    def _add_data(self, ws, data: List[List[Any]], column_formats: Optional[Dict[int, str]] = None):
+        """
+        Adiciona os dados em uma planilha, ajusta a largura das colunas e formata.
+        Datas são gravadas tipadas, com formato DD/MM/YYYY (ou o de `column_formats`,
+        indexado pela posição da coluna a partir de 1).
+        """
         if not data:
             return ws
+        from openpyxl.styles import Border, Side
+        column_formats = column_formats or {}
 
-        # Supondo que 'data' é uma lista de listas de valores
+        # 'data' é uma lista de listas de valores ou de linhas do banco (db.Row, iteráveis pelos valores)
         for row_data in data:
-            ws.append(row_data)
+            ws.append(row_data if isinstance(row_data, (list, tuple)) else list(row_data))
 
         # Resto da formatação
         thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
         for row in ws.iter_rows(min_row=2):
             for cell in row:
                 cell.border = thin_border
+                if isinstance(cell.value, date):
+                    cell.number_format = column_formats.get(cell.column, EXCEL_DATE_FORMAT)
         
         # Ajuste da largura das colunas
         for col in ws.columns:
@@ -54,31 +76,36 @@ class ExcelExporter:
             column = col[0].column_letter # Get the column letter
             for cell in col:
                 try:
-                    if cell.value is not None and len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
+                    # Datas ocupam o tamanho do formato exibido (ex.: DD/MM/YYYY), não o do datetime
+                    length = len(cell.number_format) if isinstance(cell.value, date) else len(str(cell.value))
+                    if cell.value is not None and length > max_length:
+                        max_length = length
                 except (TypeError, ValueError):
                     pass
             adjusted_width = (max_length + 2)
             ws.column_dimensions[column].width = adjusted_width if adjusted_width < 50 else 50
         return ws
 
-    def export_to_excel_bytes(self, data: List[List[Any]], headers: List[str], sheet_name: str = "Sheet1") -> bytes:
+    def export_to_excel_bytes(self, data: List[List[Any]], headers: List[str], sheet_name: str = "Sheet1",
+                              column_formats: Optional[Dict[str, str]] = None) -> bytes:
         """
         Gera um arquivo Excel de aba única em memória (bytes).
         Args:
             data (list of lists): Os dados a serem inseridos.
             headers (list): A lista de cabeçalhos.
             sheet_name (str): O nome da aba.
+            column_formats (dict): Formato Excel por cabeçalho (ex.: {'Data Referencia': 'MM/YYYY'}).
         Returns:
             bytes: O conteúdo do arquivo Excel em formato de bytes.
         """
         try:
+            from openpyxl import Workbook
             wb = Workbook()
             ws = wb.active
             ws.title = sheet_name
             self.wb = wb
             self._add_headers(ws, headers)
-            self._add_data(ws, data)
+            self._add_data(ws, data, self._formats_by_position(headers, column_formats))
             
             buffer = BytesIO()
             self.wb.save(buffer)
@@ -88,16 +115,73 @@ class ExcelExporter:
             logger.error(f"Erro ao gerar o ficheiro Excel (aba única): {e}", exc_info=True)
             raise RuntimeError(f"Erro ao gerar o ficheiro Excel (aba única): {e}")
 
+    def write_sheets(self, fileobj: BinaryIO, sheets: List[Dict[str, Any]]) -> None:
+        """
+        Grava um arquivo Excel em `fileobj` no modo write-only do openpyxl: as linhas de
+        cada aba ('data' pode ser um gerador, ex.: db.reports_engine.export_sheets) são
+        escritas à medida que chegam, sem montar a planilha inteira na memória.
+        A largura das colunas é calculada sobre as primeiras SAMPLE_ROWS linhas.
+        """
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+        from openpyxl.utils import get_column_letter
+        header_fill = PatternFill(start_color="3C8DBC", end_color="3C8DBC", fill_type="solid")
+        header_font = Font(name='Calibri', size=11, bold=True, color="FFFFFF")
+        thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+
+        wb = Workbook(write_only=True)
+        for sheet_info in sheets:
+            ws = wb.create_sheet(title=sheet_info['name'][:31])
+            headers = sheet_info['headers']
+            formats = self._formats_by_position(headers, sheet_info.get('column_formats'))
+            rows = iter(sheet_info['data'])
+            amostra = list(islice(rows, self.SAMPLE_ROWS))
+
+            # Largura: maior valor entre o cabeçalho e a amostra (datas pelo tamanho do formato), até 50
+            larguras = [len(str(h)) for h in headers]
+            for row in amostra:
+                for pos, value in enumerate(row):
+                    if value is None or pos >= len(larguras):
+                        continue
+                    length = len(formats.get(pos + 1, EXCEL_DATE_FORMAT)) if isinstance(value, date) else len(str(value))
+                    larguras[pos] = max(larguras[pos], length)
+            for pos, largura in enumerate(larguras, 1):
+                ws.column_dimensions[get_column_letter(pos)].width = min(largura + 2, 50)
+            ws.row_dimensions[1].height = 20
+
+            cabecalho = []
+            for header in headers:
+                cell = WriteOnlyCell(ws, value=header)
+                cell.font = header_font
+                cell.fill = header_fill
+                cell.border = thin_border
+                cell.alignment = Alignment(horizontal='center', vertical='center')
+                cabecalho.append(cell)
+            ws.append(cabecalho)
+
+            for row in chain(amostra, rows):
+                cells = []
+                for pos, value in enumerate(row, 1):
+                    cell = WriteOnlyCell(ws, value=value)
+                    cell.border = thin_border
+                    if isinstance(value, date):
+                        cell.number_format = formats.get(pos, EXCEL_DATE_FORMAT)
+                    cells.append(cell)
+                ws.append(cells)
+        wb.save(fileobj)
+
     def export_multi_sheet_excel_bytes(self, sheets: List[Dict[str, Any]]) -> bytes:
         """
         Gera um arquivo Excel com múltiplas abas em memória (bytes).
         Args:
             sheets (list of dict): Uma lista de dicionários, onde cada um representa uma aba
-                                    com 'name', 'headers' e 'data'.
+                                    com 'name', 'headers' e 'data' (e, opcionalmente, 'column_formats').
         Returns:
             bytes: O conteúdo do arquivo Excel em formato de bytes.
         """
         try:
+            from openpyxl import Workbook
             wb = Workbook()
             default_ws = wb.active
             wb.remove(default_ws) # Remove a aba padrão para começar limpo
@@ -105,7 +189,7 @@ class ExcelExporter:
             for sheet_info in sheets:
                 ws = wb.create_sheet(title=sheet_info['name'])
                 self._add_headers(ws, sheet_info['headers'])
-                self._add_data(ws, sheet_info['data'])
+                self._add_data(ws, sheet_info['data'], self._formats_by_position(sheet_info['headers'], sheet_info.get('column_formats')))
             
             buffer = BytesIO()
             wb.save(buffer)
@@ -0,0 +1,160 @@
+# backend/formatting.py
+"""
+Formatação pt-BR (números e datas) aplicada somente na camada de apresentação.
+
+As queries devolvem valores tipados (date, Decimal, int); o cache e a exportação
+trabalham com esses valores crus. Apenas as linhas exibidas na página (ex.: 50)
+passam por `format_rows_for_display`, que formata coluna a coluna com pandas.
+"""
+import datetime
+import logging
+import re
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Sequence
+
+# pandas/numpy são importados sob demanda: este módulo é carregado no boot
+# (routes.reports/exporter), mas só formata quando há uma página para exibir.
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# --- Formatos ---
+DATE_FORMAT = '%d/%m/%Y'
+MONTH_FORMAT = '%m/%Y'
+EXCEL_DATE_FORMAT = 'DD/MM/YYYY'
+EXCEL_MONTH_FORMAT = 'MM/YYYY'
+
+# Colunas (chaves das linhas) com formatação específica
+DECIMAL_COLUMNS = {'consumomedio'}
+INTEGER_COLUMNS = {'dias_desde_ativacao'}
+MONTH_COLUMNS = {'data_referencia'}
+
+# Insere o separador de milhar a cada 3 dígitos, da direita para a esquerda
+_THOUSANDS_RE = r'\B(?=(\d{3})+(?!\d))'
+
+
+def _to_float(values) -> 'pd.Series':
+    """Converte para float64 (Decimal/None via astype; textos inválidos viram NaN)."""
+    import pandas as pd
+    series = pd.Series(values, dtype=object) if not isinstance(values, pd.Series) else values
+    try:
+        return series.astype('float64')
+    except (TypeError, ValueError):
+        return pd.to_numeric(series, errors='coerce')
+
+
+def format_decimal(values, decimals: int = 2) -> 'pd.Series':
+    """Formata números no padrão brasileiro (1.234,56). Nulos viram ''."""
+    import numpy as np
+    import pandas as pd
+    nums = _to_float(values)
+    result = pd.Series('', index=nums.index, dtype=object)
+    mask = nums.notna().to_numpy()
+    if not mask.any():
+        return result
+
+    valid = nums.to_numpy()[mask]
+    escala = 10 ** decimals
+    scaled = np.round(np.abs(valid) * escala).astype('int64')
+    inteiro = pd.Series(scaled // escala).astype(str).str.replace(_THOUSANDS_RE, '.', regex=True)
+    texto = inteiro
+    if decimals > 0:
+        texto = inteiro + ',' + pd.Series(scaled % escala).astype(str).str.zfill(decimals)
+    sinal = np.where((valid < 0) & (scaled > 0), '-', '')
+    result[mask] = (sinal + texto).to_numpy()
+    return result
+
+
+def format_integer(values) -> 'pd.Series':
+    """Formata inteiros sem casas decimais (12.0 -> '12'). Nulos viram ''."""
+    nums = _to_float(values)
+    texto = nums.round().astype('Int64').astype(str)
+    return texto.where(nums.notna(), '').astype(object)
+
+
+def format_date(values, fmt: str = DATE_FORMAT) -> 'pd.Series':
+    """Formata datas (date/datetime/Timestamp) com `fmt`. Nulos e valores inválidos viram ''."""
+    import pandas as pd
+    series = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    datas = pd.to_datetime(series, errors='coerce')
+    return datas.dt.strftime(fmt).fillna('').astype(object)
+
+
+def _is_date_column(series: 'pd.Series') -> bool:
+    """Identifica colunas de datas pelo dtype ou pelo primeiro valor não nulo."""
+    import pandas as pd
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return True
+    primeiro = series.dropna()
+    return not primeiro.empty and isinstance(primeiro.iloc[0], datetime.date)
+
+
+def format_frame_for_display(df: 'pd.DataFrame') -> 'pd.DataFrame':
+    """Formata, coluna a coluna, as colunas de datas e numéricas de um DataFrame."""
+    formatted = df.copy()
+    for col in formatted.columns:
+        if col in DECIMAL_COLUMNS:
+            formatted[col] = format_decimal(formatted[col])
+        elif col in INTEGER_COLUMNS:
+            formatted[col] = format_integer(formatted[col])
+        elif _is_date_column(formatted[col]):
+            formatted[col] = format_date(formatted[col], MONTH_FORMAT if col in MONTH_COLUMNS else DATE_FORMAT)
+    return formatted
+
+
+def format_rows_for_display(rows: Sequence[Any]) -> List[Dict[str, Any]]:
+    """
+    Formata as linhas de UMA página (lista de db.Row ou de dicionários) para exibição.
+    Retorna uma lista de dicionários na mesma ordem de colunas; as demais colunas
+    mantêm os valores originais.
+    """
+    if not rows:
+        return []
+    import pandas as pd
+    try:
+        columns = list(rows[0].keys())
+        values = [tuple(row.values()) for row in rows]
+        if any(len(v) != len(columns) for v in values):
+            # Colunas com nomes repetidos: mantém as linhas como vieram do banco
+            return list(rows)
+        # dtype=object evita que o pandas converta, por exemplo, ids inteiros com nulos para float
+        df = pd.DataFrame(values, columns=columns, dtype=object)
+        return format_frame_for_display(df).to_dict('records')
+    except Exception as e:
+        logger.error(f"Erro ao formatar linhas para exibição: {e}", exc_info=True)
+        return list(rows)
+
+
+
+# --- Destaque da busca ---
+@lru_cache(maxsize=32)
+def _search_regex(termo: str, min_digits: int) -> 're.Pattern':
+    padroes = [re.escape(termo)]
+    digitos = re.sub(r'\D', '', termo)
+    if len(digitos) >= min_digits and digitos != termo:
+        # CPF/CNPJ: os dígitos buscados casam também com a pontuação entre eles
+        padroes.append(r'\D?'.join(digitos))
+    elif digitos == termo and len(digitos) >= min_digits:
+        padroes = [r'\D?'.join(digitos)]
+    return re.compile('|'.join(padroes), re.IGNORECASE)
+
+
+def highlight_search(value: Any, termo: str, min_digits: int = 3):
+    """
+    Valor de célula como HTML escapado, com os trechos que casam com a busca em <mark>.
+    Mesmo critério da busca no banco (ILIKE, e dígitos ignorando a pontuação).
+    """
+    from markupsafe import Markup, escape
+    texto = '' if value is None else str(value)
+    if not termo or not texto:
+        return escape(texto)
+    partes, inicio = [], 0
+    for m in _search_regex(termo, min_digits).finditer(texto):
+        if m.end() == m.start():
+            continue
+        partes.append(escape(texto[inicio:m.start()]))
+        partes.append(Markup('<mark>%s</mark>') % texto[m.start():m.end()])
+        inicio = m.end()
+    partes.append(escape(texto[inicio:]))
+    return Markup('').join(partes)
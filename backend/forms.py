@@ -1,6 +1,6 @@
 # forms.py
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, BooleanField
+from wtforms import StringField, PasswordField, SubmitField, BooleanField, HiddenField
 from wtforms.validators import DataRequired, Length, Email # Adicionar validador de Email
 
 class LoginForm(FlaskForm):
@@ -14,4 +14,14 @@ class LoginForm(FlaskForm):
         DataRequired(message="A senha é obrigatória.")
     ])
     remember_me = BooleanField('Lembrar-me')
-    submit = SubmitField('Entrar')
\ No newline at end of file
+    submit = SubmitField('Entrar')
+
+class ColumnPresetForm(FlaskForm):
+    """Salva (ou exclui) um conjunto de colunas de relatório do utilizador."""
+    report_type = HiddenField(validators=[DataRequired()])
+    name = StringField('Nome do conjunto', validators=[
+        DataRequired(message="Informe um nome para o conjunto."),
+        Length(max=60, message="O nome deve ter no máximo 60 caracteres.")
+    ])
+    save = SubmitField('Salvar colunas')
+    delete = SubmitField('Excluir')
@@ -0,0 +1,343 @@
+# backend/geo.py
+"""
+Geometria dos estados para o mapa de clientes, simplificada em vários níveis de detalhe.
+
+O GeoJSON original (static/geojson/brasil-estados.geojson, ~3,3 MB) é convertido
+numa topologia: os anéis dos estados são cortados nos pontos de junção e cada
+fronteira compartilhada vira um único arco. A simplificação (Douglas-Peucker) é
+feita por arco, com as junções fixas, então estados vizinhos continuam encaixados
+(sem buracos nem sobreposições). As coordenadas são quantizadas numa grade de
+1/4 da tolerância de cada nível.
+
+Os resultados (GeoJSON e TopoJSON) ficam em disco (instance/geo_cache), com o hash
+do arquivo de origem no nome, e ganham cópias .gz/.br (ver compression).
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+GEOMETRY_VERSION = 1  # altere quando o algoritmo mudar (invalida o cache em disco)
+SOURCE_FILE = os.path.join('geojson', 'brasil-estados.geojson')  # relativo a static/
+FEATURE_PROPERTIES = ('sigla', 'name', 'codigo_ibg')
+# Tolerância (graus) de cada nível de detalhe: 0 = mais simplificado
+LOD_TOLERANCES = (0.1, 0.04, 0.015, 0.005)
+MAP_SPAN_DEGREES = 43.0      # largura do lonaxis do mapa (-75 a -32)
+DEFAULT_MAP_WIDTH = 1000     # px, quando o cliente não informa a largura
+FORMATS = {'geojson': '.geojson', 'topojson': '.topo.json'}
+
+_build_lock = threading.Lock()
+_digest_memo = {}  # {caminho da origem: ((mtime_ns, tamanho), digest)}
+
+
+# --- Topologia ---
+def _polygons_of(geometry: dict) -> list:
+    """Polígonos como listas de anéis (tuplas x,y), sem o ponto de fechamento repetido."""
+    coords = geometry['coordinates']
+    polygons = coords if geometry['type'] == 'MultiPolygon' else [coords]
+    result = []
+    for polygon in polygons:
+        rings = []
+        for ring in polygon:
+            pontos = [(float(x), float(y)) for x, y, *_ in ring]
+            if len(pontos) > 1 and pontos[0] == pontos[-1]:
+                pontos.pop()
+            if len(pontos) >= 3:
+                rings.append(pontos)
+        if rings:
+            result.append(rings)
+    return result
+
+
+def _find_junctions(rings: list) -> set:
+    """Pontos em que o par de vizinhos muda entre anéis (início/fim de fronteiras comuns)."""
+    vizinhos = {}
+    junctions = set()
+    for ring in rings:
+        n = len(ring)
+        for i, ponto in enumerate(ring):
+            par = frozenset((ring[i - 1], ring[(i + 1) % n]))
+            anterior = vizinhos.setdefault(ponto, par)
+            if anterior != par:
+                junctions.add(ponto)
+    return junctions
+
+
+def _cut_ring(ring: list, junctions: set) -> list:
+    """Corta o anel nas junções. Sem junções, o anel inteiro vira um arco fechado."""
+    inicio = next((i for i, p in enumerate(ring) if p in junctions), None)
+    if inicio is None:
+        inicio = ring.index(min(ring))  # rotação canônica: o mesmo anel sempre gera o mesmo arco
+        girado = ring[inicio:] + ring[:inicio]
+        return [girado + [girado[0]]]
+    girado = ring[inicio:] + ring[:inicio]
+    girado.append(girado[0])
+    arcs, start = [], 0
+    for i in range(1, len(girado)):
+        if girado[i] in junctions:
+            arcs.append(girado[start:i + 1])
+            start = i
+    return arcs
+
+
+def build_topology(collection: dict) -> tuple:
+    """
+    Retorna (arcs, features): `arcs` é a lista de arcos (listas de pontos) e cada
+    feature é (properties, polígonos), com cada anel dado por referências de arco
+    (i = arco i; ~i = arco i invertido), como no TopoJSON.
+    """
+    parsed = []
+    for feature in collection.get('features', []):
+        props = feature.get('properties') or {}
+        props = {k: props[k] for k in FEATURE_PROPERTIES if k in props}
+        parsed.append((props, _polygons_of(feature['geometry'])))
+
+    junctions = _find_junctions([ring for _, polygons in parsed for rings in polygons for ring in rings])
+    arcs, index = [], {}
+
+    def arc_ref(arc):
+        key = tuple(arc)
+        if key in index:
+            return index[key]
+        reverse_key = key[::-1]
+        if reverse_key in index:
+            return ~index[reverse_key]
+        index[key] = len(arcs)
+        arcs.append(arc)
+        return index[key]
+
+    features = []
+    for props, polygons in parsed:
+        features.append((props, [[[arc_ref(arc) for arc in _cut_ring(ring, junctions)] for ring in rings]
+                                 for rings in polygons]))
+    return arcs, features
+
+
+# --- Simplificação e quantização ---
+def simplify_line(points: list, tolerance: float) -> list:
+    """Douglas-Peucker iterativo; o primeiro e o último ponto são sempre mantidos."""
+    n = len(points)
+    if tolerance <= 0 or n < 3:
+        return list(points)
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    tol2 = tolerance * tolerance
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = points[first]
+        dx, dy = points[last][0] - ax, points[last][1] - ay
+        seg2 = dx * dx + dy * dy
+        dmax, idx = -1.0, -1
+        for i in range(first + 1, last):
+            px, py = points[i]
+            if seg2 == 0:
+                qx, qy = ax, ay  # arco fechado: distância até o ponto inicial
+            else:
+                t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / seg2))
+                qx, qy = ax + t * dx, ay + t * dy
+            d = (px - qx) ** 2 + (py - qy) ** 2
+            if d > dmax:
+                dmax, idx = d, i
+        if dmax > tol2:
+            keep[idx] = True
+            stack.append((first, idx))
+            stack.append((idx, last))
+    return [p for p, k in zip(points, keep) if k]
+
+
+def _dedupe(points: list) -> list:
+    result = []
+    for p in points:
+        if not result or result[-1] != p:
+            result.append(p)
+    return result
+
+
+def _ring_points(refs: list, arcs: list) -> list:
+    pontos = []
+    for ref in refs:
+        arc = arcs[ref] if ref >= 0 else arcs[~ref][::-1]
+        pontos.extend(arc if not pontos else arc[1:])
+    return pontos
+
+
+def _valid_ring(pontos: list) -> bool:
+    return len(pontos) >= 4 and len(set(pontos)) >= 3
+
+
+def simplify_topology(arcs: list, features: list, tolerance: float) -> dict:
+    """
+    Simplifica e quantiza a topologia num nível. Anéis que degeneram são descartados
+    (ilhas pequenas); um estado nunca some: sem polígonos válidos, mantém o maior
+    contorno apenas quantizado.
+    """
+    xs = [x for arc in arcs for x, _ in arc]
+    ys = [y for arc in arcs for _, y in arc]
+    x0, y0 = min(xs), min(ys)
+    step = tolerance / 4
+
+    def quantize(pontos):
+        return _dedupe([(round((x - x0) / step), round((y - y0) / step)) for x, y in pontos])
+
+    qarcs = [quantize(simplify_line(arc, tolerance)) for arc in arcs]
+    out_features = []
+    for props, polygons in features:
+        out_polygons = []
+        for rings in polygons:
+            if not _valid_ring(_ring_points(rings[0], qarcs)):
+                continue
+            out_polygons.append([refs for refs in rings if _valid_ring(_ring_points(refs, qarcs))])
+        if not out_polygons and polygons:
+            maior = max(polygons, key=lambda rings: len(_ring_points(rings[0], arcs)))
+            qarcs.append(quantize(_ring_points(maior[0], arcs)))
+            out_polygons = [[[len(qarcs) - 1]]]
+        out_features.append((props, out_polygons))
+
+    return {
+        'arcs': qarcs, 'features': out_features, 'translate': (x0, y0), 'step': step,
+        'bbox': [x0, y0, max(xs), max(ys)],
+    }
+
+
+# --- Saída ---
+def to_geojson(level: dict) -> dict:
+    x0, y0 = level['translate']
+    step = level['step']
+    casas = max(0, math.ceil(-math.log10(step)))
+    qarcs = level['arcs']
+
+    def coords(refs):
+        return [[round(x0 + ix * step, casas), round(y0 + iy * step, casas)] for ix, iy in _ring_points(refs, qarcs)]
+
+    features = []
+    for props, polygons in level['features']:
+        features.append({
+            'type': 'Feature',
+            'id': props.get('sigla'),
+            'properties': props,
+            'geometry': {'type': 'MultiPolygon',
+                         'coordinates': [[coords(refs) for refs in rings] for rings in polygons]},
+        })
+    return {'type': 'FeatureCollection', 'bbox': level['bbox'], 'features': features}
+
+
+def to_topojson(level: dict, object_name: str = 'estados') -> dict:
+    qarcs = level['arcs']
+    novo_indice = {}
+    arcs_out = []
+
+    def remap(ref):
+        i = ref if ref >= 0 else ~ref
+        if i not in novo_indice:
+            novo_indice[i] = len(arcs_out)
+            arc = qarcs[i]
+            # Codificação delta: primeiro ponto absoluto, depois diferenças
+            arcs_out.append([list(arc[0])] + [[b[0] - a[0], b[1] - a[1]] for a, b in zip(arc, arc[1:])])
+        return novo_indice[i] if ref >= 0 else ~novo_indice[i]
+
+    geometries = [{
+        'type': 'MultiPolygon',
+        'id': props.get('sigla'),
+        'properties': props,
+        'arcs': [[[remap(ref) for ref in refs] for refs in rings] for rings in polygons],
+    } for props, polygons in level['features']]
+
+    return {
+        'type': 'Topology',
+        'bbox': level['bbox'],
+        'transform': {'scale': [level['step'], level['step']], 'translate': list(level['translate'])},
+        'objects': {object_name: {'type': 'GeometryCollection', 'geometries': geometries}},
+        'arcs': arcs_out,
+    }
+
+
+# --- Nível de detalhe e cache em disco ---
+def lod_for_width(width: Optional[int]) -> int:
+    """Nível mais simples cuja tolerância não passa de 1 px na largura (px) do mapa."""
+    graus_por_px = MAP_SPAN_DEGREES / max(1, width or DEFAULT_MAP_WIDTH)
+    for lod, tolerance in enumerate(LOD_TOLERANCES):
+        if tolerance <= graus_por_px:
+            return lod
+    return len(LOD_TOLERANCES) - 1
+
+
+def _source_digest(path: str) -> str:
+    """Hash da origem (e dos parâmetros de geração); memorizado por (mtime, tamanho) do arquivo."""
+    st = os.stat(path)
+    assinatura = (st.st_mtime_ns, st.st_size)
+    memo = _digest_memo.get(path)
+    if memo is not None and memo[0] == assinatura:
+        return memo[1]
+    h = hashlib.sha1(f"v{GEOMETRY_VERSION}|{LOD_TOLERANCES}|".encode('utf-8'))
+    with open(path, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloco)
+    digest = h.hexdigest()[:16]
+    _digest_memo[path] = (assinatura, digest)
+    return digest
+
+
+def _cache_filename(stem: str, digest: str, lod: int, fmt: str) -> str:
+    return f"{stem}-{digest}-lod{lod}{FORMATS[fmt]}"
+
+
+def build_geometry_cache(source_path: str, cache_dir: str) -> dict:
+    """
+    Gera todos os níveis/formatos para `source_path` em `cache_dir` (escrita atômica
+    + cópias .gz/.br) e remove arquivos de versões antigas da mesma origem.
+    Retorna {nome_do_arquivo: tamanho em bytes}.
+    """
+    from .compression import precompress_file
+
+    os.makedirs(cache_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    digest = _source_digest(source_path)
+    with open(source_path, 'r', encoding='utf-8') as f:
+        arcs, features = build_topology(json.load(f))
+
+    gerados = {}
+    for lod, tolerance in enumerate(LOD_TOLERANCES):
+        level = simplify_topology(arcs, features, tolerance)
+        for fmt, payload in (('geojson', to_geojson(level)), ('topojson', to_topojson(level))):
+            filename = _cache_filename(stem, digest, lod, fmt)
+            path = os.path.join(cache_dir, filename)
+            data = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+            # Temporário por processo: workers do Gunicorn podem gerar o cache ao mesmo tempo
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            precompress_file(path, force=True)
+            gerados[filename] = len(data)
+
+    for nome in os.listdir(cache_dir):
+        if nome.startswith(f"{stem}-") and f"-{digest}-" not in nome:
+            try:
+                os.remove(os.path.join(cache_dir, nome))
+            except OSError:
+                pass
+    logger.info(f"Geometria do mapa gerada: {len(gerados)} arquivos em {cache_dir}")
+    return gerados
+
+
+def geometry_cache_dir(app) -> str:
+    return app.config.get('GEO_CACHE_DIR') or os.path.join(app.instance_path, 'geo_cache')
+
+
+def geometry_file(app, lod: int, fmt: str = 'geojson') -> tuple:
+    """Retorna (diretório, arquivo) da geometria pedida, gerando o cache se necessário."""
+    source_path = os.path.join(app.static_folder, SOURCE_FILE)
+    cache_dir = geometry_cache_dir(app)
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    filename = _cache_filename(stem, _source_digest(source_path), lod, fmt)
+    if not os.path.isfile(os.path.join(cache_dir, filename)):
+        with _build_lock:
+            if not os.path.isfile(os.path.join(cache_dir, filename)):
+                build_geometry_cache(source_path, cache_dir)
+    return cache_dir, filename
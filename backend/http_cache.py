@@ -0,0 +1,78 @@
+# backend/http_cache.py
+"""
+Cache HTTP condicional para as rotas /api: ETag forte + Cache-Control.
+
+O ETag é derivado do token de versão dos dados (db.data_version), da URL com os
+parâmetros e do utilizador. Se o navegador enviar If-None-Match com o mesmo ETag,
+a rota responde 304 SEM executar a query pesada. Enquanto a réplica de leitura pode
+não ter aplicado a última mudança (data_version.replica_settled), a rota lê do
+primário, para que o corpo enviado com o ETag novo seja o da versão nova.
+"""
+import hashlib
+import logging
+from functools import wraps
+from typing import Optional
+from flask import current_app, make_response, request
+from flask_login import current_user
+from .db import timeouts
+from .db.connection import primary_reads
+from .db.data_version import get_data_version, replica_settled
+from .compression import STATIC_SUFFIXES
+
+logger = logging.getLogger(__name__)
+
+
+def _compute_etag(version: str) -> str:
+    user_id = current_user.get_id() if current_user and current_user.is_authenticated else '-'
+    args = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    raw = f"{version}|{request.path}?{args}|{user_id}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def etag_matches(etag: str) -> bool:
+    """
+    Indica se o If-None-Match do pedido corresponde ao ETag (forte), incluindo as
+    variantes comprimidas ("<etag>-gzip", "<etag>-br") geradas por backend.compression.
+    """
+    if_none_match = request.if_none_match
+    return if_none_match.contains(etag) or any(
+        if_none_match.contains(f"{etag}-{encoding}") for encoding in STATIC_SUFFIXES)
+
+
+def conditional_cache(max_age: Optional[int] = None):
+    """
+    Decorator para rotas JSON de leitura: responde 304 quando If-None-Match bate com o
+    ETag atual e, nas respostas 200, envia ETag + 'Cache-Control: private, max-age'.
+    Se o token de versão não puder ser obtido, a rota roda normalmente, sem validadores.
+    Se alguma query da rota falhou ou foi interrompida (o executor devolve []/None, que
+    vira zeros na resposta), a resposta sai com 'Cache-Control: no-store' e sem ETag,
+    para o navegador não revalidar os zeros com 304 até a próxima mudança dos dados.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_app.config.get('API_CONDITIONAL_CACHE', True):
+                return view(*args, **kwargs)
+
+            version = get_data_version()
+            if version is None:
+                return view(*args, **kwargs)
+
+            age = current_app.config.get('API_CACHE_MAX_AGE', 60) if max_age is None else max_age
+            etag = _compute_etag(version)
+            if etag_matches(etag):
+                response = current_app.response_class(status=304)
+            else:
+                falhas = timeouts.failure_count()
+                with primary_reads(not replica_settled()):
+                    response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                if timeouts.failure_count() != falhas:
+                    response.headers['Cache-Control'] = 'no-store'
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = f"private, max-age={age}"
+            return response
+        return wrapper
+    return decorator
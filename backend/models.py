@@ -1,4 +1,6 @@
 # models.py
+import time
+from flask import current_app, session
 from flask_login import UserMixin
 import bcrypt # Importa a biblioteca bcrypt para verificação de senha
 from . import db as database # Importa nosso módulo de banco de dados para acesso às funções de query
@@ -52,6 +54,10 @@ class User(UserMixin):
              logger.error(f"Erro inesperado durante bcrypt.checkpw para user ID {self.id}: {e}", exc_info=True)
              return False
 
+    def without_password(self):
+        """Cópia do utilizador SEM o hash da senha (é a versão guardada em cache/sessão)."""
+        return User(user_id=self.id, email=self.email, password_hash_from_db=None, nome=self.nome)
+
     # --- Métodos Estáticos para buscar Utilizadores ---
 
     @staticmethod
@@ -128,4 +134,60 @@ class User(UserMixin):
     #     """Gera o hash bcrypt para a senha e atualiza o atributo."""
     #     self.password_hash = User.generate_hash(password)
     #     # Chamar função em database.py para salvar self.password_hash no DB para self.id
-    #     # ex: database.update_user_password(self.id, self.password_hash)
\ No newline at end of file
+    #     # ex: database.update_user_password(self.id, self.password_hash)
+
+
+# --- CACHE DE IDENTIDADE DO UTILIZADOR (evita uma query a USUARIOS por requisição) ---
+# Chave da sessão (cookie assinado pelo Flask) com id/email/nome do utilizador autenticado
+SESSION_USER_KEY = '_user_profile'
+
+def _user_cache():
+    return current_app.extensions.get('user_cache')
+
+def load_cached_user(user_id: int):
+    """
+    Carrega o utilizador para o Flask-Login sem ir ao banco quando possível:
+      1. cache em memória do processo (TTL/LRU, USER_CACHE_TTL / USER_CACHE_MAXSIZE);
+      2. campos assinados na sessão (USER_SESSION_CACHE), válidos pelo mesmo TTL;
+      3. User.get_by_id (consulta ao banco), que repovoa o cache.
+    O objeto em cache nunca guarda o hash da senha.
+    """
+    cache = _user_cache()
+    if cache is not None:
+        user = cache.get(user_id)
+        if user is not None:
+            return user
+
+    ttl = current_app.config.get('USER_CACHE_TTL', 300)
+    if current_app.config.get('USER_SESSION_CACHE', True):
+        profile = session.get(SESSION_USER_KEY)
+        if profile and profile.get('id') == user_id and time.time() - profile.get('ts', 0) < ttl:
+            user = User(user_id=profile['id'], email=profile.get('email'), password_hash_from_db=None, nome=profile.get('nome'))
+            if cache is not None:
+                cache.set(user_id, user)
+            return user
+
+    user = User.get_by_id(user_id)
+    if user is None:
+        return None
+    user = user.without_password()
+    if cache is not None:
+        cache.set(user_id, user)
+    remember_user_in_session(user)
+    return user
+
+def remember_user_in_session(user) -> None:
+    """Grava id/email/nome (sem senha) na sessão assinada, para outros workers não consultarem o banco."""
+    if current_app.config.get('USER_SESSION_CACHE', True):
+        session[SESSION_USER_KEY] = {'id': user.id, 'email': user.email, 'nome': user.nome, 'ts': int(time.time())}
+
+def invalidate_cached_user(user_id) -> None:
+    """Remove o utilizador do cache do processo e da sessão (logout ou alteração de dados)."""
+    cache = _user_cache()
+    if cache is not None and user_id is not None:
+        try:
+            cache.pop(int(user_id))
+        except (TypeError, ValueError):
+            logger.warning(f"ID de utilizador inválido ao invalidar o cache: {user_id}")
+    session.pop(SESSION_USER_KEY, None)
+
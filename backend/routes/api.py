@@ -3,7 +3,9 @@ import logging
 import re
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required
-from .. import db
+from .. import db, geo
+from ..compression import send_precompressed
+from ..http_cache import conditional_cache
 from ..db.tv_dashboard import get_tv_dashboard_data  # Adicione esta linha
 
 logger = logging.getLogger(__name__)
@@ -14,6 +16,7 @@ api_bp = Blueprint('api_bp', __name__)
 # --- Rota API para Dados do Mapa (UF, Contagem, Soma Consumo) ---
 @api_bp.route('/map-data/state-summary')
 @login_required
+@conditional_cache()
 def api_state_summary_for_map():
     """Retorna dados agregados (UF, contagem, soma consumo) por estado para o mapa."""
     logger.info("Requisição recebida em /api/map-data/state-summary")
@@ -38,9 +41,54 @@ def api_state_summary_for_map():
         logger.error(f"API Mapa (/api/map-data/state-summary) Erro inesperado: {e}", exc_info=True)
         return jsonify({"error": "Erro interno inesperado ao processar dados do mapa."}), 500
 
+# --- Rota API combinada do Mapa (ativos, consumo e atraso por UF) ---
+@api_bp.route('/map-data/summary')
+@login_required
+@conditional_cache()
+def api_map_summary():
+    """
+    Retorna, por estado, clientes ativos, soma de consumo médio e clientes com atraso
+    na injeção: [{'uf', 'count', 'sum_consumo', 'overdue_count'}, ...].
+    Substitui as chamadas separadas a /state-summary e /overdue-clients-by-state.
+    """
+    logger.info("Requisição recebida em /api/map-data/summary")
+    try:
+        summary = db.get_state_map_summary()
+        logger.info(f"API Mapa (resumo): Enviando {len(summary)} registros de estado.")
+        return jsonify(summary)
+    except Exception as e:
+        logger.error(f"API Mapa (/api/map-data/summary) Erro inesperado: {e}", exc_info=True)
+        return jsonify({"error": "Erro interno inesperado ao processar dados do mapa."}), 500
+
+# --- Rota API para a Geometria Simplificada dos Estados (mapa) ---
+@api_bp.route('/map-data/geometry')
+@login_required
+def api_map_geometry():
+    """
+    Geometria dos estados simplificada (ver backend/geo.py).
+    Parâmetros: lod (0 = mais simples) ou width (largura do mapa em px, escolhe o lod)
+    e format=geojson|topojson. Servida do cache em disco, com ETag e gzip/br.
+    """
+    fmt = request.args.get('format', 'geojson')
+    if fmt not in geo.FORMATS:
+        return jsonify({"error": f"Formato inválido. Use: {', '.join(geo.FORMATS)}."}), 400
+    lod = request.args.get('lod', type=int)
+    if lod is None:
+        lod = geo.lod_for_width(request.args.get('width', type=int))
+    if not 0 <= lod < len(geo.LOD_TOLERANCES):
+        return jsonify({"error": f"lod deve estar entre 0 e {len(geo.LOD_TOLERANCES) - 1}."}), 400
+
+    try:
+        directory, filename = geo.geometry_file(current_app, lod, fmt)
+    except Exception as e:
+        logger.error(f"API Mapa (/api/map-data/geometry) Erro ao gerar geometria lod={lod} format={fmt}: {e}", exc_info=True)
+        return jsonify({"error": "Erro interno ao gerar a geometria do mapa."}), 500
+    return send_precompressed(directory, filename, max_age=current_app.config.get('GEO_CACHE_MAX_AGE', 3600))
+
 # --- Rota API para Resumo por Fornecedora ---
 @api_bp.route('/summary/fornecedora')
 @login_required
+@conditional_cache()
 def api_fornecedora_summary():
     """Retorna dados de resumo (qtd, kwh) agrupados por Fornecedora."""
     month_str = request.args.get('month')
@@ -70,6 +118,7 @@ def api_fornecedora_summary():
 # --- Rota API para Resumo por Concessionária ---
 @api_bp.route('/summary/concessionaria')
 @login_required
+@conditional_cache()
 def api_concessionaria_summary():
     """Retorna dados de resumo (qtd, kwh) agrupados por Concessionária."""
     month_str = request.args.get('month')
@@ -97,6 +146,7 @@ def api_concessionaria_summary():
 # --- Rota API para KPI Total kWh ---
 @api_bp.route('/kpi/total-kwh')
 @login_required
+@conditional_cache()
 def api_kpi_total_kwh():
     """Retorna o KPI de consumo total de kWh para o mês, opcionalmente filtrado por fornecedora."""
     month_str = request.args.get('month')
@@ -114,6 +164,7 @@ def api_kpi_total_kwh():
 # --- Rota API para KPI Clientes Ativos (data_ativo) ---
 @api_bp.route('/kpi/clientes-ativos')
 @login_required
+@conditional_cache()
 def api_kpi_clientes_ativos():
     """Retorna o KPI de contagem de clientes ativos no mês (por data_ativo), opcionalmente filtrado por fornecedora."""
     month_str = request.args.get('month')
@@ -131,6 +182,7 @@ def api_kpi_clientes_ativos():
 # --- Rota API para KPI Clientes REGISTRADOS (dtcad) ---
 @api_bp.route('/kpi/clientes-registrados')
 @login_required
+@conditional_cache()
 def api_kpi_clientes_registrados():
     """Retorna o KPI de contagem de clientes registrados no mês (por dtcad), opcionalmente filtrado por fornecedora."""
     month_str = request.args.get('month')
@@ -148,6 +200,7 @@ def api_kpi_clientes_registrados():
 # --- Rota API para Dados do Gráfico Mensal (Evolução Ativações) ---
 @api_bp.route('/chart/monthly-active-clients')
 @login_required
+@conditional_cache()
 def api_chart_monthly_active_clients():
     """Retorna a contagem de clientes ativados por mês para um dado ano (gráfico linha), opcionalmente filtrado por fornecedora."""
     year_str = request.args.get('year')
@@ -175,6 +228,7 @@ def api_chart_monthly_active_clients():
 # --- Rota API para Gráfico Pizza Fornecedora ---
 @api_bp.route('/pie/clientes-fornecedora')
 @login_required
+@conditional_cache()
 def api_clientes_fornecedora_pie():
     """Retorna dados para o gráfico de pizza de clientes ativos por fornecedora."""
     month_str = request.args.get('month')
@@ -208,6 +262,7 @@ def api_clientes_fornecedora_pie():
 # --- API para Gráfico Barras Concessionária ---
 @api_bp.route('/bar/clientes-concessionaria')
 @login_required
+@conditional_cache()
 def api_clientes_concessionaria_bar():
     """Retorna dados para o gráfico de barras de clientes ativos por Região/Concessionária."""
     month_str = request.args.get('month')
@@ -256,6 +311,7 @@ def api_clientes_concessionaria_bar():
 # --- Rota API para Card Fornecedoras s/ RCB e Clientes > 100 dias ---
 @api_bp.route('/summary/fornecedora-no-rcb')
 @login_required
+@conditional_cache()
 def api_fornecedora_no_rcb_summary():
     """
     Retorna dados (fornecedora, qtd clientes, soma consumo) de fornecedoras
@@ -288,6 +344,7 @@ def api_fornecedora_no_rcb_summary():
 # --- ROTA API PARA GRÁFICO DE VENCIDOS POR FORNECEDORA (COM AJUSTE PARA 120 DIAS) ---
 @api_bp.route('/chart/overdue-payments')
 @login_required
+@conditional_cache()
 def api_overdue_payments_chart():
     """Retorna dados para o gráfico de barras de pagamentos vencidos por fornecedora."""
     days_str = request.args.get('days', '30') # Pega o parâmetro 'days', padrão 30
@@ -330,6 +387,7 @@ def api_overdue_payments_chart():
 # --- ROTA API PARA DADOS DO GREEN SCORE ---
 @api_bp.route('/scores/green-score')
 @login_required
+@conditional_cache()
 def api_green_score():
     """
     Retorna os dados do Green Score.
@@ -370,6 +428,7 @@ def api_green_score():
 # --- NOVA ROTA API para Clientes com Atraso por Estado no Mapa ---
 @api_bp.route('/map-data/overdue-clients-by-state')
 @login_required
+@conditional_cache()
 def api_overdue_clients_by_state():
     """
     Retorna a contagem de clientes com 'Atraso na Injeção' = 'SIM',
@@ -399,6 +458,7 @@ def api_overdue_clients_by_state():
 # --- NOVA ROTA API: KPI Total kWh CONSOLIDADO (sem mês, com fornecedora opcional) ---
 @api_bp.route('/kpi/total-kwh-consolidated')
 @login_required
+@conditional_cache()
 def api_kpi_total_kwh_consolidated():
     """
     Retorna o KPI de consumo total de kWh consolidado (sem filtro de mês),
@@ -417,6 +477,7 @@ def api_kpi_total_kwh_consolidated():
 # --- NOVA ROTA API: KPI Clientes Ativos CONSOLIDADO (sem mês, com fornecedora opcional) ---
 @api_bp.route('/kpi/clientes-ativos-consolidated')
 @login_required
+@conditional_cache()
 def api_kpi_clientes_ativos_consolidated():
     """
     Retorna o KPI de contagem de clientes ativos consolidados (sem filtro de mês),
@@ -435,6 +496,7 @@ def api_kpi_clientes_ativos_consolidated():
 # --- NOVA ROTA API: KPI Clientes Registrados CONSOLIDADO (sem mês, com fornecedora opcional) ---
 @api_bp.route('/kpi/clientes-registrados-consolidated')
 @login_required
+@conditional_cache()
 def api_kpi_clientes_registrados_consolidated():
     """
     Retorna o KPI de contagem de clientes registrados consolidados (sem filtro de mês),
@@ -453,6 +515,7 @@ def api_kpi_clientes_registrados_consolidated():
 # --- NOVA ROTA API para KPI de Clientes com Atraso na Injeção ---
 @api_bp.route('/kpi/overdue-injection-clients')
 @login_required
+@conditional_cache()
 def api_kpi_overdue_injection_clients():
     """
     Retorna o KPI de contagem de clientes com 'Atraso na Injeção' = 'SIM',
@@ -476,6 +539,7 @@ def api_kpi_overdue_injection_clients():
 # --- NOVA ROTA API para KPI de Clientes com Atraso na Injeção (<= 30 dias) ---
 @api_bp.route('/kpi/overdue-injection-clients-up-to-30-days')
 @login_required
+@conditional_cache()
 def api_kpi_overdue_injection_clients_up_to_30_days():
     """
     Retorna o KPI de contagem de clientes com 'Atraso na Injeção' = 'SIM'
@@ -500,6 +564,7 @@ def api_kpi_overdue_injection_clients_up_to_30_days():
 # --- NOVA ROTA API para KPI de Clientes com Atraso na Injeção (> 30 dias) ---
 @api_bp.route('/kpi/overdue-injection-clients-over-30-days')
 @login_required
+@conditional_cache()
 def api_kpi_overdue_injection_clients_over_30_days():
     """
     Retorna o KPI de contagem de clientes com 'Atraso na Injeção' = 'SIM'
@@ -523,6 +588,7 @@ def api_kpi_overdue_injection_clients_over_30_days():
 
 # --- ROTA API PARA DADOS DO DASHBOARD DA TV ---
 @api_bp.route('/tv-data', methods=['GET'])
+@conditional_cache()
 def get_tv_data():
     """Endpoint para buscar todos os dados do dashboard da TV."""
     try:
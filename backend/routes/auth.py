@@ -3,7 +3,7 @@ import logging
 from flask import Blueprint, render_template, request, flash, redirect, url_for
 from flask_login import login_user, logout_user, login_required, current_user
 from urllib.parse import urlparse, urljoin
-from ..models import User  # Import relativo do diretório pai
+from ..models import User, remember_user_in_session, invalidate_cached_user  # Import relativo do diretório pai
 from ..forms import LoginForm # Import relativo do diretório pai
 
 logger = logging.getLogger(__name__)
@@ -29,6 +29,7 @@ def login():
         user = User.get_by_email(form.email.data)
         if user and user.verify_password(form.password.data):
             login_user(user, remember=form.remember_me.data)
+            remember_user_in_session(user)
             logger.info(f"Login OK: '{form.email.data}'")
             next_page = request.args.get('next')
             # Valida o next_page antes de redirecionar
@@ -52,6 +53,7 @@ def logout():
     """Rota para fazer logout do utilizador."""
     user_email = current_user.email if hasattr(current_user, 'email') else '?'
     logger.info(f"Logout solicitado para: '{user_email}'")
+    invalidate_cached_user(current_user.get_id())
     logout_user()
     flash('Logout efetuado com sucesso.', 'success')
     return redirect(url_for('auth_bp.login')) # Redireciona para a página de login deste blueprint
\ No newline at end of file
@@ -1,38 +1,54 @@
 # backend/routes/reports.py
 import logging
 import math
+import tempfile
 from datetime import datetime
-from flask import (Blueprint, render_template, request, Response, flash,
-                   redirect, url_for, current_app)
+from functools import partial
+from flask import (Blueprint, render_template, request, flash, jsonify,
+                   redirect, url_for, current_app, send_file)
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-from .. import db
+from .. import column_presets, db, export_cache
+from ..db import parallel, reports_engine
+from ..db.timeouts import QueryInterrupted, query_class
 from ..exporter import ExcelExporter
+from ..forms import ColumnPresetForm
+from ..formatting import format_rows_for_display, highlight_search
 
 logger = logging.getLogger(__name__)
 
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
 reports_bp = Blueprint('reports_bp', __name__,
                        template_folder='../templates',
                        static_folder='../static')
 
+@reports_bp.app_template_filter('highlight')
+def highlight_filter(value, termo=None):
+    """Destaca na célula os trechos que casam com a busca do relatório."""
+    return highlight_search(value, termo)
+
+
+def _user_key():
+    """Identificador do utilizador para os conjuntos de colunas (None se anônimo)."""
+    return getattr(current_user, 'id', None)
+
+
 @reports_bp.route('/relatorios')
 @login_required
 def relatorios():
-    """Rota principal para visualização de relatórios."""
+    """Rota principal para visualização de relatórios (qualquer relatório de db.reports_registry)."""
     user_nome = current_user.nome if hasattr(current_user, 'nome') else 'Anónimo'
     logger.info(f"Acessando /relatorios. Utilizador: {user_nome}")
     try:
         # --- LEITURA DOS PARÂMETROS DA URL ---
-        page = request.args.get('page', 1, type=int)
-        # O tipo de relatório agora vem do 'report_type_select' ou do 'report_type' oculto
+        page = max(1, request.args.get('page', 1, type=int))
+        # O tipo de relatório vem do 'report_type_select' ou do 'report_type' oculto
         selected_report_type = request.args.get('report_type_select') or request.args.get('report_type', 'base_clientes')
-        selected_fornecedora = request.args.get('fornecedora', 'Consolidado')
-        # Novos parâmetros de data
-        start_date = request.args.get('start_date', None)
-        end_date = request.args.get('end_date', None)
+        # Keyset: última/primeira chave da página vizinha (links Próximo/Anterior)
+        after = request.args.get('after', type=int)
+        before = request.args.get('before', type=int)
+        spec = db.get_report(selected_report_type)
 
-        page = max(1, page)
-        
         # Obter lista de fornecedoras (lógica existente)
         try:
             fornecedoras_db = db.get_fornecedoras()
@@ -43,120 +59,88 @@ def relatorios():
         fornecedoras_list = ['Consolidado'] + [f for f in fornecedoras_db if f != 'Consolidado']
 
         items_per_page = current_app.config.get('ITEMS_PER_PAGE', 50)
-        offset = (page - 1) * items_per_page
-        dados, headers, total_items, error_message = [], [], 0, None
-
-        logger.info(f"Processando relatório: Tipo='{selected_report_type}', Fornecedora='{selected_fornecedora}', Página={page}, Data Início='{start_date}', Data Fim='{end_date}'")
-
-        try:
-            headers = db.get_headers(selected_report_type)
-            if not headers:
-                 error_message = f"Cabeçalhos não definidos para o tipo de relatório: '{selected_report_type}'."
-                 logger.error(error_message)
-                 flash(error_message, 'danger')
-            else:
-                if selected_report_type in ['base_clientes', 'rateio']:
-                    data_query, data_params = db.build_query(selected_report_type, selected_fornecedora, offset, items_per_page)
-                    dados = db.execute_query(data_query, data_params) or []
-                    count_q, count_p = db.count_query(selected_report_type, selected_fornecedora)
-                    # CORREÇÃO: Usando execute_query_one e acessando por chave
-                    total_items_result = db.execute_query_one(count_q, count_p)
-                    total_items = total_items_result.get('count', 0) if total_items_result else 0
-
-                elif selected_report_type == 'rateio_rzk':
-                    total_items = db.count_rateio_rzk()
-                    dados = db.get_rateio_rzk_data(offset=offset, limit=items_per_page)
-                    selected_fornecedora = 'RZK' # Força a fornecedora para este relatório
-
-                elif selected_report_type == 'clientes_por_licenciado':
-                    total_items = db.count_clientes_por_licenciado()
-                    dados = db.get_clientes_por_licenciado_data(offset=offset, limit=items_per_page)
-
-                elif selected_report_type == 'boletos_por_cliente':
-                    total_items = db.count_boletos_por_cliente(fornecedora=selected_fornecedora)
-                    dados = db.get_boletos_por_cliente_data(offset=offset, limit=items_per_page, fornecedora=selected_fornecedora)
-
-                # <<< INÍCIO DO NOVO BLOCO >>>
-                elif selected_report_type == 'graduacao_licenciado':
-                    # Chama as funções de DB passando as datas
-                    total_items = db.count_graduacao_licenciado(start_date=start_date, end_date=end_date)
-                    dados = db.get_graduacao_licenciado_data(offset=offset, limit=items_per_page, start_date=start_date, end_date=end_date)
-                
-                # <<< FIM DO NOVO BLOCO >>>
-
-                elif selected_report_type == 'recebiveis_clientes':
-                    # Busca os dados paginados para recebíveis, passando a fornecedora
-                    dados = db.get_recebiveis_clientes_data(offset=offset, limit=items_per_page, fornecedora=selected_fornecedora)
-                    # Conta o total de itens para recebíveis, respeitando a fornecedora
-                    total_items = db.count_recebiveis_clientes(fornecedora=selected_fornecedora)
-
-                else: # Bloco else existente
-                    error_message = f"Tipo de relatório desconhecido ou não implementado: '{selected_report_type}'."
-                    logger.warning(f"Tentativa de acesso a relatório inválido: '{selected_report_type}'.")
-                    flash(error_message, "warning")
-                    headers = [] # Limpa cabeçalhos se o tipo for inválido
-
-        except Exception as e:
-             logger.error(f"Erro ao buscar dados para o relatório '{selected_report_type}': {e}", exc_info=True)
-             error_message = "Ocorreu um erro ao buscar os dados do relatório."
-             flash(error_message, 'danger')
-             dados = []
-             total_items = 0
-
-        # --- REMOÇÃO DE DUPLICATAS PELA COLUNA 'idcliente' ANTES DE EXIBIR NA PÁGINA ---
-        if dados and headers:
+        dados, headers, total_items, total_pages, error_message = [], [], 0, 0, None
+        filters, first_key, last_key = {}, None, None
+        columns, presets, selected_preset = None, {}, None
+
+        if spec is None:
+            error_message = f"Tipo de relatório desconhecido ou não implementado: '{selected_report_type}'."
+            logger.warning(f"Tentativa de acesso a relatório inválido: '{selected_report_type}'.")
+            flash(error_message, "warning")
+        else:
+            filters = reports_engine.parse_filters(spec, request.args)
+            # Colunas: escolhidas na URL (cols) ou de um conjunto salvo do utilizador (preset)
+            if _user_key() is not None:
+                presets = column_presets.get_presets(_user_key(), spec.name)
+            cols = request.args.getlist('cols')
+            if not cols and request.args.get('preset') in presets:
+                selected_preset = request.args.get('preset')
+                cols = presets[selected_preset]
+            columns = reports_engine.parse_columns(spec, cols)
+            headers = [c.header for c in columns] if columns else spec.headers
+            if spec.search and request.args.get('q', '').strip() and 'q' not in filters:
+                flash(f"Digite ao menos {db.reports_registry.SEARCH_MIN_LENGTH} caracteres para pesquisar.", "warning")
+            logger.info(f"Processando relatório: Tipo='{spec.name}', Filtros={filters}, Página={page}, Keyset=({after}, {before})")
             try:
-                # CORREÇÃO: Altera a busca pela coluna de ID para ser mais flexível
-                id_column_name_found = next((h for h in ['codigo', 'idcliente', 'código'] if h in [ch.lower() for ch in headers]), None)
-                
-                if id_column_name_found:
-                    seen_ids = set()
-                    dados_unicos = []
-                    for linha in dados:
-                        # CORREÇÃO: Usa o método .get() para evitar KeyError e aceita dicionários
-                        client_id = linha.get(id_column_name_found)
-                        if client_id is not None and client_id not in seen_ids:
-                            seen_ids.add(client_id)
-                            dados_unicos.append(linha)
-                    
-                    if len(dados_unicos) < len(dados):
-                        logger.info(f"Removidas {len(dados) - len(dados_unicos)} linhas duplicadas por '{id_column_name_found}' para a exibição do relatório '{selected_report_type}'.")
-                        dados = dados_unicos
-                else:
-                    raise ValueError("Coluna de ID não encontrada")
-
-            except ValueError:
-                logger.warning(f"Nenhuma coluna de ID ('idcliente' ou 'código') foi encontrada nos cabeçalhos do relatório '{selected_report_type}'. A remoção de duplicatas na exibição foi ignorada.")
-
-        # Calcular paginação
-        if not error_message and total_items > 0 and items_per_page > 0:
-            total_pages = math.ceil(total_items / items_per_page)
-            if page > total_pages and total_pages > 0: # Corrige se a página pedida for maior que o total
-                logger.warning(f"Página solicitada ({page}) maior que o total ({total_pages}). Redirecionando para a última página.")
-                # O ideal seria redirecionar, mas por simplicidade vamos apenas ajustar a página para renderizar
-                page = total_pages
-                offset = (page - 1) * items_per_page
-                # Refazer a query com a página corrigida seria o mais correto
-                # (Omitido aqui por brevidade)
-        elif not error_message:
-            total_pages = 0 if total_items == 0 else 1 # 0 páginas se 0 itens, 1 página se itens <= items_per_page
-
-        # --- RENDERIZAÇÃO DO TEMPLATE (PASSANDO AS DATAS) ---
+                # Página e contagem são independentes: rodam em paralelo
+                total_items, dados = parallel.gather(
+                    partial(reports_engine.count, spec, filters),
+                    partial(reports_engine.fetch_page, spec, filters, (page - 1) * items_per_page, items_per_page,
+                            after=after, before=before, columns=columns),
+                )
+                total_pages = math.ceil(total_items / items_per_page) if items_per_page > 0 else 0
+                if total_pages and page > total_pages:
+                    logger.warning(f"Página solicitada ({page}) maior que o total ({total_pages}). Exibindo a última página.")
+                    page = total_pages
+                    dados = reports_engine.fetch_page(spec, filters, (page - 1) * items_per_page, items_per_page,
+                                                      columns=columns)
+                first_key, last_key = reports_engine.page_bounds(spec, dados)
+            except Exception as e:
+                logger.error(f"Erro ao buscar dados para o relatório '{spec.name}': {e}", exc_info=True)
+                error_message = "Ocorreu um erro ao buscar os dados do relatório."
+                flash(error_message, 'danger')
+                dados, total_items, total_pages = [], 0, 0
+
+        selected_fornecedora = (spec.fixed_fornecedora if spec else None) or request.args.get('fornecedora', 'Consolidado')
+        # Parâmetros que os links (paginação/exportação) devem manter
+        filter_args = {'report_type': selected_report_type}
+        for nome in (spec.filter_names() if spec else []):
+            if request.args.get(nome):
+                filter_args[nome] = request.args.get(nome)
+        if columns:
+            filter_args['cols'] = [c.key for c in columns]
+
+        # Formatação pt-BR (datas e números) apenas das linhas exibidas nesta página
+        dados = format_rows_for_display(dados)
+
         return render_template(
             'relatorios.html',
+            reports=list(db.REPORTS.values()),
+            report_filters=spec.filter_names() if spec else [],
+            filter_args=filter_args,
             fornecedoras=fornecedoras_list,
             selected_fornecedora=selected_fornecedora,
             selected_report_type=selected_report_type,
-            selected_start_date=start_date, # <-- Passa a data de início para o template
-            selected_end_date=end_date,     # <-- Passa a data de fim para o template
+            selected_start_date=request.args.get('start_date'),
+            selected_end_date=request.args.get('end_date'),
             headers=headers,
             dados=dados,
             page=page,
             total_pages=total_pages,
             total_items=total_items,
             items_per_page=items_per_page,
+            first_key=first_key,
+            last_key=last_key,
+            search_fields=[f.label for f in spec.search] if spec else [],
+            search_term=filters.get('q'),
+            all_columns=spec.columns if spec else (),
+            selected_columns={c.key for c in (columns or (spec.columns if spec else ()))},
+            required_columns=spec.required_columns if spec else [],
+            presets=sorted(presets),
+            selected_preset=selected_preset,
+            preset_form=ColumnPresetForm(report_type=selected_report_type, name=selected_preset) if _user_key() is not None else None,
             error=error_message,
-            title=f"{selected_report_type.replace('_', ' ').title()} - Relatórios"
+            title=f"{spec.title if spec else selected_report_type} - Relatórios"
         )
 
     except Exception as e:
@@ -165,171 +149,133 @@ def relatorios():
         return render_template(
             'relatorios.html',
             title="Erro Crítico - Relatórios", error="Erro interno grave.",
+            reports=list(db.REPORTS.values()), report_filters=[], filter_args={},
+            search_fields=[], search_term=None, all_columns=(), selected_columns=set(),
+            required_columns=[], presets=[], selected_preset=None, preset_form=None,
             dados=[], headers=[], page=1, total_pages=0, total_items=0,
             selected_report_type='base_clientes', selected_fornecedora='Consolidado',
             selected_start_date=None, selected_end_date=None
             ), 500
 
 
+@reports_bp.route('/relatorios/metricas')
+@login_required
+def relatorios_metricas():
+    """Métricas dos relatórios neste processo (contagem, página e exportação por relatório)."""
+    return jsonify(reports_engine.metrics_snapshot())
+
+
+@reports_bp.route('/relatorios/colunas', methods=['POST'])
+@login_required
+def salvar_colunas():
+    """Salva ou exclui um conjunto de colunas do utilizador para um relatório."""
+    form = ColumnPresetForm()
+    report_type = form.report_type.data or 'base_clientes'
+    spec = db.get_report(report_type)
+    if spec is None or _user_key() is None or not form.validate_on_submit():
+        for erros in form.errors.values():
+            for erro in erros:
+                flash(erro, "warning")
+        return redirect(url_for('reports_bp.relatorios', report_type=report_type))
+
+    nome = column_presets.normalize_name(form.name.data)
+    if form.delete.data:
+        if column_presets.delete_preset(_user_key(), spec.name, nome):
+            flash(f"Conjunto de colunas '{nome}' excluído.", "success")
+        return redirect(url_for('reports_bp.relatorios', report_type=spec.name))
+
+    columns = reports_engine.parse_columns(spec, request.form.getlist('cols')) or spec.columns
+    try:
+        salvo = column_presets.save_preset(_user_key(), spec.name, nome, [c.key for c in columns])
+    except OSError as e:
+        logger.error(f"Erro ao salvar o conjunto de colunas '{nome}': {e}", exc_info=True)
+        flash("Não foi possível salvar o conjunto de colunas.", "error")
+        return redirect(url_for('reports_bp.relatorios', report_type=spec.name))
+    if salvo is None:
+        flash(f"Limite de {column_presets.MAX_PRESETS_PER_REPORT} conjuntos por relatório atingido.", "warning")
+        return redirect(url_for('reports_bp.relatorios', report_type=spec.name))
+    flash(f"Conjunto de colunas '{salvo}' salvo.", "success")
+    return redirect(url_for('reports_bp.relatorios', report_type=spec.name, preset=salvo))
+
+
+def _send_cached(path: str, key: str, filename: str):
+    """Envia um arquivo do cache de exportações (ETag = chave; responde a If-None-Match e Range)."""
+    return send_file(path, mimetype=XLSX_MIMETYPE, as_attachment=True, download_name=filename,
+                     conditional=True, etag=key, max_age=0)
+
+
 @reports_bp.route('/export')
+@query_class('export')
 @login_required
 def exportar_excel_route():
-    """Rota para exportar os dados do relatório selecionado para Excel."""
+    """Rota para exportar os dados do relatório selecionado para Excel (linhas em streaming)."""
     user_nome = current_user.nome if hasattr(current_user, 'nome') else 'Anónimo'
     try:
-        selected_fornecedora = request.args.get('fornecedora', 'Consolidado')
         selected_report_type = request.args.get('report_type', 'base_clientes')
+        spec = db.get_report(selected_report_type)
+        if spec is None:
+            logger.warning(f"Tentativa de exportação de tipo inválido: '{selected_report_type}'.")
+            flash(f"Tipo de relatório inválido para exportação: '{selected_report_type}'.", "error")
+            return redirect(url_for('reports_bp.relatorios'))
+
+        filters = reports_engine.parse_filters(spec, request.args)
+        columns = reports_engine.parse_columns(spec, request.args.getlist('cols'))
+        fornecedora = reports_engine.sheet_fornecedora(filters.get('fornecedora') or spec.fixed_fornecedora)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        excel_exp = ExcelExporter() # Instancia o exportador
-        excel_bytes = None
-        filename = f"Relatorio_{secure_filename(selected_report_type)}_{timestamp}.xlsx" # Nome de arquivo padrão
-
-        logger.info(f"Iniciando exportação Excel: Tipo='{selected_report_type}', Fornecedora='{selected_fornecedora}'. Utilizador: {user_nome}")
-
-        # Lógica de exportação baseada no tipo (similar ao app.py original)
-        # --- EXPORTAÇÃO RATEIO GERAL (MULTI-ABA) ---
-        if selected_report_type == 'rateio':
-            forn_fn = 'Consolidado' if selected_fornecedora.lower() == "consolidado" else secure_filename(selected_fornecedora).replace('_', '')
-            filename = f"Clientes_Rateio_{forn_fn}_{timestamp}.xlsx"
-            # Busca TODOS os IDs (sem paginação)
-            nova_ids = db.get_base_nova_ids(fornecedora=selected_fornecedora)
-            enviada_ids = db.get_base_enviada_ids(fornecedora=selected_fornecedora)
-            if not nova_ids and not enviada_ids:
-                flash(f"Nenhum dado encontrado para exportar o Rateio Geral (Fornecedora: {selected_fornecedora}).", "warning")
-                return redirect(url_for('reports_bp.relatorios', **request.args))
-
-            rateio_headers = db.get_headers('rateio') # Pega cabeçalhos
-            # Busca detalhes completos para os IDs encontrados
-            nova_data = db.get_client_details_by_ids('rateio', nova_ids) if nova_ids else []
-            enviada_data = db.get_client_details_by_ids('rateio', enviada_ids) if enviada_ids else []
-
-            sheets_to_export = [
-                {'name': 'Base Nova', 'headers': rateio_headers, 'data': nova_data},
-                {'name': 'Base Enviada', 'headers': rateio_headers, 'data': enviada_data}
-            ]
-            excel_bytes = excel_exp.export_multi_sheet_excel_bytes(sheets_to_export)
-
-        # --- EXPORTAÇÃO RATEIO RZK (MULTI-ABA) ---
-        elif selected_report_type == 'rateio_rzk':
-             filename = f"Clientes_Rateio_RZK_MultiBase_{timestamp}.xlsx"
-             nova_ids_rzk = db.get_rateio_rzk_base_nova_ids()
-             enviada_ids_rzk = db.get_rateio_rzk_base_enviada_ids()
-             if not nova_ids_rzk and not enviada_ids_rzk:
-                 flash("Nenhum dado encontrado para exportar o Rateio RZK.", "warning")
-                 return redirect(url_for('reports_bp.relatorios', report_type='rateio_rzk')) # Redireciona mantendo o tipo
-
-             rzk_headers = db.get_headers('rateio_rzk')
-             nova_data_rzk = db.get_rateio_rzk_client_details_by_ids(nova_ids_rzk) if nova_ids_rzk else []
-             enviada_data_rzk = db.get_rateio_rzk_client_details_by_ids(enviada_ids_rzk) if enviada_ids_rzk else []
-             sheets_to_export = [
-                 {'name': 'Base Nova RZK', 'headers': rzk_headers, 'data': nova_data_rzk},
-                 {'name': 'Base Enviada RZK', 'headers': rzk_headers, 'data': enviada_data_rzk}
-             ]
-             excel_bytes = excel_exp.export_multi_sheet_excel_bytes(sheets_to_export)
-
-        # --- EXPORTAÇÃO RELATÓRIOS DE ABA ÚNICA ---
-        elif selected_report_type in ['base_clientes', 'clientes_por_licenciado', 'boletos_por_cliente', 'recebiveis_clientes', 'graduacao_licenciado']: # Adicionado 'recebiveis_clientes' aqui
-            forn_fn = secure_filename(selected_fornecedora).replace('_', '') if selected_fornecedora and selected_fornecedora.lower() != 'consolidado' else 'Consolidado'
-            dados_completos = []
-            sheet_title = selected_report_type.replace('_', ' ').title() # Título padrão
-            headers = db.get_headers(selected_report_type) # Pega cabeçalhos
-
-            if not headers:
-                 flash(f"Configuração de cabeçalhos ausente para exportar '{selected_report_type}'.", "error")
-                 return redirect(url_for('reports_bp.relatorios', **request.args))
-
-            # Busca todos os dados (sem paginação - limit=None)
-            if selected_report_type == 'base_clientes':
-                 filename = f"Clientes_Base_{forn_fn}_{timestamp}.xlsx"
-                 data_query, data_params = db.build_query(selected_report_type, selected_fornecedora, 0, None) # limit=None
-                 dados_completos = db.execute_query(data_query, data_params) or []
-                 sheet_title = f"Base Clientes ({forn_fn})"
-
-            elif selected_report_type == 'graduacao_licenciado':
-                 filename = f"PRO_Graduacao_{timestamp}.xlsx" # <-- NOME DO ARQUIVO ALTERADO
-                 # Passa as datas para a função de exportação
-                 dados_completos = db.get_graduacao_licenciado_data(limit=None)
-                 sheet_title = "PRO - Graduação" # <-- NOME DA ABA ALTERADO
-
-            elif selected_report_type == 'clientes_por_licenciado':
-                 filename = f"Qtd_Clientes_Licenciado_{timestamp}.xlsx"
-                 dados_completos = db.get_clientes_por_licenciado_data(limit=None) # limit=None
-                 sheet_title = "Clientes por Licenciado"
-
-            elif selected_report_type == 'boletos_por_cliente':
-                 filename = f"Qtd_Boletos_Cliente_{forn_fn}_{timestamp}.xlsx"
-                 dados_completos = db.get_boletos_por_cliente_data(limit=None, fornecedora=selected_fornecedora, export_mode=True) # limit=None
-                 sheet_title = f"Boletos Cliente ({forn_fn})"
-
-            elif selected_report_type == 'recebiveis_clientes': # Novo bloco para exportação de recebíveis
-                filename = f"Recebiveis_Clientes_{forn_fn}_{timestamp}.xlsx"
-                dados_completos = db.get_recebiveis_clientes_data(limit=None, fornecedora=selected_fornecedora) # limit=None
-                sheet_title = f"Recebíveis ({forn_fn})"
-
-            # --- REMOÇÃO DE DUPLICATAS PELA COLUNA 'idcliente' ANTES DE EXPORTAR ---
-            if dados_completos and headers:
+        filename = f"{spec.filename.format(fornecedora=fornecedora)}_{timestamp}.xlsx"
+        logger.info(f"Iniciando exportação Excel: Tipo='{spec.name}', Filtros={filters}, Colunas={len(columns) if columns else 'todas'}. Utilizador: {user_nome}")
+
+        # Mesma exportação com os mesmos dados de origem: serve o arquivo já gerado
+        key = export_cache.cache_key(spec, filters, columns)
+        if key is not None:
+            path = export_cache.lookup(key)
+            if path is not None:
                 try:
-                    # Encontra o índice da coluna de ID ('idcliente' ou 'código')
-                    lower_headers = [h.lower() for h in headers]
-                    id_column_name = None
-                    if 'idcliente' in lower_headers:
-                        id_column_name = 'idcliente'
-                    elif 'código' in lower_headers:
-                        id_column_name = 'código'
-                    
-                    if id_column_name:
-                        seen_ids = set()
-                        dados_unicos = []
-                        for linha in dados_completos:
-                            # CORREÇÃO: Usa o método .get() para evitar KeyError e aceita dicionários
-                            client_id = linha.get(id_column_name)
-                            if client_id is not None and client_id not in seen_ids:
-                                seen_ids.add(client_id)
-                                dados_unicos.append(linha)
-                        
-                        if len(dados_unicos) < len(dados_completos):
-                            logger.info(f"Removidas {len(dados_completos) - len(dados_unicos)} linhas duplicadas por '{id_column_name}' para a exportação do relatório '{selected_report_type}'.")
-                            dados_completos = dados_unicos
-                    else:
-                        raise ValueError("Coluna de ID não encontrada")
-
-                except ValueError:
-                    # Se a coluna de ID não for encontrada, loga um aviso mas continua sem a remoção de duplicatas.
-                    logger.warning(f"Nenhuma coluna de ID ('idcliente' ou 'código') foi encontrada nos cabeçalhos do relatório '{selected_report_type}'. A remoção de duplicatas na exportação foi ignorada.")
-
-
-            # Garante que o nome da aba não exceda 31 caracteres
-            if len(sheet_title) > 31: sheet_title = sheet_title[:31]
-
-            if not dados_completos:
-                 flash(f"Nenhum dado encontrado para exportar o relatório '{sheet_title}'.", "warning")
-                 return redirect(url_for('reports_bp.relatorios', **request.args))
-
-            # CORREÇÃO: Ajusta a estrutura dos dados para a função de exportação
-            dados_para_exportar = [[row.get(col.replace(' ', '_').lower()) for col in headers] for row in dados_completos]
-            excel_bytes = excel_exp.export_to_excel_bytes(dados_para_exportar, headers, sheet_name=sheet_title)
-        else:
-             # Tipo de relatório inválido para exportação
-             logger.warning(f"Tentativa de exportação de tipo inválido: '{selected_report_type}'.")
-             flash(f"Tipo de relatório inválido para exportação: '{selected_report_type}'.", "error")
-             return redirect(url_for('reports_bp.relatorios'))
-
-        # --- Envia a Resposta com o Arquivo Excel ---
-        if excel_bytes:
-            logger.info(f"Exportação Excel concluída. Enviando ficheiro: {filename} ({len(excel_bytes)} bytes)")
-            return Response(
-                excel_bytes,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                headers={'Content-Disposition': f'attachment;filename="{filename}"'}
-            )
-        else:
-            # Se excel_bytes for None (erro na geração ou nenhum dado)
-            logger.error(f"Falha ao gerar bytes Excel para '{selected_report_type}' (Forn: {selected_fornecedora}). Nenhum ficheiro será enviado.")
-            # A mensagem flash já deve ter sido definida no bloco acima
-            return redirect(url_for('reports_bp.relatorios', **request.args))
-
+                    response = _send_cached(path, key, filename)
+                    logger.info(f"Exportação Excel servida do cache ({key[:12]}): {filename}")
+                    return response
+                except FileNotFoundError:
+                    logger.info(f"Arquivo do cache de exportações removido durante o envio ({key[:12]}); gerando novamente.")
+
+        # As linhas vão do cursor do banco direto para o arquivo (openpyxl write-only)
+        if key is not None:
+            # As queries só abrem dentro de store(), com a trava da chave: um pedido igual
+            # e simultâneo espera o primeiro e serve o arquivo dele, sem ir ao banco
+            def gerar(arquivo) -> bool:
+                sheets = reports_engine.export_sheets(spec, filters, columns)
+                if not reports_engine.has_rows(sheets):
+                    return False
+                ExcelExporter().write_sheets(arquivo, sheets)
+                return True
+
+            path = export_cache.store(key, gerar)
+            if path is None:
+                flash(f"Nenhum dado encontrado para exportar o relatório '{spec.title}'.", "warning")
+                return redirect(url_for('reports_bp.relatorios', **request.args.to_dict(flat=False)))
+            logger.info(f"Exportação Excel concluída e guardada no cache ({key[:12]}). Enviando ficheiro: {filename}")
+            return _send_cached(path, key, filename)
+
+        sheets = reports_engine.export_sheets(spec, filters, columns)
+        if not reports_engine.has_rows(sheets):
+            flash(f"Nenhum dado encontrado para exportar o relatório '{spec.title}'.", "warning")
+            return redirect(url_for('reports_bp.relatorios', **request.args.to_dict(flat=False)))
+
+        arquivo = tempfile.TemporaryFile()
+        try:
+            ExcelExporter().write_sheets(arquivo, sheets)
+        except BaseException:
+            arquivo.close()
+            raise
+        arquivo.seek(0)
+        logger.info(f"Exportação Excel concluída. Enviando ficheiro: {filename}")
+        return send_file(arquivo, mimetype=XLSX_MIMETYPE, as_attachment=True, download_name=filename)
+
+    except QueryInterrupted as e:
+        # A mensagem de tempo esgotado é adicionada por db.timeouts
+        logger.warning(f"Exportação interrompida ('{request.args.get('report_type')}'): {e}")
+        return redirect(url_for('reports_bp.relatorios', **request.args.to_dict(flat=False)))
     except Exception as exp_err:
         logger.error(f"Erro Inesperado durante a exportação Excel: {exp_err}", exc_info=True)
         flash("Ocorreu um erro inesperado durante a geração do arquivo Excel.", "error")
         # Redireciona de volta para a página de relatórios com os mesmos parâmetros
-        return redirect(url_for('reports_bp.relatorios', **request.args))
\ No newline at end of file
+        return redirect(url_for('reports_bp.relatorios', **request.args.to_dict(flat=False)))
@@ -0,0 +1,159 @@
+# benchmarks/analytics_benchmark.py
+"""
+Benchmark: cálculos vetorizados (backend.db.analytics) x loops linha a linha antigos.
+
+Gera um DataFrame sintético no formato de `get_boletos_por_cliente_frame` e compara
+tempo e resultado do Green Score e dos KPIs de Atraso na Injeção. Fica fora do pacote
+backend: não é carregado pela aplicação.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.analytics_benchmark --clientes 150000
+"""
+import argparse
+import time
+from collections import defaultdict
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+from backend.db import analytics
+from backend.db.reports_boletos import final_columns_order
+
+FORNECEDORAS = ['BOM FUTURO', 'BC ENERGIA', 'COMERC', 'SOLATIO', 'RZK', 'VANTAGE', 'COTESA', 'EDP', '']
+UFS = ['MG', 'MT', 'GO', 'RS', 'PE', 'SP', 'BA', 'PR']
+
+
+def gerar_frame_sintetico(n_clientes: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Cria um DataFrame parecido com o do relatório de boletos (inclui ~2% de linhas
+    duplicadas e alguns "Dias em Atraso" inválidos).
+    """
+    rng = np.random.default_rng(seed)
+    n = n_clientes
+    atraso = rng.random(n) < 0.25
+    dias = np.where(atraso, rng.integers(-5, 120, n), np.nan).astype(object)
+    dias[~atraso] = ''
+    dias[atraso & (rng.random(n) < 0.01)] = 'N/D'  # texto não numérico (ignorado pelos cálculos)
+    consumo = [Decimal(f"{v:.2f}") if v > 5 else None for v in rng.uniform(0, 2000, n)]
+    df = pd.DataFrame({
+        'codigo': np.arange(1, n + 1),
+        'fornecedora': rng.choice(FORNECEDORAS, n),
+        'ufconsumo': rng.choice(UFS, n),
+        'consumomedio': consumo,
+        'atraso_na_injecao': np.where(atraso, 'SIM', 'NÃO'),
+        'dias_em_atraso': dias,
+    })
+    # Duplicatas como as geradas pelos merges com os CSVs (mesmo cliente repetido)
+    duplicadas = df.sample(n=max(1, n // 50), random_state=seed)
+    df = pd.concat([df, duplicadas]).sort_values('codigo', kind='stable').reset_index(drop=True)
+    return df.reindex(columns=final_columns_order, fill_value='')
+
+
+# --- Implementações antigas (loop por linha), mantidas apenas para comparação ---
+# Reproduzem os loops originais de dashboard.py, inclusive no tratamento de valores inválidos.
+
+def _legacy_green_score(rows):
+    total_clients = defaultdict(int)
+    pontos = defaultdict(float)
+    seen = defaultdict(set)
+    for row in rows:
+        fornecedora_raw = row['fornecedora']
+        if not fornecedora_raw or (isinstance(fornecedora_raw, str) and fornecedora_raw.strip() == '') or pd.isna(fornecedora_raw):
+            continue
+        fornecedora = fornecedora_raw.strip().upper()
+        if row['codigo'] in seen[fornecedora]:
+            continue
+        seen[fornecedora].add(row['codigo'])
+        total_clients[fornecedora] += 1
+        if row['atraso_na_injecao'] == 'SIM':
+            try:
+                dias = float(row['dias_em_atraso']) if row['dias_em_atraso'] not in [None, '', 'N/A'] else 0
+                if dias > 30:
+                    pontos[fornecedora] += 2
+                elif 0 < dias <= 30:
+                    pontos[fornecedora] += 1
+            except (ValueError, TypeError):
+                pass
+    scores = [(f, round(max(0.0, 100 - (pontos.get(f, 0) / (n * 2)) * 100), 2)) for f, n in total_clients.items()]
+    scores.sort(key=lambda x: x[1], reverse=True)
+    return scores
+
+
+def _legacy_overdue(rows, min_exclusive=None, max_inclusive=None):
+    seen = set()
+    count, dias_sum, dias_n, kwh = 0, 0, 0, 0
+    for row in rows:
+        codigo = row.get('codigo')
+        if not codigo or codigo in seen:
+            continue
+        seen.add(codigo)
+        if row.get('atraso_na_injecao') != 'SIM':
+            continue
+        try:
+            raw = row.get('dias_em_atraso')
+            dias = float(raw) if raw not in [None, '', 'N/A'] else 0
+        except (ValueError, TypeError):
+            # Total: o cliente conta (e o consumo soma), só os dias são ignorados.
+            # Faixas: sem dias válidos, o cliente fica fora.
+            dias = None
+            if min_exclusive is not None:
+                continue
+        try:
+            raw = row.get('consumomedio')
+            consumo = float(raw) if raw not in [None, '', 'N/A'] else 0
+        except (ValueError, TypeError):
+            consumo = 0
+        if min_exclusive is None:
+            count += 1
+            kwh += consumo
+            if dias is not None and dias > 0:
+                dias_sum += dias
+                dias_n += 1
+        elif dias > min_exclusive and (max_inclusive is None or dias <= max_inclusive):
+            count += 1
+            dias_sum += dias
+            dias_n += 1
+            kwh += consumo
+    return {'count': count, 'average_delay_days': int(dias_sum / dias_n) if dias_n else 0, 'pending_kwh': float(kwh)}
+
+
+def executar(n_clientes: int) -> None:
+    df = gerar_frame_sintetico(n_clientes)
+    print(f"Linhas no DataFrame sintético: {len(df):,} ({n_clientes:,} clientes únicos)")
+
+    inicio = time.perf_counter()
+    rows = df.to_dict('records')
+    legacy = {
+        'green': _legacy_green_score(rows),
+        'all': _legacy_overdue(rows),
+        'up_to_30': _legacy_overdue(rows, 0, 30),
+        'over_30': _legacy_overdue(rows, 30),
+    }
+    t_legacy = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    summary = analytics.summarize_injection_by_fornecedora(df)
+    vetorizado = {
+        'green': analytics.green_scores_from_summary(summary),
+        **{bucket: analytics.overdue_kpi_from_summary(summary, bucket) for bucket in analytics.OVERDUE_BUCKETS},
+    }
+    t_vetorizado = time.perf_counter() - inicio
+
+    for chave in legacy:
+        a, b = legacy[chave], vetorizado[chave]
+        if chave != 'green':
+            # Soma de floats em ordem diferente: compara kWh com tolerância
+            iguais = {k: a[k] for k in ('count', 'average_delay_days')} == {k: b[k] for k in ('count', 'average_delay_days')} \
+                and abs(a['pending_kwh'] - b['pending_kwh']) < 1e-6 * max(1.0, abs(a['pending_kwh']))
+        else:
+            iguais = a == b
+        print(f"  {chave:<9} resultados iguais: {iguais}")
+
+    print(f"Loop por linha (to_dict + 4 passagens): {t_legacy * 1000:9.1f} ms")
+    print(f"Vetorizado (1 passagem, todas as métricas): {t_vetorizado * 1000:9.1f} ms")
+    print(f"Ganho: {t_legacy / t_vetorizado:.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clientes', type=int, default=120_000, help='Quantidade de clientes únicos (padrão: 120000)')
+    executar(parser.parse_args().clientes)
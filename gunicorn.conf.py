@@ -0,0 +1,65 @@
+# gunicorn.conf.py
+"""
+Configuração do Gunicorn para produção: gunicorn -c gunicorn.conf.py wsgi:app
+
+Variáveis de ambiente (opcionais):
+    GUNICORN_BIND     endereço (padrão 0.0.0.0:8088, mesma porta do run.py)
+    GUNICORN_WORKERS  número de processos (padrão: 2 x CPUs + 1, no máximo 4)
+    GUNICORN_THREADS  threads por processo (padrão: 4)
+    GUNICORN_TIMEOUT  timeout de requisição em segundos (padrão: 120, exportações são longas)
+
+Cada processo abre o seu pool com até DB_POOL_MAXCONN conexões (padrão: GUNICORN_THREADS
++ DB_PARALLEL_WORKERS + 3 = 11), então o PostgreSQL recebe até GUNICORN_WORKERS x
+DB_POOL_MAXCONN conexões (4 x 11 = 44 no padrão), mais uma do listener de NOTIFY.
+Ao aumentar workers ou threads, confira o max_connections do servidor (100 por padrão).
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8088')
+workers = int(os.getenv('GUNICORN_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 4)))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = 'gthread'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+# Importa a aplicação (pandas, blueprints, templates) uma única vez no master;
+# os workers herdam a memória via copy-on-write.
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
+
+
+def pre_fork(server, worker):
+    """No master, antes de cada fork: congela os objetos já carregados.
+
+    gc.freeze() move tudo para a geração permanente, então o coletor dos workers
+    não toca nesses objetos (e não suja as páginas compartilhadas por copy-on-write).
+    """
+    if not getattr(server, '_gc_frozen', False):
+        gc.collect()
+        gc.freeze()
+        server._gc_frozen = True
+
+
+def post_fork(server, worker):
+    """No worker recém-criado: abre o pool de conexões deste processo."""
+    from wsgi import app
+    from backend import db
+    if db.init_pool(app) is not None:
+        server.log.info(f"Worker {worker.pid}: pool de conexões inicializado.")
+
+
+def worker_exit(server, worker):
+    """Desligamento do worker: para a sonda de versões, fecha o executor de queries paralelas e o pool."""
+    from wsgi import app
+    from backend import db
+    from backend.db import parallel
+    versions = app.extensions.get('data_versions')
+    if versions is not None:
+        versions.stop(app)
+    parallel.shutdown(app)
+    db.close_pool(app)
@@ -0,0 +1,14 @@
+# wsgi.py
+"""
+Ponto de entrada WSGI para produção (Gunicorn).
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+O pool de conexões NÃO é aberto aqui: com preload_app o módulo é importado no
+processo master, e cada worker cria o seu pool no hook post_fork (gunicorn.conf.py).
+Sem o hook (outro servidor WSGI), o pool é criado na primeira query de cada processo.
+Para desenvolvimento local continue usando `python run.py`.
+"""
+from backend import create_app
+
+app = create_app(init_db_pool=False)